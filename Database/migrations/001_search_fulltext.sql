@@ -0,0 +1,14 @@
+-- ngram FULLTEXT indexes behind the dashboard search box
+-- (see blueprints/common/search.py). The ngram parser indexes every
+-- 2-character slice, so partial words and near-miss spellings still share
+-- tokens with the stored value and MATCH() ranks them by overlap.
+ALTER TABLE prescriptions
+    ADD FULLTEXT INDEX ft_prescriptions_medication (medication_name) WITH PARSER ngram;
+
+ALTER TABLE patients
+    ADD FULLTEXT INDEX ft_patients_name (first_name, last_name) WITH PARSER ngram;
+
+-- plain B-tree indexes for the one-character prefix fallback
+CREATE INDEX idx_prescriptions_medication ON prescriptions (medication_name);
+CREATE INDEX idx_patients_last_first      ON patients (last_name, first_name);
+CREATE INDEX idx_patients_first           ON patients (first_name);
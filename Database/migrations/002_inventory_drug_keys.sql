@@ -0,0 +1,23 @@
+-- Give pharmacy_inventory indexable join keys.
+-- drug_key / medication_key are stored generated columns holding the
+-- normalised name (LOWER(TRIM(...))), so joins no longer wrap the indexed
+-- columns in functions. drug_id links stock to the drug catalog; it is
+-- backfilled here and set on insert by add_inventory_item. It stays NULL
+-- for free-text items that are not in weight_loss_drugs.
+ALTER TABLE pharmacy_inventory
+    ADD COLUMN drug_key VARCHAR(255) AS (LOWER(TRIM(drug_name))) STORED,
+    ADD COLUMN drug_id  INT NULL;
+
+ALTER TABLE prescriptions
+    ADD COLUMN medication_key VARCHAR(255) AS (LOWER(TRIM(medication_name))) STORED;
+
+UPDATE pharmacy_inventory pi
+  JOIN weight_loss_drugs wd ON pi.drug_key = LOWER(TRIM(wd.name))
+   SET pi.drug_id = wd.drug_id
+ WHERE pi.drug_id IS NULL;
+
+ALTER TABLE pharmacy_inventory
+    ADD CONSTRAINT fk_inventory_drug FOREIGN KEY (drug_id) REFERENCES weight_loss_drugs(drug_id);
+
+CREATE INDEX idx_inventory_pharmacy_key  ON pharmacy_inventory (pharmacy_id, drug_key);
+CREATE INDEX idx_inventory_pharmacy_drug ON pharmacy_inventory (pharmacy_id, drug_id);
@@ -0,0 +1,24 @@
+-- Composite / covering indexes for the hot filters in the blueprints.
+
+-- user_id -> active pharmacy_id lookup on every pharmacy request
+-- (pharmacy_id is the primary key, so this index covers the query)
+CREATE INDEX idx_pharmacies_user_active ON pharmacies (user_id, is_active);
+
+-- queue / filled list / pending requests: filter on pharmacy + status, oldest first
+CREATE INDEX idx_prescriptions_pharmacy_status_created
+    ON prescriptions (pharmacy_id, status, created_at);
+
+-- keyset paging over all prescriptions on (created_at, prescription_id)
+CREATE INDEX idx_prescriptions_created_id ON prescriptions (created_at, prescription_id);
+
+-- payment history, newest first, with and without the fulfilled filter
+CREATE INDEX idx_payments_pharmacy_date
+    ON payments_pharmacy (pharmacy_id, payment_date);
+CREATE INDEX idx_payments_pharmacy_fulfilled_date
+    ON payments_pharmacy (pharmacy_id, is_fulfilled, payment_date);
+
+-- one price per drug per pharmacy; also the conflict key for price upserts
+CREATE UNIQUE INDEX uq_prices_pharmacy_drug ON pharmacy_drug_prices (pharmacy_id, drug_id);
+
+-- keyset paging over transaction logs, newest first
+CREATE INDEX idx_logs_timestamp_id ON pharmacy_logs (timestamp, log_id);
@@ -0,0 +1,9 @@
+-- Make the normalised drug_key the inventory's unique key so the restock
+-- upsert in add_inventory_item (INSERT ... ON DUPLICATE KEY UPDATE) folds
+-- 'Metformin' and ' metformin' into one row.
+-- This fails if a pharmacy already has two rows whose names differ only in
+-- case or surrounding whitespace; merge those rows first.
+ALTER TABLE pharmacy_inventory
+    DROP INDEX unique_pharmacy_drug,
+    DROP INDEX idx_inventory_pharmacy_key,
+    ADD UNIQUE KEY uq_inventory_pharmacy_key (pharmacy_id, drug_key);
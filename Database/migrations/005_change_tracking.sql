@@ -0,0 +1,14 @@
+-- Row-level change timestamps for the conditional GET endpoints.
+-- COUNT(*) and MAX(updated_at) per pharmacy form the ETag for
+-- /api/prices/current-prices and /api/pharmacy/inventory. Both come straight
+-- off the (pharmacy_id, updated_at) index, so a 304 never reads the rows.
+-- Microsecond precision keeps two writes in the same second apart.
+ALTER TABLE pharmacy_inventory
+    ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_inventory_pharmacy_updated (pharmacy_id, updated_at);
+
+ALTER TABLE pharmacy_drug_prices
+    ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_prices_pharmacy_updated (pharmacy_id, updated_at);
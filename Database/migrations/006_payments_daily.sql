@@ -0,0 +1,13 @@
+-- Per-pharmacy, per-day payment totals, kept current by the dispense
+-- endpoints in the same transaction as the payment insert. Revenue reports
+-- read this instead of scanning payments_pharmacy.
+-- The table starts empty: run `python rollups.py rebuild` once after
+-- applying this migration to backfill existing payments.
+CREATE TABLE IF NOT EXISTS payments_daily (
+    pharmacy_id   INT            NOT NULL,
+    day           DATE           NOT NULL,
+    payment_count INT            NOT NULL DEFAULT 0,
+    amount_total  DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (pharmacy_id, day),
+    FOREIGN KEY (pharmacy_id) REFERENCES pharmacies(pharmacy_id)
+);
@@ -0,0 +1,14 @@
+-- Change log behind GET /api/pharmacy/events (server-sent events).
+-- Every new prescription and every status change appends a row in the same
+-- transaction as the change itself. event_id is the change sequence that
+-- clients resume from with Last-Event-ID. Old rows can be pruned at will;
+-- a client that reconnects after its position was pruned just misses them.
+CREATE TABLE IF NOT EXISTS pharmacy_events (
+    event_id        BIGINT      NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    pharmacy_id     INT         NOT NULL,
+    prescription_id INT         NOT NULL,
+    kind            VARCHAR(16) NOT NULL,
+    status          VARCHAR(16) NOT NULL,
+    created_at      TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_events_pharmacy_event (pharmacy_id, event_id)
+);
@@ -0,0 +1,12 @@
+-- Change counters for the caches every worker process keeps in memory
+-- (invalidation.py). A write that makes cached data stale bumps its
+-- cache's row in the same transaction; each worker polls this table and
+-- drops the cache when the version moves. Bump a row by hand after editing
+-- the data outside the API, e.g.
+--   UPDATE cache_versions SET version = version + 1 WHERE name = 'drugs';
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name    VARCHAR(32) NOT NULL PRIMARY KEY,
+    version BIGINT      NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO cache_versions (name, version) VALUES ('pharmacies', 0), ('drugs', 0);
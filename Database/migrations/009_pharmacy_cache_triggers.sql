@@ -0,0 +1,13 @@
+-- Bump the 'pharmacies' cache version (008_cache_versions.sql) on every
+-- change to a pharmacy row, so each worker drops its cached
+-- user_id -> pharmacy_id map within one poll interval. The API has no
+-- endpoint that deactivates or reassigns pharmacies; this covers the admin
+-- tools and hand-run SQL that do. New pharmacies need no bump: a user
+-- without an active pharmacy is never cached.
+CREATE TRIGGER trg_pharmacies_cache_update AFTER UPDATE ON pharmacies
+FOR EACH ROW
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'pharmacies';
+
+CREATE TRIGGER trg_pharmacies_cache_delete AFTER DELETE ON pharmacies
+FOR EACH ROW
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'pharmacies';
@@ -0,0 +1,156 @@
+-- SQLite stand-in for the MySQL schema (base tables plus migrations
+-- 001-009), used by the in-process ``sqlite`` driver in db_sqlite.py for
+-- tests and benchmarks. Keep it in step with Database/migrations.
+-- FULLTEXT indexes have no SQLite equivalent; the driver emulates MATCH.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    email         VARCHAR(255) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    user_type     VARCHAR(16) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS doctors (
+    doctor_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id    INTEGER NOT NULL,
+    first_name VARCHAR(255) NOT NULL,
+    last_name  VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pharmacies (
+    pharmacy_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id     INTEGER NOT NULL,
+    name        VARCHAR(255),
+    is_active   BOOLEAN NOT NULL DEFAULT TRUE
+);
+CREATE INDEX IF NOT EXISTS idx_pharmacies_user_active ON pharmacies (user_id, is_active);
+
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id      INTEGER,
+    first_name   VARCHAR(255) NOT NULL,
+    last_name    VARCHAR(255) NOT NULL,
+    address      VARCHAR(255),
+    phone_number VARCHAR(32),
+    zip_code     VARCHAR(16),
+    is_active    BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS patient_preferred_pharmacy (
+    patient_id  INTEGER PRIMARY KEY,
+    pharmacy_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS weight_loss_drugs (
+    drug_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        VARCHAR(255) NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS prescriptions (
+    prescription_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doctor_id       INTEGER,
+    patient_id      INTEGER NOT NULL,
+    pharmacy_id     INTEGER NOT NULL,
+    drug_id         INTEGER,
+    medication_name VARCHAR(255),
+    medication_key  VARCHAR(255) GENERATED ALWAYS AS (LOWER(TRIM(medication_name))) STORED,
+    dosage          VARCHAR(255),
+    instructions    TEXT,
+    status          VARCHAR(16) NOT NULL DEFAULT 'pending',
+    created_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_pharmacy_status_created
+    ON prescriptions (pharmacy_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_created_id ON prescriptions (created_at, prescription_id);
+
+CREATE TABLE IF NOT EXISTS pharmacy_inventory (
+    inventory_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    pharmacy_id    INTEGER NOT NULL,
+    drug_name      VARCHAR(255) NOT NULL,
+    drug_key       VARCHAR(255) GENERATED ALWAYS AS (LOWER(TRIM(drug_name))) STORED,
+    drug_id        INTEGER,
+    stock_quantity INTEGER NOT NULL DEFAULT 0,
+    price          DECIMAL(10, 2) DEFAULT 0.00,
+    updated_at     TIMESTAMP NOT NULL DEFAULT (STRFTIME('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_inventory_pharmacy_key ON pharmacy_inventory (pharmacy_id, drug_key);
+CREATE INDEX IF NOT EXISTS idx_inventory_pharmacy_drug ON pharmacy_inventory (pharmacy_id, drug_id);
+
+CREATE TABLE IF NOT EXISTS pharmacy_drug_prices (
+    price_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    pharmacy_id INTEGER NOT NULL,
+    drug_id     INTEGER NOT NULL,
+    price       DECIMAL(10, 2) NOT NULL,
+    updated_at  TIMESTAMP NOT NULL DEFAULT (STRFTIME('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_prices_pharmacy_drug ON pharmacy_drug_prices (pharmacy_id, drug_id);
+
+CREATE TABLE IF NOT EXISTS payments_pharmacy (
+    payment_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    pharmacy_id  INTEGER NOT NULL,
+    patient_id   INTEGER NOT NULL,
+    amount       DECIMAL(10, 2) NOT NULL,
+    is_fulfilled BOOLEAN NOT NULL DEFAULT FALSE,
+    payment_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_payments_pharmacy_date ON payments_pharmacy (pharmacy_id, payment_date);
+CREATE INDEX IF NOT EXISTS idx_payments_pharmacy_fulfilled_date
+    ON payments_pharmacy (pharmacy_id, is_fulfilled, payment_date);
+
+CREATE TABLE IF NOT EXISTS payments_daily (
+    pharmacy_id   INTEGER NOT NULL,
+    day           DATE NOT NULL,
+    payment_count INTEGER NOT NULL DEFAULT 0,
+    amount_total  DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (pharmacy_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS pharmacy_logs (
+    log_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    prescription_id INTEGER NOT NULL,
+    pharmacy_id     INTEGER NOT NULL,
+    patient_id      INTEGER NOT NULL,
+    amount_billed   DECIMAL(10, 2) NOT NULL,
+    timestamp       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp_id ON pharmacy_logs (timestamp, log_id);
+
+CREATE TABLE IF NOT EXISTS pharmacy_events (
+    event_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    pharmacy_id     INTEGER NOT NULL,
+    prescription_id INTEGER NOT NULL,
+    kind            VARCHAR(16) NOT NULL,
+    status          VARCHAR(16) NOT NULL,
+    created_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_events_pharmacy_event ON pharmacy_events (pharmacy_id, event_id);
+
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name    VARCHAR(32) NOT NULL PRIMARY KEY,
+    version INTEGER     NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('pharmacies', 0), ('drugs', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_pharmacies_cache_update AFTER UPDATE ON pharmacies
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'pharmacies';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pharmacies_cache_delete AFTER DELETE ON pharmacies
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'pharmacies';
+END;
+
+-- MySQL's ON UPDATE CURRENT_TIMESTAMP(6), which the ETag versions rely on
+CREATE TRIGGER IF NOT EXISTS trg_inventory_touch AFTER UPDATE ON pharmacy_inventory
+WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE pharmacy_inventory SET updated_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'now') WHERE inventory_id = NEW.inventory_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_prices_touch AFTER UPDATE ON pharmacy_drug_prices
+WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE pharmacy_drug_prices SET updated_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'now') WHERE price_id = NEW.price_id;
+END;
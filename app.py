@@ -8,22 +8,59 @@ from blueprints.prescriptionQueue.queue import pharmacy_queue_bp
 from blueprints.drugPrices.prices import prices_bp
 from blueprints.dispensePrescription.dispense import dispense_prescription_bp
 from blueprints.paymentHistory.payments import payments_bp
+from blueprints.pharmacyEvents.events import pharmacy_events_bp
+from blueprints.common import drugs, pharmacy
+from config import CORS_CONFIG
+import db
+import health
+import metrics
 
-app = Flask(__name__)
-CORS(app)
 
-app.register_blueprint(pharmacy_prescriptions_bp)
-app.register_blueprint(pharmacy_patients_bp)
-app.register_blueprint(prescriptions_bp)
-app.register_blueprint(pharmacy_queue_bp)
-app.register_blueprint(prices_bp)
-app.register_blueprint(dispense_prescription_bp)
-app.register_blueprint(payments_bp)
+def create_app(test_config=None):
+    """
+    Build the Flask app. Nothing here touches the database: the pool and
+    caches fill on first use, in whichever process serves the request, so
+    the app is safe to build before a server forks its workers (see wsgi.py).
+    """
+    app = Flask(__name__)
+    if test_config:
+        app.config.update(test_config)
+    if CORS_CONFIG['origins']:
+        # credentials: the listed dashboards run on other origins and must
+        # send the read-your-writes cookie back (db.py)
+        CORS(app, origins=CORS_CONFIG['origins'], supports_credentials=True)
+    else:
+        CORS(app)
+    db.init_app(app)
+    metrics.init_app(app)
+    health.init_app(app)
 
-@app.route('/api/hello', methods=['GET'])
-def hello():
-    return jsonify(message="Hello World!")
+    app.register_blueprint(pharmacy_prescriptions_bp)
+    app.register_blueprint(pharmacy_patients_bp)
+    app.register_blueprint(prescriptions_bp)
+    app.register_blueprint(pharmacy_queue_bp)
+    app.register_blueprint(prices_bp)
+    app.register_blueprint(dispense_prescription_bp)
+    app.register_blueprint(payments_bp)
+    app.register_blueprint(pharmacy_events_bp)
+
+    @app.route('/api/hello', methods=['GET'])
+    def hello():
+        return jsonify(message="Hello World!")
+
+    @app.route('/api/db/pool', methods=['GET'])
+    def db_pool_stats():
+        return jsonify(db.pool_stats())
+
+    @app.route('/api/cache/stats', methods=['GET'])
+    def cache_stats():
+        return jsonify(pharmacy_id=pharmacy.cache_stats(), drugs=drugs.cache_stats())
+
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
     print(app.url_map)
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    app.run(debug=True, port=5001)
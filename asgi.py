@@ -0,0 +1,264 @@
+"""
+ASGI entry point: an event loop in front of the Flask app.
+
+    python asgi.py                 # uvicorn, sized from SERVER_CONFIG
+    SERVER_MODE=asgi               # the same, from the Docker image
+
+The handlers in blueprints/ stay synchronous. Each worker accepts and
+parks connections on its event loop and runs a request's handler on a
+pool of ``SERVER_CONFIG['asgi_threads']`` threads only once the request
+has arrived, so slow clients, keep-alive connections and queued requests
+cost a socket and a coroutine rather than a thread. Request bodies are
+pulled from the socket as the handler reads them and responses are sent
+as the handler yields them, so large uploads and downloads stream.
+
+Event streams (/api/pharmacy/events) are not run on a handler thread at
+all. The view sees ``events.ASYNC_STREAM`` in the environ, checks the
+request and returns the stream's parameters; this module then serves the
+stream from the loop with ``events.aiter_stream``, which reads the change
+log through ``db_async``. A worker holds up to
+``SSE_CONFIG['max_async_streams']`` of them.
+
+Worker start-up and shutdown run ``wsgi.start_worker`` and
+``wsgi.stop_worker`` from the ASGI lifespan events, as gunicorn.conf.py
+does from its hooks.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import sys
+
+from app import app as flask_app
+from blueprints.common import events
+from config import SERVER_CONFIG, SSE_CONFIG
+import db_async
+import wsgi
+
+# bodies up to this size are read on the loop before the handler starts,
+# so a small POST never makes a handler thread wait on the client
+PREFETCH_BYTES = 64 * 1024
+
+
+class _RequestBody(io.RawIOBase):
+    """``wsgi.input``: the ASGI request body, read on demand from a handler thread."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = bytearray()
+        self._more = True
+
+    def _take(self, message):
+        if message['type'] == 'http.request':
+            self._buffer += message.get('body', b'')
+            self._more = message.get('more_body', False)
+        else:
+            # http.disconnect: the handler sees end of input
+            self._more = False
+
+    async def prefetch(self, limit):
+        while self._more and len(self._buffer) < limit:
+            self._take(await self._receive())
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            self._take(message)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        return n
+
+
+class _Response:
+    """Sends a WSGI response from a handler thread through the loop's ``send``."""
+
+    def __init__(self, send, loop):
+        self._send = send
+        self._loop = loop
+        self.status = None
+        self.headers = None
+        self.started = False
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info and self.started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status = int(status.split(' ', 1)[0])
+        self.headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return self.write
+
+    def write(self, body, more=True):
+        if not self.started:
+            self.started = True
+            self._call({'type': 'http.response.start', 'status': self.status, 'headers': self.headers})
+        if body or not more:
+            self._call({'type': 'http.response.body', 'body': body, 'more_body': more})
+
+    def _call(self, message):
+        asyncio.run_coroutine_threadsafe(self._send(message), self._loop).result()
+
+
+def _environ(scope, body):
+    root = scope.get('root_path', '')
+    path = scope['path']
+    if root and path.startswith(root):
+        path = path[len(root):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD':        scope['method'],
+        'SCRIPT_NAME':           root.encode('utf-8').decode('latin-1'),
+        'PATH_INFO':             path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING':          scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME':           str(server[0]),
+        'SERVER_PORT':           str(server[1]),
+        'REMOTE_ADDR':           str(client[0]),
+        'REMOTE_PORT':           str(client[1]),
+        'SERVER_PROTOCOL':       f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version':          (1, 0),
+        'wsgi.url_scheme':       scope.get('scheme', 'http'),
+        'wsgi.input':            io.BufferedReader(body),
+        # the body ends where the ASGI messages do, with or without a length
+        'wsgi.input_terminated': True,
+        'wsgi.errors':           sys.stderr,
+        'wsgi.multithread':      True,
+        'wsgi.multiprocess':     True,
+        'wsgi.run_once':         False,
+        events.ASYNC_STREAM:     True,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+class FlaskASGI:
+    """ASGI application running a WSGI app on a bounded thread pool."""
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self._executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"unsupported ASGI scope type {scope['type']!r}")
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='asgi')
+        return self._executor
+
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await loop.run_in_executor(self._pool(), wsgi.start_worker)
+                except Exception as err:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(err)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await loop.run_in_executor(self._pool(), wsgi.stop_worker)
+                db_async.shutdown()
+                self._executor.shutdown(wait=False)
+                self._executor = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        body = _RequestBody(receive, loop)
+        await body.prefetch(PREFETCH_BYTES)
+        environ = _environ(scope, body)
+        response = _Response(send, loop)
+        await loop.run_in_executor(self._pool(), self._run, environ, response)
+
+        stream = environ[events.ASYNC_STREAM]
+        if isinstance(stream, tuple):
+            await self._stream_events(stream, response, receive, send)
+
+    def _run(self, environ, response):
+        result = self.wsgi_app(environ, response.start_response)
+        try:
+            for chunk in result:
+                response.write(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        # an event stream's headers wait for _stream_events, which may
+        # still turn the request away
+        if not isinstance(environ[events.ASYNC_STREAM], tuple):
+            response.write(b'', more=False)
+
+    async def _stream_events(self, stream, response, receive, send):
+        pharm_id, last_id = stream
+        wakeup = events.open_async_stream(pharm_id)
+        if wakeup is None:
+            body = flask_app.json.dumps({'error': "Too many open event streams on this worker, retry shortly"})
+            await send({'type': 'http.response.start', 'status': 503, 'headers': [
+                (b'content-type', b'application/json'),
+                (b'retry-after', str(max(1, SSE_CONFIG['retry_ms'] // 1000)).encode()),
+            ]})
+            await send({'type': 'http.response.body', 'body': body.encode()})
+            return
+
+        async def pump():
+            await send({'type': 'http.response.start', 'status': response.status, 'headers': response.headers})
+            async for chunk in events.aiter_stream(pharm_id, last_id, wakeup, flask_app.json.dumps):
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # a stream cancelled before its first chunk never ran its own cleanup
+            events.close_stream(pharm_id, wakeup)
+        if tasks[0].done() and not tasks[0].cancelled() and tasks[0].exception():
+            raise tasks[0].exception()
+
+
+app = FlaskASGI(flask_app, SERVER_CONFIG['asgi_threads'])
+
+
+def main():
+    import uvicorn
+    import metrics
+
+    metrics.clear_multiproc_dir()
+
+    host, _, port = SERVER_CONFIG['bind'].rpartition(':')
+    uvicorn.run(
+        'asgi:app',
+        host=host or '0.0.0.0',
+        port=int(port),
+        workers=SERVER_CONFIG['workers'],
+        timeout_keep_alive=SERVER_CONFIG['keepalive'],
+        timeout_graceful_shutdown=SERVER_CONFIG['graceful_timeout'],
+        limit_max_requests=SERVER_CONFIG['max_requests'] or None,
+        lifespan='on',
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""
+Endpoint micro-benchmarks against the in-process SQLite backend.
+
+    python bench.py run                      # small + medium, compared to bench_baseline.json
+    python bench.py run --sizes large --repeat 20
+    python bench.py baseline                 # re-record bench_baseline.json
+
+Each size gets a fresh in-memory database filled by datagen.py from
+``--seed``. Every route in ``ROUTES`` is then driven through the Flask test
+client: ``--warmup`` untimed calls, ``--repeat`` timed calls for the latency
+percentiles, and one more call under tracemalloc and querylog.capture() for
+the peak allocation and the number of statements it ran.
+
+``run`` fails (exit 1) when a route errors, runs more queries than the
+baseline, or its median latency or peak allocation grows past the baseline
+by more than ``--tolerance``. Only the median gates: p95/p99 are reported
+but swing too much between runs of the same code to fail a build on. A
+slowdown smaller than ``--floor-ms`` is never counted either, because at
+that scale the noise is bigger than the change. Timings depend on the
+machine, so record the baseline on the machine that runs the comparison.
+"""
+import argparse
+from collections import deque
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import datagen
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# prescriptions per size; the other tables scale with them (datagen.plan)
+SIZES = {'small': 2_000, 'medium': 20_000, 'large': 200_000}
+DEFAULT_SIZES = ('small', 'medium')
+
+# the benchmarked pharmacy is pharmacy 1, the busiest one datagen makes
+BENCH_USER = datagen.USER_BASE + 1
+BATCH = 5
+
+# (name, method, path, request kwargs). {fields} are filled per call from
+# Workload; a value that is exactly "{field}" keeps the field's type. The
+# fields ending in _id / _ids that change state draw fresh rows every call.
+# /api/pharmacy/events is left out: it streams until the client leaves.
+ROUTES = [
+    ('prescriptions.list',       'GET',   '/api/pharmacy/prescriptions?limit=50', {}),
+    ('prescriptions.search',     'GET',   '/api/pharmacy/prescriptions?search=glutide&limit=50', {}),
+    ('prescriptions.detail',     'GET',   '/api/pharmacy/prescriptions/{prescription_id}', {}),
+    ('prescriptions.requests',   'GET',   '/api/pharmacy/requests?pharmacy_id=1', {}),
+    ('logs.page',                'GET',   '/api/pharmacy/logs?limit=50', {}),
+    ('logs.search',              'GET',   '/api/pharmacy/logs?search=Patel&limit=50', {}),
+    ('inventory.add',            'POST',  '/api/pharmacy/inventory/add',
+        {'json': {'user_id': BENCH_USER, 'drug_name': 'Metformin', 'stock_quantity': 1}}),
+    ('inventory.import',         'POST',  f'/api/pharmacy/inventory/import?user_id={BENCH_USER}',
+        {'data': 'drug_name,stock_quantity\n' + ''.join(f'{name},1\n' for name, *_ in datagen.DRUGS),
+         'content_type': 'text/csv'}),
+    ('inventory.get',            'GET',   f'/api/pharmacy/inventory?user_id={BENCH_USER}', {}),
+    ('pharmacy.id',              'GET',   f'/api/pharmacy/getPharmacyId?user_id={BENCH_USER}', {}),
+    ('patients.list',            'GET',   '/api/pharmacy/patients', {}),
+    ('drugs.list',               'GET',   '/api/prescriptions/drugs', {}),
+    ('drugs.refresh',            'POST',  '/api/prescriptions/drugs/refresh', {}),
+    ('prescription.request',     'POST',  '/api/prescriptions/request',
+        {'json': {'doctor_id': 1, 'patient_id': '{patient_id}', 'drug_id': 1,
+                  'dosage': '1mg', 'instructions': 'bench'}}),
+    ('queue.list',               'GET',   f'/api/pharmacy/queue?user_id={BENCH_USER}', {}),
+    ('queue.fulfill',            'POST',  f'/api/pharmacy/prescriptions/{{pending_id}}/fulfill?user_id={BENCH_USER}', {}),
+    ('queue.fulfill_batch',      'POST',  f'/api/pharmacy/prescriptions/fulfill?user_id={BENCH_USER}',
+        {'json': {'prescription_ids': '{pending_ids}'}}),
+    ('prices.current',           'GET',   f'/api/prices/current-prices?user_id={BENCH_USER}', {}),
+    ('prices.update',            'PATCH', '/api/prices/update',
+        {'json': {'user_id': BENCH_USER, 'drug_id': 2, 'price': 31.5}}),
+    ('prices.bulk_update',       'PATCH', '/api/prices/bulk-update',
+        {'json': {'user_id': BENCH_USER, 'prices': [{'drug_id': i, 'price': 20 + i} for i in range(1, 6)]}}),
+    ('dispense.one',             'POST',  f'/api/pharmacy/prescriptions/{{filled_id}}/dispense?user_id={BENCH_USER}', {}),
+    ('dispense.batch',           'POST',  f'/api/pharmacy/prescriptions/dispense?user_id={BENCH_USER}',
+        {'json': {'prescription_ids': '{filled_ids}'}}),
+    ('dispense.filled',          'GET',   f'/api/pharmacy/prescriptions/filled?user_id={BENCH_USER}', {}),
+    ('payments.page',            'GET',   f'/api/pharmacy/payments?user_id={BENCH_USER}&status=fulfilled&limit=50', {}),
+    ('payments.all',             'GET',   f'/api/pharmacy/payments?user_id={BENCH_USER}', {}),
+    ('payments.summary',         'GET',   f'/api/pharmacy/payments/summary?user_id={BENCH_USER}', {}),
+    ('payments.revenue',         'GET',   f'/api/pharmacy/payments/revenue?user_id={BENCH_USER}', {}),
+    ('events.stats',             'GET',   '/api/pharmacy/events/stats', {}),
+]
+
+
+def scaled(size):
+    return datagen.plan(SIZES[size])
+
+
+def seed(conn, counts, reserve, seed_value=0):
+    """
+    Fill an empty database with datagen, then set aside ``reserve`` extra
+    pending and filled prescriptions at the benchmarked pharmacy for the
+    routes that consume one per call. Returns the ids Workload hands out.
+    """
+    rng = random.Random(seed_value)
+    datagen.insert(conn, datagen.generate(counts, seed_value))
+    n_rx = counts['prescriptions']
+    cursor = conn.cursor()
+    cursor.execute("SELECT patient_id FROM patient_preferred_pharmacy WHERE pharmacy_id = 1 ORDER BY patient_id")
+    bench_patients = [row[0] for row in cursor.fetchall()] or [1]
+    # the benchmarked pharmacy never runs out of stock
+    cursor.execute("UPDATE pharmacy_inventory SET stock_quantity = %s WHERE pharmacy_id = 1", (10**9,))
+    cursor.close()
+
+    created = datagen.EPOCH.strftime('%Y-%m-%d %H:%M:%S')
+    reserved = [
+        (n_rx + i + 1, 1, rng.choice(bench_patients), 1, 1, 'Metformin', '500mg', 'bench', status, created)
+        for i, status in enumerate(['pending'] * reserve + ['filled'] * reserve)
+    ]
+    datagen.insert(conn, [('prescriptions', reserved)])
+    return {
+        'prescriptions': (1, n_rx),
+        'patients':      bench_patients,
+        'pending':       list(range(n_rx + 1, n_rx + reserve + 1)),
+        'filled':        list(range(n_rx + reserve + 1, n_rx + 2 * reserve + 1)),
+    }
+
+
+class Workload:
+    """Hands out the ids a route call needs; consumable ones never repeat."""
+
+    def __init__(self, ids, seed_value=0):
+        self._rng      = random.Random(seed_value)
+        self._rx_range = ids['prescriptions']
+        self._patients = ids['patients']
+        self._pending  = deque(ids['pending'])
+        self._filled   = deque(ids['filled'])
+
+    def __getitem__(self, field):
+        if field == 'prescription_id':
+            return self._rng.randint(*self._rx_range)
+        if field == 'patient_id':
+            return self._rng.choice(self._patients)
+        if field == 'pending_id':
+            return self._pending.popleft()
+        if field == 'pending_ids':
+            return [self._pending.popleft() for _ in range(BATCH)]
+        if field == 'filled_id':
+            return self._filled.popleft()
+        if field == 'filled_ids':
+            return [self._filled.popleft() for _ in range(BATCH)]
+        raise KeyError(field)
+
+
+def reserve_for(repeat, warmup):
+    """
+    Rows of each consumable kind a run can use up: every kind is drawn by
+    one single-row route and one BATCH-row route per call.
+    """
+    return (warmup + repeat + 1) * (1 + BATCH)
+
+
+def _fill(value, workload):
+    if isinstance(value, dict):
+        return {k: _fill(v, workload) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, workload) for v in value]
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}') and value.count('{') == 1:
+        return workload[value[1:-1]]
+    if isinstance(value, str) and '{' in value:
+        return value.format_map(workload)
+    return value
+
+
+def _call(client, method, path, kwargs, workload):
+    kwargs = dict(kwargs)
+    if 'json' in kwargs:
+        kwargs['json'] = _fill(kwargs['json'], workload)
+    resp = client.open(_fill(path, workload), method=method, **kwargs)
+    resp.get_data()
+    resp.close()
+    return resp.status_code
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def bench_route(client, route, workload, repeat, warmup):
+    import querylog
+
+    _, method, path, kwargs = route
+    for _ in range(warmup):
+        _call(client, method, path, kwargs, workload)
+    timings = []
+    # a collection landing in one call would be charged to whichever route ran
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _call(client, method, path, kwargs, workload)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        with querylog.capture() as queries:
+            status = _call(client, method, path, kwargs, workload)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'status':    status,
+        'p50_ms':    round(_percentile(timings, 50), 3),
+        'p95_ms':    round(_percentile(timings, 95), 3),
+        'p99_ms':    round(_percentile(timings, 99), 3),
+        'alloc_kib': round(peak / 1024, 1),
+        'queries':   len(queries),
+    }
+
+
+def run_size(size, counts=None, routes=ROUTES, repeat=30, warmup=3, seed_value=0, out=sys.stdout):
+    """Seed a fresh database for ``size`` and benchmark every route on it."""
+    import config
+    import db
+    import db_sqlite
+    from app import app
+    from blueprints.common import drugs, pharmacy
+
+    counts = counts or scaled(size)
+    cfg = dict(config.SQLITE_CONFIG, database=':memory:', name=f'bench-{size}')
+    keeper = db_sqlite.connect(**cfg)
+    try:
+        started = time.perf_counter()
+        ids = seed(keeper, counts, reserve_for(repeat, warmup), seed_value)
+        print(f"[{size}] seeded {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s", file=out)
+
+        db.set_pool(db.ConnectionPool(cfg, size=2, driver='sqlite'))
+        pharmacy.clear_cache()
+        drugs.clear_cache()
+        results = {}
+        client = app.test_client()
+        workload = Workload(ids, seed_value)
+        for route in routes:
+            results[route[0]] = bench_route(client, route, workload, repeat, warmup)
+        return results
+    finally:
+        db.reset_pool()
+        pharmacy.clear_cache()
+        drugs.clear_cache()
+        keeper.close()
+
+
+def compare(results, baseline, tolerance=1.0, floor_ms=2.0):
+    """Regressions of ``results`` against ``baseline``, as readable strings."""
+    problems = []
+    for size, routes in results.items():
+        for name, r in routes.items():
+            if r['status'] >= 400:
+                problems.append(f"{size} {name}: HTTP {r['status']}")
+            b = baseline.get(size, {}).get(name)
+            if b is None:
+                continue
+            if r['queries'] > b['queries']:
+                problems.append(f"{size} {name}: {r['queries']} queries, baseline {b['queries']}")
+            if r['p50_ms'] > b['p50_ms'] * (1 + tolerance) and r['p50_ms'] - b['p50_ms'] > floor_ms:
+                problems.append(f"{size} {name}: p50 {r['p50_ms']} ms vs baseline {b['p50_ms']} ms")
+            if r['alloc_kib'] > b['alloc_kib'] * (1 + tolerance) and r['alloc_kib'] - b['alloc_kib'] > 64:
+                problems.append(f"{size} {name}: alloc {r['alloc_kib']} KiB vs baseline {b['alloc_kib']} KiB")
+    return problems
+
+
+def report(size, results, out=sys.stdout):
+    print(f"\n{size}", file=out)
+    print(f"  {'route':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'alloc KiB':>10} {'queries':>8} {'status':>7}",
+          file=out)
+    for name, r in results.items():
+        print(f"  {name:<24} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} "
+              f"{r['alloc_kib']:>10.1f} {r['queries']:>8} {r['status']:>7}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('command', choices=('run', 'baseline'))
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                        help=f"comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help="allowed slowdown / growth over the baseline, as a fraction")
+    parser.add_argument('--floor-ms', type=float, default=2.0)
+    parser.add_argument('--out', help="also write the results here as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    results = {}
+    for size in sizes:
+        results[size] = run_size(size, repeat=args.repeat, warmup=args.warmup, seed_value=args.seed)
+        report(size, results[size])
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.command == 'baseline':
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    else:
+        print(f"\nno baseline at {args.baseline}; run `python bench.py baseline` to record one")
+    problems = compare(results, baseline, args.tolerance, args.floor_ms)
+    for p in problems:
+        print(f"FAIL  {p}")
+    print(f"\n{sum(len(r) for r in results.values())} route benchmarks, {len(problems)} regressions")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""
+Helpers for the set-based batch endpoints.
+"""
+from config import BATCH_MAX_SIZE
+
+
+class InvalidBatch(ValueError):
+    """The request body does not hold a usable list of items."""
+
+
+def placeholders(n):
+    """``%s, %s, ...`` for an ``IN (...)`` list of ``n`` values."""
+    return ', '.join(['%s'] * n)
+
+
+def parse_id_list(data, key):
+    """
+    Return the de-duplicated list of integer ids under ``data[key]``,
+    keeping the order the client sent them in.
+    """
+    ids = (data or {}).get(key)
+    if not isinstance(ids, list) or not ids:
+        raise InvalidBatch(f"{key} must be a non-empty list")
+    if len(ids) > BATCH_MAX_SIZE:
+        raise InvalidBatch(f"at most {BATCH_MAX_SIZE} {key} per request")
+    try:
+        ids = [int(i) for i in ids]
+    except (TypeError, ValueError):
+        raise InvalidBatch(f"{key} must be integers")
+    return list(dict.fromkeys(ids))
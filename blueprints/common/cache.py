@@ -0,0 +1,69 @@
+"""
+Small in-process caches shared by the blueprints.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Once ``max_size`` entries are stored the least recently used one is
+    evicted. Hit, miss, eviction and clear counters are kept for
+    ``stats()``; clearing drops the entries but not the counters.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size=1024, ttl=60.0):
+        self.max_size = max_size
+        self.ttl      = ttl
+        self._data    = OrderedDict()
+        self._lock    = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self.clears    = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is not self._MISSING:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.clears += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size':      len(self._data),
+                'max_size':  self.max_size,
+                'ttl':       self.ttl,
+                'hits':      self.hits,
+                'misses':    self.misses,
+                'evictions': self.evictions,
+                'clears':    self.clears,
+                'hit_rate':  round(self.hits / lookups, 4) if lookups else 0.0,
+            }
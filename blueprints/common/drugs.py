@@ -0,0 +1,182 @@
+"""
+In-process cache of the weight_loss_drugs catalog.
+
+The catalog is a handful of rows that almost never change, but prescribing,
+fulfilling, pricing and restocking all need it. It is loaded once per
+process and then served from memory. It is reloaded when the TTL expires,
+when ``refresh()`` is called, or when a caller asks for a drug_id it has not
+seen (rate-limited, so unknown ids can't force a reload on every request).
+
+Each worker process loads its own copy. ``refresh(cursor)`` also marks
+the catalog changed in ``cache_versions``, so every other worker reloads
+it on its next poll (invalidation.py).
+
+``version()`` is bumped whenever a reload returns different rows, so
+callers can use it as a cheap change token. ``etag()`` hashes the rows
+themselves, so unlike the version it is the same in every worker process.
+"""
+import json
+import threading
+import time
+
+from db import get_db
+from blueprints.common.etag import make_etag
+from config import DRUG_CATALOG_CONFIG
+import invalidation
+
+
+def _key(name):
+    return (name or '').strip().lower()
+
+
+class _Snapshot:
+    def __init__(self, rows, loaded_at):
+        self.rows      = rows
+        self.by_id     = {row['drug_id']: row for row in rows}
+        self.by_key    = {_key(row['name']): row for row in rows}
+        self.loaded_at = loaded_at
+        self.etag      = make_etag('drugs', json.dumps(rows, sort_keys=True, default=str))
+
+
+class DrugCatalog:
+    def __init__(self, ttl=600.0, miss_refresh_after=5.0):
+        self.ttl                = ttl
+        self.miss_refresh_after = miss_refresh_after
+        self._snapshot  = None
+        self._load_lock = threading.Lock()
+        self.version = 0
+        self.loads   = 0
+        self.hits    = 0
+
+    def _fetch(self):
+        cursor = get_db().cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT drug_id, name, description
+                  FROM weight_loss_drugs
+                ORDER BY drug_id
+            """)
+            return tuple(dict(row) for row in cursor.fetchall())
+        finally:
+            cursor.close()
+
+    def refresh(self):
+        with self._load_lock:
+            return self._reload()
+
+    def _reload(self):
+        rows = self._fetch()
+        old = self._snapshot
+        if old is None or old.rows != rows:
+            self.version += 1
+        self._snapshot = _Snapshot(rows, time.monotonic())
+        self.loads += 1
+        return self._snapshot
+
+    def expire(self):
+        """Make the next lookup reload, keeping the counters."""
+        with self._load_lock:
+            if self._snapshot is not None:
+                self._snapshot.loaded_at = float('-inf')
+
+    def snapshot(self):
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - snap.loaded_at < self.ttl:
+            self.hits += 1
+            return snap
+        with self._load_lock:
+            # another thread may have reloaded while we waited
+            snap = self._snapshot
+            if snap is not None and time.monotonic() - snap.loaded_at < self.ttl:
+                return snap
+            return self._reload()
+
+    def _lookup(self, index, key):
+        snap = self.snapshot()
+        row = getattr(snap, index).get(key)
+        if row is None and time.monotonic() - snap.loaded_at >= self.miss_refresh_after:
+            with self._load_lock:
+                if self._snapshot is snap:
+                    snap = self._reload()
+                else:
+                    snap = self._snapshot
+            row = getattr(snap, index).get(key)
+        return row
+
+    def get(self, drug_id):
+        return self._lookup('by_id', int(drug_id))
+
+    def find_by_name(self, name):
+        return self._lookup('by_key', _key(name))
+
+    def clear(self):
+        with self._load_lock:
+            self._snapshot = None
+            self.version = self.loads = self.hits = 0
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            'drugs':   len(snap.rows) if snap else 0,
+            'version': self.version,
+            'loads':   self.loads,
+            'hits':    self.hits,
+            'age_s':   round(time.monotonic() - snap.loaded_at, 1) if snap else None,
+            'ttl':     self.ttl,
+        }
+
+
+_catalog = DrugCatalog(**DRUG_CATALOG_CONFIG)
+
+
+def current():
+    """The current catalog snapshot, with ``.rows`` and ``.etag`` from the same load."""
+    return _catalog.snapshot()
+
+
+def all_drugs():
+    """Every drug, ordered by drug_id."""
+    return list(_catalog.snapshot().rows)
+
+
+def get_drug(drug_id):
+    """The catalog row for ``drug_id``, or None."""
+    return _catalog.get(drug_id)
+
+
+def find_drug_id(name):
+    """drug_id for a drug name (case/whitespace-insensitive), or None."""
+    row = _catalog.find_by_name(name)
+    return row['drug_id'] if row else None
+
+
+def etag():
+    """Content hash of the catalog, for conditional GETs."""
+    return _catalog.snapshot().etag
+
+
+def refresh(cursor=None):
+    """
+    Reload the catalog in this worker. With ``cursor``, also mark it
+    changed for every other worker; the caller commits.
+    """
+    if cursor is not None:
+        invalidation.bump(cursor, invalidation.DRUGS)
+    _catalog.refresh()
+    return _catalog.version
+
+
+def version():
+    _catalog.snapshot()
+    return _catalog.version
+
+
+def clear_cache():
+    _catalog.clear()
+
+
+def cache_stats():
+    return _catalog.stats()
+
+
+invalidation.register(invalidation.DRUGS, _catalog.expire)
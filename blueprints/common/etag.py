@@ -0,0 +1,37 @@
+"""
+Conditional GET helpers.
+
+An endpoint computes a cheap version token for its data, asks
+``not_modified(token)`` whether the client already holds that version, and
+only runs its main query when it doesn't:
+
+    etag = make_etag('inventory', pharm_id, count, changed)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    ...
+    return with_etag(jsonify(rows), etag)
+"""
+import hashlib
+
+from flask import Response, request
+
+
+def make_etag(*parts):
+    """Stable token for ``parts``; equal parts give equal tokens in every worker."""
+    raw = '\x1f'.join('' if p is None else str(p) for p in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # per-user data: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag):
+    """A 304 response if the request's If-None-Match covers ``etag``, else None."""
+    if request.if_none_match.contains_weak(etag):
+        return with_etag(Response(status=304), etag)
+    return None
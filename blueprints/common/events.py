@@ -0,0 +1,266 @@
+"""
+Per-pharmacy change feed.
+
+Writers append to ``pharmacy_events`` inside the transaction that makes the
+change (``record``), then ``notify`` the in-process hub once they have
+committed. Each open event stream sleeps on the hub and, when woken, reads
+``event_id > last`` from the change log. The log is the only source of
+events, so a live stream and a reconnecting one (``Last-Event-ID``) see the
+same sequence.
+
+A stream also re-checks the log every ``idle_check`` seconds. That covers
+changes committed by other worker processes, which this process's hub never
+hears about.
+
+Each open stream holds a request thread, so a worker serves at most
+``max_streams`` of them at once and turns the rest away with 503. Every
+stream ends after ``max_duration`` seconds. The browser's EventSource then
+reconnects on its own and resumes from the ``id:`` it saw last, which the
+stream sends up front even when there are no events yet.
+
+Under the ASGI server (asgi.py) a stream needs no thread: the view only
+marks the request (``ASYNC_STREAM``) and the server runs ``aiter_stream``
+on its event loop, reading the log through ``db_async``. Those streams
+are capped separately, at ``max_async_streams`` per worker.
+"""
+import asyncio
+import threading
+import time
+
+from flask import current_app
+
+import db
+import db_async
+from config import SSE_CONFIG
+
+CREATED = 'created'
+STATUS  = 'status'
+
+# WSGI environ key set by asgi.py; the events view stores its stream
+# parameters under it for the server to serve from the event loop
+ASYNC_STREAM = 'pharmacy.async_stream'
+
+
+def record(cursor, pharmacy_id, prescription_ids, kind, status):
+    """Append one event per prescription; call before the caller commits."""
+    if not prescription_ids:
+        return
+    rows = ', '.join(['(%s, %s, %s, %s)'] * len(prescription_ids))
+    params = [v for pid in prescription_ids for v in (pharmacy_id, pid, kind, status)]
+    cursor.execute(f"""
+        INSERT INTO pharmacy_events (pharmacy_id, prescription_id, kind, status)
+        VALUES {rows}
+    """, tuple(params))
+
+
+class EventHub:
+    """Wakes the streams subscribed to a pharmacy. Carries no payload."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, pharmacy_id, limit=None, wakeup=None):
+        """
+        Register ``wakeup`` (a new threading.Event by default) for
+        ``pharmacy_id`` and return it, or None if ``limit`` streams are
+        already open.
+        """
+        wakeup = wakeup or threading.Event()
+        with self._lock:
+            if limit is not None and sum(len(s) for s in self._subscribers.values()) >= limit:
+                return None
+            self._subscribers.setdefault(pharmacy_id, set()).add(wakeup)
+        return wakeup
+
+    def unsubscribe(self, pharmacy_id, wakeup):
+        with self._lock:
+            subs = self._subscribers.get(pharmacy_id)
+            if subs is not None:
+                subs.discard(wakeup)
+                if not subs:
+                    del self._subscribers[pharmacy_id]
+
+    def notify(self, pharmacy_id):
+        with self._lock:
+            subs = list(self._subscribers.get(pharmacy_id, ()))
+        for wakeup in subs:
+            wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pharmacies':  len(self._subscribers),
+                'subscribers': sum(len(s) for s in self._subscribers.values()),
+            }
+
+
+class AsyncWakeup:
+    """An asyncio.Event the hub can set from any thread."""
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def set(self):
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # the loop has shut down; nobody is waiting any more
+            pass
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+hub = EventHub()
+
+
+def notify(pharmacy_id):
+    """Tell this process's streams that ``pharmacy_id`` has new events."""
+    hub.notify(pharmacy_id)
+
+
+def latest_event_id(cursor, pharmacy_id):
+    cursor.execute(
+        "SELECT COALESCE(MAX(event_id), 0) AS last FROM pharmacy_events WHERE pharmacy_id = %s",
+        (pharmacy_id,)
+    )
+    return cursor.fetchone()['last']
+
+
+_EVENTS_SINCE = """
+    SELECT event_id, prescription_id, kind, status, created_at
+      FROM pharmacy_events
+     WHERE pharmacy_id = %s
+       AND event_id    > %s
+     ORDER BY event_id
+     LIMIT %s
+"""
+
+
+def events_since(cursor, pharmacy_id, last_id, limit):
+    cursor.execute(_EVENTS_SINCE, (pharmacy_id, last_id, limit))
+    return cursor.fetchall()
+
+
+def format_event(row, dumps=None):
+    """One SSE message; ``dumps`` defaults to the current app's JSON provider."""
+    data = (dumps or current_app.json.dumps)({
+        'event_id':        row['event_id'],
+        'prescription_id': row['prescription_id'],
+        'status':          row['status'],
+        'at':              row['created_at'],
+    })
+    return f"id: {row['event_id']}\nevent: prescription.{row['kind']}\ndata: {data}\n\n"
+
+
+def _drain(pharmacy_id, last_id):
+    """Every logged event after ``last_id``, a page at a time, on a borrowed connection."""
+    limit = SSE_CONFIG['replay_limit']
+    with db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            while True:
+                rows = events_since(cursor, pharmacy_id, last_id, limit)
+                yield from rows
+                if len(rows) < limit:
+                    return
+                last_id = rows[-1]['event_id']
+        finally:
+            cursor.close()
+
+
+async def _adrain(pharmacy_id, last_id):
+    """``_drain`` for the event loop, collected into a list."""
+    limit = SSE_CONFIG['replay_limit']
+    found = []
+    async with db_async.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            while True:
+                await cursor.execute(_EVENTS_SINCE, (pharmacy_id, last_id, limit))
+                rows = await cursor.fetchall()
+                found.extend(rows)
+                if len(rows) < limit:
+                    return found
+                last_id = rows[-1]['event_id']
+        finally:
+            await cursor.close()
+
+
+def open_stream(pharmacy_id):
+    """Subscribe a new stream, or return None when this worker is at ``max_streams``."""
+    return hub.subscribe(pharmacy_id, limit=SSE_CONFIG['max_streams'])
+
+
+def close_stream(pharmacy_id, wakeup):
+    hub.unsubscribe(pharmacy_id, wakeup)
+
+
+def iter_stream(pharmacy_id, last_id, wakeup):
+    """
+    Yield SSE chunks for ``pharmacy_id`` after ``last_id`` until the client
+    goes away or ``max_duration`` passes. ``wakeup`` comes from ``open_stream``.
+    """
+    deadline = time.monotonic() + SSE_CONFIG['max_duration']
+    try:
+        # the id line gives a client that reconnects before any event
+        # arrives a position to resume from
+        yield f"retry: {SSE_CONFIG['retry_ms']}\nid: {last_id}\n\n"
+        while True:
+            # clear before reading so a notify that lands mid-query isn't lost
+            wakeup.clear()
+            sent = False
+            for row in list(_drain(pharmacy_id, last_id)):
+                last_id = row['event_id']
+                sent = True
+                yield format_event(row)
+            if not sent:
+                yield ": keepalive\n\n"
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            wakeup.wait(min(SSE_CONFIG['idle_check'], remaining))
+    finally:
+        close_stream(pharmacy_id, wakeup)
+
+
+def open_async_stream(pharmacy_id):
+    """``open_stream`` for the event loop; None at ``max_async_streams``."""
+    return hub.subscribe(pharmacy_id, limit=SSE_CONFIG['max_async_streams'], wakeup=AsyncWakeup())
+
+
+async def aiter_stream(pharmacy_id, last_id, wakeup, dumps):
+    """
+    ``iter_stream`` for the event loop. ``wakeup`` comes from
+    ``open_async_stream``; ``dumps`` serialises event data outside an app
+    context.
+    """
+    deadline = time.monotonic() + SSE_CONFIG['max_duration']
+    try:
+        yield f"retry: {SSE_CONFIG['retry_ms']}\nid: {last_id}\n\n"
+        while True:
+            wakeup.clear()
+            rows = await _adrain(pharmacy_id, last_id)
+            for row in rows:
+                last_id = row['event_id']
+                yield format_event(row, dumps)
+            if not rows:
+                yield ": keepalive\n\n"
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            await wakeup.wait(min(SSE_CONFIG['idle_check'], remaining))
+    finally:
+        close_stream(pharmacy_id, wakeup)
+
+
+def stats():
+    return hub.stats()
@@ -0,0 +1,93 @@
+"""
+Incremental parsing for bulk inventory imports.
+
+The request body is read line by line from the WSGI input stream and never
+loaded whole, so memory use stays flat however large the supplier feed is.
+"""
+import csv
+import io
+import json
+
+FORMATS = {
+    'text/csv':             'csv',
+    'application/csv':      'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson':   'ndjson',
+    'application/jsonl':    'ndjson',
+}
+
+
+class ImportFormatError(ValueError):
+    """The body can't be read as the requested format at all."""
+
+
+def detect_format(mimetype, override=None):
+    if override:
+        if override not in ('csv', 'ndjson'):
+            raise ImportFormatError("format must be csv or ndjson")
+        return override
+    fmt = FORMATS.get(mimetype)
+    if not fmt:
+        raise ImportFormatError("send text/csv or application/x-ndjson (or pass ?format=)")
+    return fmt
+
+
+def _validate(record):
+    drug_name = str(record.get('drug_name') or '').strip()
+    if not drug_name:
+        raise ValueError("drug_name is required")
+    try:
+        qty = int(record.get('stock_quantity'))
+    except (TypeError, ValueError):
+        raise ValueError("stock_quantity must be an integer")
+    if qty < 0:
+        raise ValueError("stock_quantity must not be negative")
+    return drug_name, qty
+
+
+def _csv_records(text):
+    reader = csv.DictReader(text)
+    try:
+        if not reader.fieldnames or not {'drug_name', 'stock_quantity'} <= set(reader.fieldnames):
+            raise ImportFormatError("CSV header must include drug_name and stock_quantity")
+        for record in reader:
+            yield reader.line_num, record
+    except csv.Error as e:
+        # e.g. an unterminated quote swallowing the rest of the body
+        raise ImportFormatError(f"malformed CSV after line {reader.line_num}: {e}")
+
+
+def _ndjson_records(text):
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None
+            continue
+        yield line_no, record if isinstance(record, dict) else None
+
+
+def iter_inventory_rows(stream, fmt):
+    """
+    Yield ``(line_no, (drug_name, qty), None)`` for good rows and
+    ``(line_no, None, error)`` for rejected ones. Raises ImportFormatError
+    once the body can't be read as ``fmt`` at all (bad header, malformed
+    CSV, bytes that aren't UTF-8); the rows yielded before that stand.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    records = _csv_records(text) if fmt == 'csv' else _ndjson_records(text)
+    line_no = 0
+    try:
+        for line_no, record in records:
+            if record is None:
+                yield line_no, None, "not a JSON object"
+                continue
+            try:
+                yield line_no, _validate(record), None
+            except ValueError as e:
+                yield line_no, None, str(e)
+    except UnicodeDecodeError:
+        # the body is decoded a buffer at a time, so only the last good line is known
+        raise ImportFormatError(f"body is not UTF-8 text (after line {line_no})")
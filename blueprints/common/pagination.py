@@ -0,0 +1,110 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page is requested with ``?limit=<n>&after=<cursor>``. The cursor is an
+opaque token wrapping the sort key of the last row the client saw, so the
+next page is a plain index range scan instead of an ever-growing OFFSET.
+"""
+import base64
+from datetime import date, datetime
+import json
+
+from config import PAGE_CONFIG
+
+
+class InvalidPageRequest(ValueError):
+    """Bad ``limit`` or ``after`` query parameter."""
+
+
+def wants_page(args):
+    return 'limit' in args or 'after' in args
+
+
+def parse_page_args(args):
+    """Return ``(limit, after_values)`` from the query string."""
+    raw_limit = args.get('limit')
+    if raw_limit is None:
+        limit = PAGE_CONFIG['default_limit']
+    else:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise InvalidPageRequest("limit must be an integer")
+        if limit <= 0:
+            raise InvalidPageRequest("limit must be positive")
+    limit = min(limit, PAGE_CONFIG['max_limit'])
+
+    token = args.get('after')
+    return limit, decode_cursor(token) if token else None
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return {'t': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    # only what _encode_value writes: sort keys are never null, booleans,
+    # lists or other objects
+    if isinstance(value, dict):
+        if set(value) != {'t'} or not isinstance(value['t'], str):
+            raise ValueError(value)
+        return datetime.fromisoformat(value['t'])
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list):
+            raise ValueError(token)
+        return [_decode_value(v) for v in values]
+    except ValueError:
+        raise InvalidPageRequest("after is not a valid cursor")
+
+
+def keyset_condition(columns, after, descending=False):
+    """
+    SQL predicate selecting rows strictly after ``after`` in
+    ``ORDER BY columns`` order. Spelled out as OR-ed equality prefixes
+    rather than a row constructor so MySQL can use a range scan on the
+    composite index.
+    """
+    if len(after) != len(columns):
+        raise InvalidPageRequest("after is not a valid cursor")
+
+    op = '<' if descending else '>'
+    clauses, params = [], []
+    for i, col in enumerate(columns):
+        parts = [f"{c} = %s" for c in columns[:i]] + [f"{col} {op} %s"]
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(after[:i + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def order_by(columns, descending=False):
+    direction = ' DESC' if descending else ' ASC'
+    return " ORDER BY " + ", ".join(c + direction for c in columns)
+
+
+def build_page(rows, limit, key_fields):
+    """
+    Trim the ``limit + 1`` rows fetched by the caller to one page and return
+    ``{"items": [...], "next_cursor": <token or None>}``.
+    """
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor([last[f] for f in key_fields])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,59 @@
+"""
+Shared user_id -> pharmacy_id resolution.
+
+Every pharmacy endpoint starts by mapping the caller's user_id to their
+active pharmacy. The answer almost never changes, so positive lookups are
+kept in a bounded TTL/LRU cache; unknown or inactive users always go to the
+database so a newly activated pharmacy is picked up right away.
+
+Every worker process has its own cache. Any UPDATE or DELETE on
+``pharmacies`` bumps the 'pharmacies' row of ``cache_versions`` from a
+trigger (migration 009), however the change was made, and each worker
+clears its cache when it sees the bump (invalidation.py). A deactivated
+pharmacy is so served for at most one poll interval, or for the TTL if the
+watcher isn't running.
+"""
+from blueprints.common.cache import TTLCache
+from config import PHARMACY_CACHE_CONFIG
+import invalidation
+
+_pharmacy_ids = TTLCache(**PHARMACY_CACHE_CONFIG)
+
+
+def get_pharmacy_id_for_user(user_id, cursor):
+    """Return the active pharmacy_id for ``user_id``, or None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        # e.g. "user_id": "abc" in a JSON body: nobody's pharmacy
+        return None
+    pharm_id = _pharmacy_ids.get(user_id)
+    if pharm_id is not None:
+        return pharm_id
+
+    cursor.execute("""
+        SELECT pharmacy_id
+          FROM pharmacies
+         WHERE user_id = %s
+           AND is_active = TRUE
+        LIMIT 1;
+    """, (user_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    # callers use both dictionary and tuple cursors
+    pharm_id = row['pharmacy_id'] if isinstance(row, dict) else row[0]
+    _pharmacy_ids.set(user_id, pharm_id)
+    return pharm_id
+
+
+def clear_cache():
+    _pharmacy_ids.clear()
+
+
+invalidation.register(invalidation.PHARMACIES, clear_cache)
+
+
+def cache_stats():
+    return _pharmacy_ids.stats()
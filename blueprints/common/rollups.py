@@ -0,0 +1,51 @@
+"""
+Daily payment rollups.
+
+``payments_daily`` holds one row per pharmacy per day with the number and
+sum of payments created that day. The dispense endpoints call
+``record_payments`` right after inserting payments and before committing,
+so the rollup and the payments it summarises always commit together.
+``rebuild`` recomputes the rollup from payments_pharmacy.
+"""
+
+# Aggregates the payments just inserted and folds them into their day's row.
+# The day comes from the stored payment_date, not a second NOW(), so a
+# transaction that straddles midnight still lands on the right row.
+_RECORD = """
+    INSERT INTO payments_daily (pharmacy_id, day, payment_count, amount_total)
+    SELECT pharmacy_id, DATE(payment_date), COUNT(*), SUM(amount)
+      FROM payments_pharmacy
+     WHERE payment_id BETWEEN %s AND %s
+     GROUP BY pharmacy_id, DATE(payment_date)
+    ON DUPLICATE KEY UPDATE
+        payment_count = payment_count + VALUES(payment_count),
+        amount_total  = amount_total  + VALUES(amount_total)
+"""
+
+
+def record_payments(cursor, first_payment_id, last_payment_id=None):
+    """Add payments ``first_payment_id..last_payment_id`` to the rollup."""
+    if last_payment_id is None:
+        last_payment_id = first_payment_id
+    cursor.execute(_RECORD, (first_payment_id, last_payment_id))
+
+
+def rebuild(cursor, pharmacy_id=None):
+    """
+    Recompute payments_daily from payments_pharmacy, for one pharmacy or
+    all of them. Run it inside a transaction: the INSERT ... SELECT locks
+    the payments it reads, so dispenses that happen meanwhile wait instead
+    of being counted twice or lost. Returns the number of rollup rows written.
+    """
+    where, params = "", ()
+    if pharmacy_id is not None:
+        where, params = "WHERE pharmacy_id = %s", (pharmacy_id,)
+    cursor.execute(f"DELETE FROM payments_daily {where}", params)
+    cursor.execute(f"""
+        INSERT INTO payments_daily (pharmacy_id, day, payment_count, amount_total)
+        SELECT pharmacy_id, DATE(payment_date), COUNT(*), COALESCE(SUM(amount), 0)
+          FROM payments_pharmacy
+          {where}
+         GROUP BY pharmacy_id, DATE(payment_date)
+    """, params)
+    return cursor.rowcount
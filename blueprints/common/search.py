@@ -0,0 +1,58 @@
+"""
+Search predicates backed by the ngram FULLTEXT indexes in
+Database/migrations/001_search_fulltext.sql.
+
+Rows are filtered with ``MATCH ... AGAINST`` in boolean mode, requiring
+every word of the term as a phrase. On an ngram index a phrase is its
+ngrams in order, so this is a substring match per word: "metformin" finds
+Metformin but not Orlistat, which shares only the "or" bigram with it.
+Natural language mode scores any row sharing a single ngram with the
+term, so it only ranks the rows the filter kept (exact matches first).
+Because both read the FULLTEXT index, the cost depends on the number of
+matching rows, not on the table size. Terms shorter than the ngram size
+fall back to a prefix ``LIKE``, which can still use a B-tree index.
+"""
+import re
+
+from config import SEARCH_MIN_TERM_LENGTH
+
+_WHITESPACE = re.compile(r'\s+')
+# characters with a meaning in a boolean mode query
+_BOOLEAN_OPERATORS = re.compile(r'[-+<>()~*"@]')
+
+
+def normalize(term):
+    return _WHITESPACE.sub(' ', (term or '').strip())
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def is_fulltext(term):
+    return len(term) >= SEARCH_MIN_TERM_LENGTH
+
+
+def relevance(columns, term):
+    """Score expression for ranking, e.g. in ORDER BY ... DESC."""
+    return f"MATCH({', '.join(columns)}) AGAINST (%s IN NATURAL LANGUAGE MODE)", [term]
+
+
+def boolean_query(term):
+    """``+"word"`` for every word of ``term`` long enough to be indexed."""
+    words = _BOOLEAN_OPERATORS.sub(' ', term).split()
+    return ' '.join(f'+"{w}"' for w in words if is_fulltext(w))
+
+
+def match_condition(columns, term):
+    """
+    WHERE predicate for ``term`` against a FULLTEXT index over ``columns``:
+    every word must occur in one of the columns. Short terms become a
+    prefix LIKE on each column instead.
+    """
+    query = boolean_query(term) if is_fulltext(term) else ''
+    if query:
+        return f"MATCH({', '.join(columns)}) AGAINST (%s IN BOOLEAN MODE)", [query]
+    pattern = _escape_like(term) + '%'
+    sql = " OR ".join(f"{c} LIKE %s" for c in columns)
+    return f"({sql})", [pattern] * len(columns)
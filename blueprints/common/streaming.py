@@ -0,0 +1,66 @@
+"""
+Streaming JSON responses for large list endpoints.
+
+Rows are read from an unbuffered cursor in ``fetchmany`` batches and
+written out as JSON array chunks, so a worker only ever holds one batch in
+memory no matter how many rows the query returns. Opt in with ``?stream=1``.
+"""
+from flask import Response, current_app, stream_with_context
+import mysql.connector
+
+from config import STREAM_BATCH_SIZE
+
+
+def wants_stream(args):
+    return args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def iter_rows(conn, query, params=(), batch_size=None):
+    """Yield rows one at a time, pulling ``batch_size`` rows per round trip."""
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield from batch
+    finally:
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            # client went away mid-stream; drain what's left so the pooled
+            # connection can be handed out again
+            conn.consume_results()
+
+
+def iter_json_array(rows):
+    """Encode an iterable of rows as JSON array chunks, one row per chunk."""
+    dumps = current_app.json.dumps
+    yield '['
+    first = True
+    for row in rows:
+        yield dumps(row) if first else ',' + dumps(row)
+        first = False
+    yield ']'
+
+
+def iter_json_object(sections):
+    """Encode ``[(key, rows), ...]`` as a JSON object whose values are arrays."""
+    dumps = current_app.json.dumps
+    yield '{'
+    for i, (key, rows) in enumerate(sections):
+        yield ('' if i == 0 else ',') + dumps(key) + ':'
+        yield from iter_json_array(rows)
+    yield '}'
+
+
+def stream_response(chunks):
+    # stream_with_context keeps the request (and its pooled connection)
+    # alive until the last chunk has been sent
+    return Response(stream_with_context(chunks), mimetype='application/json')
+
+
+def stream_json_array(conn, query, params=()):
+    return stream_response(iter_json_array(iter_rows(conn, query, params)))
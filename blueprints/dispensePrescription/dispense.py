@@ -1,21 +1,14 @@
 from flask import Blueprint, request, jsonify
 import mysql.connector
-from config import DB_CONFIG
+from db import get_db, read_only
+from blueprints.common.pharmacy import get_pharmacy_id_for_user as _get_pharmacy_id_for_user
+from blueprints.common.batch import InvalidBatch, parse_id_list, placeholders
+from blueprints.common import events
+from blueprints.common.rollups import record_payments
 import sys
 
 dispense_prescription_bp = Blueprint('dispense_prescription', __name__, url_prefix='/api/pharmacy')
 
-def _get_pharmacy_id_for_user(user_id, cursor):
-    cursor.execute("""
-        SELECT pharmacy_id
-          FROM pharmacies
-         WHERE user_id = %s
-           AND is_active = TRUE
-        LIMIT 1;
-    """, (user_id,))
-    row = cursor.fetchone()
-    return row['pharmacy_id'] if row else None
-
 @dispense_prescription_bp.route('/prescriptions/<int:prescription_id>/dispense', methods=['POST'])
 def dispense_prescription(prescription_id):
     # 1) extract and validate the pharmacy’s user_id
@@ -23,7 +16,7 @@ def dispense_prescription(prescription_id):
     if not user_id:
         return jsonify(error="user_id is required"), 400
 
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     try:
         # 2) resolve pharmacy_id
@@ -59,13 +52,19 @@ def dispense_prescription(prescription_id):
             return jsonify(error="Price not set for this drug"), 500
         amount = price_row['price']
 
-        # 5) mark as dispensed
+        # 5) mark as dispensed. The status check is repeated in the WHERE
+        #    clause, so of two concurrent dispenses only one gets the row
+        #    and creates a payment
         cursor.execute("""
             UPDATE prescriptions
                SET status = 'dispensed'
              WHERE prescription_id = %s
                AND pharmacy_id     = %s
+               AND status          = 'filled'
         """, (prescription_id, pharm_id))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return jsonify(error="Prescription already dispensed"), 409
 
         # 6) create the payment record
         cursor.execute("""
@@ -75,7 +74,12 @@ def dispense_prescription(prescription_id):
         """, (pharm_id, patient_id, amount))
         payment_id = cursor.lastrowid
 
+        # 7) fold it into the daily rollup before committing
+        record_payments(cursor, payment_id)
+        events.record(cursor, pharm_id, [prescription_id], events.STATUS, 'dispensed')
+
         conn.commit()
+        events.notify(pharm_id)
 
         return jsonify(
             message="Prescription dispensed and payment created",
@@ -92,9 +96,124 @@ def dispense_prescription(prescription_id):
 
     finally:
         cursor.close()
-        conn.close()
+
+@dispense_prescription_bp.route('/prescriptions/dispense', methods=['POST'])
+def dispense_prescriptions_batch():
+    """
+    Dispense many filled prescriptions and create their payments in one call.
+    Query:  ?user_id=<pharmacy_user_id>
+    Body:   { "prescription_ids": [12, 13] }
+    Response: {
+      "results": { "12": {"payment_id": 101, "amount": "42.00"}, "13": {"error": "…"} },
+      "payment_ids": [101],
+      "dispensed": 1,
+      "failed": 1
+    }
+    Pricing is one joined query, payments are one multi-row INSERT (plus a
+    read-back of their ids and one rollup upsert) and the status change is
+    one UPDATE, all inside a single transaction.
+    """
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify(error="user_id is required"), 400
+    try:
+        ids = parse_id_list(request.get_json(silent=True), 'prescription_ids')
+    except InvalidBatch as e:
+        return jsonify(error=str(e)), 400
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="No active pharmacy found for that user"), 404
+
+        # 1) ownership, status and price for every prescription at once
+        cursor.execute(f"""
+            SELECT pr.prescription_id,
+                   pr.patient_id,
+                   pr.status,
+                   dp.price
+              FROM prescriptions pr
+              LEFT JOIN pharmacy_drug_prices dp ON dp.pharmacy_id = pr.pharmacy_id
+                                               AND dp.drug_id     = pr.drug_id
+             WHERE pr.pharmacy_id = %s
+               AND pr.prescription_id IN ({placeholders(len(ids))})
+               FOR UPDATE
+        """, (pharm_id, *ids))
+        found = {row['prescription_id']: row for row in cursor.fetchall()}
+
+        results = {}
+        ready   = []
+        for pid in ids:
+            pres = found.get(pid)
+            if not pres:
+                results[pid] = {"error": "Prescription not found or unauthorized"}
+            elif pres['status'] != 'filled':
+                results[pid] = {"error": "Prescription not ready for dispense"}
+            elif pres['price'] is None:
+                results[pid] = {"error": "Price not set for this drug"}
+            else:
+                ready.append(pres)
+
+        payment_ids = []
+        if ready:
+            # 2) one multi-row insert for all payments
+            rows = ', '.join(['(%s, %s, %s, FALSE, NOW())'] * len(ready))
+            values = [v for pres in ready for v in (pharm_id, pres['patient_id'], pres['price'])]
+            cursor.execute(f"""
+                INSERT INTO payments_pharmacy
+                  (pharmacy_id, patient_id, amount, is_fulfilled, payment_date)
+                VALUES {rows}
+            """, tuple(values))
+            # lastrowid is the first id of the insert. The rest are read back
+            # rather than counted up from it, since their spacing follows
+            # auto_increment_increment (2 or more on multi-primary setups).
+            # Ids are assigned in VALUES order.
+            cursor.execute("""
+                SELECT payment_id
+                  FROM payments_pharmacy
+                 WHERE pharmacy_id = %s
+                   AND payment_id >= %s
+                 ORDER BY payment_id
+                 LIMIT %s
+            """, (pharm_id, cursor.lastrowid, len(ready)))
+            payment_ids = [row['payment_id'] for row in cursor.fetchall()]
+            record_payments(cursor, payment_ids[0], payment_ids[-1])
+
+            # 3) mark them all as dispensed
+            ready_ids = [pres['prescription_id'] for pres in ready]
+            cursor.execute(f"""
+                UPDATE prescriptions
+                   SET status = 'dispensed'
+                 WHERE pharmacy_id = %s
+                   AND prescription_id IN ({placeholders(len(ready_ids))})
+            """, (pharm_id, *ready_ids))
+            events.record(cursor, pharm_id, ready_ids, events.STATUS, 'dispensed')
+
+            for pres, payment_id in zip(ready, payment_ids):
+                results[pres['prescription_id']] = {"payment_id": payment_id, "amount": pres['price']}
+
+        conn.commit()
+        if ready:
+            events.notify(pharm_id)
+        return jsonify(
+            results={str(pid): results[pid] for pid in ids},
+            payment_ids=payment_ids,
+            dispensed=len(payment_ids),
+            failed=len(ids) - len(payment_ids),
+        ), 200
+
+    except mysql.connector.Error as err:
+        conn.rollback()
+        print(f"[ERROR] dispense_prescriptions_batch exception: {err}", file=sys.stderr)
+        return jsonify(error="Internal server error", detail=str(err)), 500
+
+    finally:
+        cursor.close()
 
 @dispense_prescription_bp.route('/prescriptions/filled', methods=['GET'])
+@read_only
 def get_filled_prescriptions():
     """
     Return all prescriptions with status='filled' for the current user’s pharmacy.
@@ -114,7 +233,7 @@ def get_filled_prescriptions():
     if not user_id:
         return jsonify(error="user_id is required"), 400
 
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     try:
         # resolve pharmacy_id
@@ -143,4 +262,3 @@ def get_filled_prescriptions():
 
     finally:
         cursor.close()
-        conn.close()
@@ -1,31 +1,50 @@
+from decimal import Decimal, InvalidOperation
+
 from flask import Blueprint, jsonify, request
 import mysql.connector
-from config import DB_CONFIG
+from db import get_db, read_only
+from blueprints.common import drugs
+from blueprints.common.pharmacy import get_pharmacy_id_for_user as _get_pharmacy_id_for_user
+from blueprints.common.batch import InvalidBatch
+from blueprints.common.etag import make_etag, not_modified, with_etag
+from config import BATCH_MAX_SIZE
 
 prices_bp = Blueprint('prices', __name__, url_prefix='/api/prices')
 
-def _get_pharmacy_id_for_user(user_id, cursor):
-    cursor.execute(
-        "SELECT pharmacy_id FROM pharmacies WHERE user_id = %s AND is_active = TRUE LIMIT 1",
-        (user_id,)
-    )
-    row = cursor.fetchone()
-    return row['pharmacy_id'] if row else None
-
 @prices_bp.route('/current-prices', methods=['GET'])
+@read_only
 def get_prices():
+    """
+    Query:  ?user_id=<pharmacy_user_id>
+    Supports If-None-Match. The ETag is built from the row count and newest
+    updated_at of the pharmacy's prices plus the drug catalog's hash, so an
+    unchanged price list answers 304 without running the price query.
+    """
     user_id = request.args.get('user_id', type=int)
     if not user_id:
         return jsonify(error="user_id is required"), 400
 
-    conn   = mysql.connector.connect(**DB_CONFIG)
+    conn   = get_db()
     cursor = conn.cursor(dictionary=True)
 
     # map to pharmacy_id
     pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
     if pharm_id is None:
+        cursor.close()
         return jsonify(error="No active pharmacy"), 404
 
+    cursor.execute("""
+      SELECT COUNT(*) AS n, MAX(updated_at) AS changed
+        FROM pharmacy_drug_prices
+       WHERE pharmacy_id = %s
+    """, (pharm_id,))
+    version = cursor.fetchone() or {}
+    etag = make_etag('prices', pharm_id, version.get('n'), version.get('changed'), drugs.etag())
+    cached = not_modified(etag)
+    if cached:
+        cursor.close()
+        return cached
+
     cursor.execute("""
       SELECT p.drug_id, d.name, d.description, p.price
       FROM pharmacy_drug_prices p
@@ -36,8 +55,7 @@ def get_prices():
     rows = cursor.fetchall()
 
     cursor.close()
-    conn.close()
-    return jsonify(rows), 200
+    return with_etag(jsonify(rows), etag), 200
 
 
 @prices_bp.route('/update', methods=['PATCH'])
@@ -50,28 +68,92 @@ def update_price():
     if not all([user_id, drug_id, price is not None]):
         return jsonify(error="user_id, drug_id, and price are required"), 400
 
-    conn   = mysql.connector.connect(**DB_CONFIG)
+    conn   = get_db()
     cursor = conn.cursor()
 
     pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
     if pharm_id is None:
+        cursor.close()
         return jsonify(error="No active pharmacy"), 404
 
+    # one round trip either way; an unchanged price is no longer mistaken
+    # for a missing row
     cursor.execute("""
-      UPDATE pharmacy_drug_prices
-         SET price = %s
-       WHERE pharmacy_id = %s
-         AND drug_id     = %s
-    """, (price, pharm_id, drug_id))
-    if cursor.rowcount == 0:
-        # If row doesn’t exist yet, insert it
-        cursor.execute("""
-          INSERT INTO pharmacy_drug_prices (pharmacy_id, drug_id, price)
-          VALUES (%s, %s, %s)
-        """, (pharm_id, drug_id, price))
+      INSERT INTO pharmacy_drug_prices (pharmacy_id, drug_id, price)
+      VALUES (%s, %s, %s)
+      ON DUPLICATE KEY UPDATE price = VALUES(price)
+    """, (pharm_id, drug_id, price))
 
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify(message="Price updated"), 200
 
+
+def _parse_price_entries(entries):
+    """Validate [{drug_id, price}, …] into a {drug_id: Decimal} map (last entry wins)."""
+    if not isinstance(entries, list) or not entries:
+        raise InvalidBatch("prices must be a non-empty list")
+    if len(entries) > BATCH_MAX_SIZE:
+        raise InvalidBatch(f"at most {BATCH_MAX_SIZE} prices per request")
+    prices = {}
+    for entry in entries:
+        try:
+            drug_id = int(entry['drug_id'])
+            price   = Decimal(str(entry['price']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise InvalidBatch("each entry needs an integer drug_id and a numeric price")
+        if not price.is_finite() or price < 0:
+            raise InvalidBatch(f"invalid price for drug_id {drug_id}")
+        prices[drug_id] = price
+    return prices
+
+
+@prices_bp.route('/bulk-update', methods=['PATCH'])
+def bulk_update_prices():
+    """
+    Reprice many drugs at once.
+    Body JSON: {
+      "user_id": 7,
+      "prices": [ { "drug_id": 1, "price": 12.50 }, { "drug_id": 2, "price": 30 } ]
+    }
+    All entries are applied by one multi-row INSERT ... ON DUPLICATE KEY
+    UPDATE inside a transaction: either every price changes or none do.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify(error="user_id is required"), 400
+    try:
+        prices = _parse_price_entries(data.get('prices'))
+    except InvalidBatch as e:
+        return jsonify(error=str(e)), 400
+
+    conn   = get_db()
+    cursor = conn.cursor()
+    try:
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="No active pharmacy"), 404
+
+        drug_ids = list(prices)
+        unknown = [d for d in drug_ids if drugs.get_drug(d) is None]
+        if unknown:
+            return jsonify(error="Unknown drug_id(s)", drug_ids=unknown), 400
+
+        rows   = ', '.join(['(%s, %s, %s)'] * len(prices))
+        values = [v for drug_id, price in prices.items() for v in (pharm_id, drug_id, price)]
+        cursor.execute(f"""
+          INSERT INTO pharmacy_drug_prices (pharmacy_id, drug_id, price)
+          VALUES {rows}
+          ON DUPLICATE KEY UPDATE price = VALUES(price)
+        """, tuple(values))
+        conn.commit()
+
+        return jsonify(message="Prices updated", updated=len(prices)), 200
+
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify(error="Internal server error", detail=str(err)), 500
+
+    finally:
+        cursor.close()
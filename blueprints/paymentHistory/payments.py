@@ -1,67 +1,271 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from flask import Blueprint, request, jsonify
 import mysql.connector
-from config import DB_CONFIG
+from db import get_db, read_only
+from blueprints.common.pharmacy import get_pharmacy_id_for_user as _get_pharmacy_id_for_user
+from blueprints.common.pagination import (
+    InvalidPageRequest, build_page, keyset_condition, order_by, parse_page_args, wants_page,
+)
+from blueprints.common.streaming import (
+    iter_json_object, iter_rows, stream_json_array, stream_response, wants_stream,
+)
 
 
 payments_bp = Blueprint('payments', __name__, url_prefix='/api/pharmacy')
 
-def _get_pharmacy_id_for_user(user_id, cursor):
-    cursor.execute("""
-        SELECT pharmacy_id
-          FROM pharmacies
-         WHERE user_id = %s
-           AND is_active = TRUE
-        LIMIT 1;
-    """, (user_id,))
-    row = cursor.fetchone()
-    return row['pharmacy_id'] if row else None
+# newest first; payment_id breaks ties between payments in the same second
+PAYMENT_SORT_KEY = ('p.payment_date', 'p.payment_id')
+
+PAYMENT_STATUSES = {'fulfilled': True, 'unfulfilled': False}
+
+PAYMENTS_QUERY = """
+  SELECT
+    p.payment_id,
+    CONCAT(pt.first_name, ' ', pt.last_name) AS patient_name,
+    p.amount,
+    p.is_fulfilled,
+    p.payment_date
+  FROM payments_pharmacy p
+  JOIN patients pt ON p.patient_id = pt.patient_id
+  WHERE p.pharmacy_id  = %s
+"""
+
+PAYMENTS_BY_STATUS_QUERY = PAYMENTS_QUERY + """
+    AND p.is_fulfilled = %s
+  ORDER BY p.payment_date DESC, p.payment_id DESC
+"""
+
+
+def _parse_status(args):
+    """``?status=`` as the is_fulfilled value to filter on, or None for both."""
+    status = args.get('status')
+    if status is None:
+        return None
+    if status not in PAYMENT_STATUSES:
+        raise ValueError("status must be 'fulfilled' or 'unfulfilled'")
+    return PAYMENT_STATUSES[status]
+
+
+def _parse_day(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
 
 
 @payments_bp.route('/payments', methods=['GET'])
+@read_only
 def get_pharmacy_payments():
     """
     Return fulfilled and unfulfilled payments for this pharmacy.
-    Query:  ?user_id=<pharmacy_user_id>
+    Query:  ?user_id=<pharmacy_user_id>[&status=fulfilled|unfulfilled]
+            [&limit=50][&after=<cursor>][&stream=1]
     Response: {
       "fulfilled":   [ { payment_id, patient_name, amount, payment_date, ... }, … ],
       "unfulfilled": [ { … }, … ]
     }
+    With status=... only that list is returned, as a plain array. Each
+    status is filtered in SQL on (pharmacy_id, is_fulfilled, payment_date).
+    Passing ?limit= and/or ?after= switches to keyset pagination, newest
+    first, and returns {"items": [...], "next_cursor": ...}.
+    With stream=1 (without paging) each list is read in batches and
+    streamed, instead of loading the whole history into memory.
     """
     user_id = request.args.get('user_id', type=int)
     if not user_id:
         return jsonify(error="user_id is required"), 400
+    try:
+        status = _parse_status(request.args)
+        paged = wants_page(request.args)
+        if paged:
+            limit, after = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
 
-    conn   = mysql.connector.connect(**DB_CONFIG)
+    conn   = get_db()
     cursor = conn.cursor(dictionary=True)
+    try:
+        # resolve pharmacy_id from user
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="No active pharmacy found for that user"), 404
+
+        if paged:
+            query, params = PAYMENTS_QUERY, [pharm_id]
+            if status is not None:
+                query += " AND p.is_fulfilled = %s"
+                params.append(status)
+            if after:
+                clause, after_params = keyset_condition(PAYMENT_SORT_KEY, after, descending=True)
+                query += " AND " + clause
+                params.extend(after_params)
+            query += order_by(PAYMENT_SORT_KEY, descending=True) + " LIMIT %s"
+            params.append(limit + 1)
+            cursor.execute(query, tuple(params))
+            return jsonify(build_page(cursor.fetchall(), limit, ('payment_date', 'payment_id'))), 200
+
+        if wants_stream(request.args):
+            if status is not None:
+                return stream_json_array(conn, PAYMENTS_BY_STATUS_QUERY, (pharm_id, status))
+            return stream_response(iter_json_object([
+                ("fulfilled",   iter_rows(conn, PAYMENTS_BY_STATUS_QUERY, (pharm_id, True))),
+                ("unfulfilled", iter_rows(conn, PAYMENTS_BY_STATUS_QUERY, (pharm_id, False))),
+            ]))
+
+        def fetch(is_fulfilled):
+            cursor.execute(PAYMENTS_BY_STATUS_QUERY, (pharm_id, is_fulfilled))
+            return cursor.fetchall()
+
+        if status is not None:
+            return jsonify(fetch(status)), 200
+        return jsonify({ "fulfilled": fetch(True), "unfulfilled": fetch(False) }), 200
+
+    except InvalidPageRequest as e:
+        return jsonify(error=str(e)), 400
+
+    finally:
+        cursor.close()
+
+
+@payments_bp.route('/payments/summary', methods=['GET'])
+@read_only
+def get_payment_summary():
+    """
+    Payment counts and totals for the finance dashboard.
+    Query:  ?user_id=<pharmacy_user_id>[&from=YYYY-MM-DD][&to=YYYY-MM-DD]
+    Response: {
+      "by_status": {
+        "fulfilled":   { "count": 12, "total": "840.00" },
+        "unfulfilled": { "count": 3,  "total": "150.00" }
+      },
+      "by_day": [
+        { "day": "2025-04-27", "fulfilled_count": 2, "fulfilled_total": "140.00",
+          "unfulfilled_count": 1, "unfulfilled_total": "50.00" }, …
+      ]
+    }
+    One GROUP BY (day, status) query over the requested range (inclusive);
+    the per-status totals are summed from those few group rows.
+    """
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify(error="user_id is required"), 400
+    try:
+        start = _parse_day(request.args, 'from')
+        end   = _parse_day(request.args, 'to')
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    conn   = get_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="No active pharmacy found for that user"), 404
+
+        query = """
+          SELECT DATE(payment_date)       AS day,
+                 is_fulfilled,
+                 COUNT(*)                 AS count,
+                 COALESCE(SUM(amount), 0) AS total
+            FROM payments_pharmacy
+           WHERE pharmacy_id = %s
+        """
+        params = [pharm_id]
+        # range on the raw column so (pharmacy_id, payment_date) stays usable
+        if start:
+            query += " AND payment_date >= %s"
+            params.append(start)
+        if end:
+            query += " AND payment_date < %s"
+            params.append(end + timedelta(days=1))
+        query += " GROUP BY DATE(payment_date), is_fulfilled ORDER BY day"
+        cursor.execute(query, tuple(params))
+        groups = cursor.fetchall()
+
+    except mysql.connector.Error as err:
+        return jsonify(error="Internal server error", detail=str(err)), 500
+
+    finally:
+        cursor.close()
+
+    by_status = {name: {"count": 0, "total": Decimal(0)} for name in PAYMENT_STATUSES}
+    by_day = {}
+    for row in groups:
+        name = 'fulfilled' if row['is_fulfilled'] else 'unfulfilled'
+        by_status[name]["count"] += row['count']
+        by_status[name]["total"] += row['total']
+        day = by_day.setdefault(row['day'], {
+            "day": row['day'].isoformat(),
+            "fulfilled_count": 0, "fulfilled_total": Decimal(0),
+            "unfulfilled_count": 0, "unfulfilled_total": Decimal(0),
+        })
+        day[f"{name}_count"] = row['count']
+        day[f"{name}_total"] = row['total']
+
+    return jsonify(by_status=by_status, by_day=list(by_day.values())), 200
+
+
+@payments_bp.route('/payments/revenue', methods=['GET'])
+@read_only
+def get_revenue():
+    """
+    Revenue over time, read from the payments_daily rollup.
+    Query:  ?user_id=<pharmacy_user_id>[&from=YYYY-MM-DD][&to=YYYY-MM-DD]
+    Response: {
+      "days":  [ { "day": "2025-04-27", "count": 3, "total": "190.00" }, … ],
+      "count": 15,
+      "total": "990.00"
+    }
+    One primary-key range scan over at most one row per day, however many
+    payments the pharmacy has.
+    """
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify(error="user_id is required"), 400
+    try:
+        start = _parse_day(request.args, 'from')
+        end   = _parse_day(request.args, 'to')
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    conn   = get_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="No active pharmacy found for that user"), 404
+
+        query = """
+          SELECT day, payment_count AS count, amount_total AS total
+            FROM payments_daily
+           WHERE pharmacy_id = %s
+        """
+        params = [pharm_id]
+        if start:
+            query += " AND day >= %s"
+            params.append(start)
+        if end:
+            query += " AND day <= %s"
+            params.append(end)
+        query += " ORDER BY day"
+        cursor.execute(query, tuple(params))
+        days = cursor.fetchall()
+
+    except mysql.connector.Error as err:
+        return jsonify(error="Internal server error", detail=str(err)), 500
 
-    # resolve pharmacy_id from user
-    pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
-    if pharm_id is None:
+    finally:
         cursor.close()
-        conn.close()
-        return jsonify(error="No active pharmacy found for that user"), 404
-
-    # fetch all payments
-    cursor.execute("""
-      SELECT
-        p.payment_id,
-        CONCAT(pt.first_name, ' ', pt.last_name) AS patient_name,
-        p.amount,
-        p.is_fulfilled,
-        p.payment_date
-      FROM payments_pharmacy p
-      JOIN patients pt ON p.patient_id = pt.patient_id
-      WHERE p.pharmacy_id = %s
-      ORDER BY p.payment_date DESC;
-    """, (pharm_id,))
-    payments = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    # split into two lists
-    fulfilled   = [row for row in payments if row['is_fulfilled']]
-    unfulfilled = [row for row in payments if not row['is_fulfilled']]
-
-    return jsonify({ "fulfilled": fulfilled, "unfulfilled": unfulfilled }), 200
 
+    for row in days:
+        row['day'] = row['day'].isoformat()
+    return jsonify(
+        days=days,
+        count=sum(row['count'] for row in days),
+        total=sum((row['total'] for row in days), Decimal(0)),
+    ), 200
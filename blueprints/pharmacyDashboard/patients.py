@@ -1,13 +1,13 @@
 from flask import Blueprint, jsonify
-import mysql.connector
-from config import DB_CONFIG
+from db import get_db, read_only
 
 pharmacy_patients_bp = Blueprint('pharmacy_patients', __name__)
 
 @pharmacy_patients_bp.route('/api/pharmacy/patients', methods=['GET'])
+@read_only
 def get_patients():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -22,7 +22,6 @@ def get_patients():
         patients = cursor.fetchall()
 
         cursor.close()
-        conn.close()
 
         return jsonify(patients)
     except Exception as e:
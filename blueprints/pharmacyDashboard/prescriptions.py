@@ -1,24 +1,49 @@
+import time
+
 from flask import Blueprint, jsonify, request
 import mysql.connector
-from config import DB_CONFIG
+from db import get_db, read_only
+from blueprints.common import drugs
+from blueprints.common.pharmacy import get_pharmacy_id_for_user as _get_pharmacy_id_for_user
+from blueprints.common.pagination import (
+    InvalidPageRequest,
+    build_page,
+    keyset_condition,
+    order_by,
+    parse_page_args,
+    wants_page,
+)
+from blueprints.common.search import is_fulltext, match_condition, normalize, relevance
+from blueprints.common.streaming import stream_json_array, wants_stream
+from blueprints.common.etag import make_etag, not_modified, with_etag
+from blueprints.common.importer import ImportFormatError, detect_format, iter_inventory_rows
+from config import IMPORT_CONFIG
 
 pharmacy_prescriptions_bp = Blueprint('pharmacy_prescriptions', __name__)
 
-def _get_pharmacy_id_for_user(user_id, cursor):
-    cursor.execute(
-        "SELECT pharmacy_id FROM pharmacies WHERE user_id = %s AND is_active = TRUE LIMIT 1",
-        (user_id,)
-    )
-    row = cursor.fetchone()
-    return row['pharmacy_id'] if row else None
+PRESCRIPTION_SORT_KEY = ('p.created_at', 'p.prescription_id')
+LOG_SORT_KEY          = ('l.timestamp', 'l.log_id')
+
+# column lists must match the FULLTEXT index definitions exactly
+MEDICATION_SEARCH_COLUMNS = ('p.medication_name',)
+LOG_MEDICATION_COLUMNS    = ('r.medication_name',)
+PATIENT_NAME_COLUMNS      = ('p.first_name', 'p.last_name')
 
 @pharmacy_prescriptions_bp.route('/api/pharmacy/prescriptions', methods=['GET'])
+@read_only
 def get_prescriptions():
+    """
+    List prescriptions, optionally filtered by ?search=: a number looks up
+    that prescription_id, anything else is a ranked medication-name search.
+    Passing ?limit= and/or ?after=<cursor> switches to keyset pagination on
+    (created_at, prescription_id) and returns {"items": [...], "next_cursor": ...}.
+    ?stream=1 (without paging) streams the full list in batches instead.
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
-        search = request.args.get('search')
+        search = normalize(request.args.get('search'))
 
         base_query = """
         SELECT 
@@ -32,29 +57,59 @@ def get_prescriptions():
         FROM prescriptions p
         JOIN patients pa ON p.patient_id = pa.patient_id
         """
+        conditions, params = [], []
+        ranking = None
 
         if search:
             if search.isdigit():
-                base_query += " WHERE p.prescription_id = %s"
-                cursor.execute(base_query, (int(search),))
+                conditions.append("p.prescription_id = %s")
+                params.append(int(search))
             else:
-                base_query += " WHERE p.medication_name LIKE %s"
-                cursor.execute(base_query, (f"%{search}%",))
-        else:
-            cursor.execute(base_query)
-
+                clause, clause_params = match_condition(MEDICATION_SEARCH_COLUMNS, search)
+                conditions.append(clause)
+                params.extend(clause_params)
+                if is_fulltext(search):
+                    ranking = relevance(MEDICATION_SEARCH_COLUMNS, search)
+
+        paged = wants_page(request.args)
+        if paged:
+            limit, after = parse_page_args(request.args)
+            if after:
+                clause, after_params = keyset_condition(PRESCRIPTION_SORT_KEY, after)
+                conditions.append(clause)
+                params.extend(after_params)
+
+        if conditions:
+            base_query += " WHERE " + " AND ".join(conditions)
+        if paged:
+            base_query += order_by(PRESCRIPTION_SORT_KEY) + " LIMIT %s"
+            params.append(limit + 1)
+        elif ranking:
+            # best matches first when the caller isn't walking pages
+            base_query += f" ORDER BY {ranking[0]} DESC, p.prescription_id ASC"
+            params.extend(ranking[1])
+
+        if not paged and wants_stream(request.args):
+            cursor.close()
+            return stream_json_array(conn, base_query, tuple(params))
+
+        cursor.execute(base_query, tuple(params))
         prescriptions = cursor.fetchall()
         cursor.close()
-        conn.close()
 
+        if paged:
+            return jsonify(build_page(prescriptions, limit, ('created_at', 'prescription_id')))
         return jsonify(prescriptions)
+    except InvalidPageRequest as e:
+        return jsonify(error=str(e)), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @pharmacy_prescriptions_bp.route('/api/pharmacy/prescriptions/<int:prescription_id>', methods=['GET'])
+@read_only
 def get_prescription_by_id(prescription_id):
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -75,7 +130,6 @@ def get_prescription_by_id(prescription_id):
         prescription = cursor.fetchone()
 
         cursor.close()
-        conn.close()
 
         if prescription:
             return jsonify(prescription)
@@ -85,9 +139,10 @@ def get_prescription_by_id(prescription_id):
         return jsonify({"error": str(e)}), 500
 
 @pharmacy_prescriptions_bp.route('/api/pharmacy/requests', methods=['GET'])
+@read_only
 def get_prescription_requests():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
         pharmacy_id = request.args.get('pharmacy_id')
         print("Received pharmacy_id:", pharmacy_id)
@@ -105,8 +160,8 @@ def get_prescription_requests():
             END AS inventory_conflict
         FROM prescriptions p
         JOIN patients pa ON p.patient_id = pa.patient_id
-        LEFT JOIN pharmacy_inventory pi ON lower(trim(p.medication_name)) = lower(trim(pi.drug_name)) 
-            AND p.pharmacy_id = pi.pharmacy_id
+        LEFT JOIN pharmacy_inventory pi ON pi.pharmacy_id = p.pharmacy_id
+            AND pi.drug_key = p.medication_key
         WHERE p.status = 'pending' AND p.pharmacy_id = %s
         """
 
@@ -114,22 +169,32 @@ def get_prescription_requests():
         results = cursor.fetchall()
 
         cursor.close()
-        conn.close()
 
         return jsonify(results)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 @pharmacy_prescriptions_bp.route('/api/pharmacy/logs', methods=['GET'])
+@read_only
 def view_past_transactions():
+    """
+    List billed transactions, optionally filtered by ?search= (ranked match
+    on medication or patient name).
+    Passing ?limit= and/or ?after=<cursor> switches to keyset pagination,
+    newest first on (timestamp, log_id), and returns
+    {"items": [...], "next_cursor": ...}.
+    ?stream=1 (without paging) streams the full list in batches instead;
+    an empty result is then [] rather than a 404.
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
-        search = request.args.get('search')
+        search = normalize(request.args.get('search'))
 
         query = """
         SELECT 
+            l.log_id,
             l.prescription_id,
             CONCAT(p.first_name, ' ', p.last_name) AS patient_name,
             r.medication_name,
@@ -139,24 +204,94 @@ def view_past_transactions():
         JOIN prescriptions r ON l.prescription_id = r.prescription_id
         JOIN patients p ON l.patient_id = p.patient_id
         """
+        conditions, params = [], []
+        ranking = None
 
         if search:
-            query += " WHERE r.medication_name LIKE %s OR CONCAT(p.first_name, ' ', p.last_name) LIKE %s"
-            cursor.execute(query + " ORDER BY p.last_name ASC, p.first_name ASC", (f"%{search}%", f"%{search}%"))
+            med_clause, med_params   = match_condition(LOG_MEDICATION_COLUMNS, search)
+            name_clause, name_params = match_condition(PATIENT_NAME_COLUMNS, search)
+            # One lookup per FULLTEXT index, merged by log_id. OR-ing the
+            # two MATCHes in the WHERE clause can use neither index and
+            # scans every log row.
+            query += f"""
+        JOIN (
+            SELECT l.log_id
+              FROM pharmacy_logs l
+              JOIN prescriptions r ON l.prescription_id = r.prescription_id
+             WHERE {med_clause}
+            UNION
+            SELECT l.log_id
+              FROM pharmacy_logs l
+              JOIN patients p ON l.patient_id = p.patient_id
+             WHERE {name_clause}
+        ) hits ON hits.log_id = l.log_id
+        """
+            params.extend(med_params + name_params)
+            if is_fulltext(search):
+                med_rank, med_rank_params   = relevance(LOG_MEDICATION_COLUMNS, search)
+                name_rank, name_rank_params = relevance(PATIENT_NAME_COLUMNS, search)
+                ranking = (f"({med_rank} + {name_rank})", med_rank_params + name_rank_params)
+
+        paged = wants_page(request.args)
+        if paged:
+            limit, after = parse_page_args(request.args)
+            if after:
+                clause, after_params = keyset_condition(LOG_SORT_KEY, after, descending=True)
+                conditions.append(clause)
+                params.extend(after_params)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if paged:
+            query += order_by(LOG_SORT_KEY, descending=True) + " LIMIT %s"
+            params.append(limit + 1)
+        elif ranking:
+            query += f" ORDER BY {ranking[0]} DESC, p.last_name ASC, p.first_name ASC"
+            params.extend(ranking[1])
         else:
-            cursor.execute(query + " ORDER BY p.last_name ASC, p.first_name ASC")
+            query += " ORDER BY p.last_name ASC, p.first_name ASC"
 
+        if not paged and wants_stream(request.args):
+            cursor.close()
+            return stream_json_array(conn, query, tuple(params))
+
+        cursor.execute(query, tuple(params))
         results = cursor.fetchall()
         cursor.close()
-        conn.close()
 
+        if paged:
+            return jsonify(build_page(results, limit, ('timestamp', 'log_id')))
         if results:
             return jsonify(results)
         else:
             return jsonify({"message": "No transactions found."}), 404
+    except InvalidPageRequest as e:
+        return jsonify(error=str(e)), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _upsert_inventory(cursor, pharm_id, items):
+    """
+    Add ``[(drug_name, qty), ...]`` to a pharmacy's stock with one multi-row
+    upsert. The conflict key is (pharmacy_id, drug_key), so names differing
+    only in case or whitespace land on the same row; new rows are linked to
+    the drug catalog when the name matches. A negative quantity raises
+    ValueError before anything is written.
+    """
+    if any(qty < 0 for _, qty in items):
+        raise ValueError("stock_quantity must not be negative")
+    rows = ', '.join(['(%s, %s, %s, %s)'] * len(items))
+    params = [v for drug_name, qty in items
+                for v in (pharm_id, drug_name, drugs.find_drug_id(drug_name), qty)]
+    cursor.execute(f"""
+        INSERT INTO pharmacy_inventory
+            (pharmacy_id, drug_name, drug_id, stock_quantity)
+        VALUES {rows}
+        ON DUPLICATE KEY UPDATE
+            stock_quantity = stock_quantity + VALUES(stock_quantity),
+            drug_id        = COALESCE(drug_id, VALUES(drug_id))
+    """, tuple(params))
+
 @pharmacy_prescriptions_bp.route('/api/pharmacy/inventory/add', methods=['POST'])
 def add_inventory_item():
     if not request.is_json:
@@ -169,9 +304,13 @@ def add_inventory_item():
 
     if not user_id or not drug_name or stock_quantity is None:
         return jsonify(error="Missing required fields"), 400
+    try:
+        stock_quantity = int(stock_quantity)
+    except (TypeError, ValueError):
+        return jsonify(error="stock_quantity must be an integer"), 400
 
     try:
-        conn   = mysql.connector.connect(**DB_CONFIG)
+        conn   = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # 1) Resolve pharmacy_id
@@ -179,52 +318,116 @@ def add_inventory_item():
         if pharm_id is None:
             return jsonify(error="Pharmacy not found for this user"), 404
 
-        # 2) See if an entry already exists
-        cursor.execute("""
-            SELECT stock_quantity
-              FROM pharmacy_inventory
-             WHERE pharmacy_id = %s
-               AND drug_name   = %s
-        """, (pharm_id, drug_name))
-        existing = cursor.fetchone()
-
-        if existing:
-            # 3a) Update
-            new_qty = existing['stock_quantity'] + int(stock_quantity)
-            cursor.execute("""
-                UPDATE pharmacy_inventory
-                   SET stock_quantity = %s
-                 WHERE pharmacy_id   = %s
-                   AND drug_name     = %s
-            """, (new_qty, pharm_id, drug_name))
-        else:
-            # 3b) Insert
-            cursor.execute("""
-                INSERT INTO pharmacy_inventory
-                    (pharmacy_id, drug_name, stock_quantity)
-                VALUES (%s, %s, %s)
-            """, (pharm_id, drug_name, int(stock_quantity)))
+        # 2) Insert or top up in one statement
+        _upsert_inventory(cursor, pharm_id, [(drug_name, stock_quantity)])
 
         conn.commit()
         return jsonify(message="Inventory item added successfully"), 201
 
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
     except mysql.connector.Error as err:
         conn.rollback()
         return jsonify(error="Internal server error", detail=str(err)), 500
 
     finally:
         cursor.close()
-        conn.close()
+
+
+@pharmacy_prescriptions_bp.route('/api/pharmacy/inventory/import', methods=['POST'])
+def import_inventory():
+    """
+    Bulk restock from a supplier feed streamed in the request body.
+    Query:  ?user_id=<pharmacy_user_id>[&batch_size=500][&format=csv|ndjson]
+    Body:   text/csv with a drug_name,stock_quantity header, or
+            application/x-ndjson with one {"drug_name", "stock_quantity"} per line
+    Response: {
+      "rows": 1200, "rejected": 2, "batches": 3, "elapsed_ms": 84.1,
+      "errors": [ { "line": 17, "error": "stock_quantity must be an integer" } ]
+    }
+    The body is parsed line by line and applied as multi-row upserts of
+    batch_size rows, each committed on its own. If the database fails or
+    the body turns out unreadable (malformed CSV, not UTF-8) mid-import,
+    the error reports the rows already applied, and they stay applied.
+    """
+    started = time.perf_counter()
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify(error="user_id is required"), 400
+    batch_size = request.args.get('batch_size', IMPORT_CONFIG['batch_size'], type=int)
+    if batch_size <= 0:
+        return jsonify(error="batch_size must be positive"), 400
+    batch_size = min(batch_size, IMPORT_CONFIG['max_batch_size'])
+    try:
+        fmt = detect_format(request.mimetype, request.args.get('format'))
+    except ImportFormatError as e:
+        return jsonify(error=str(e)), 415
+
+    conn   = get_db()
+    cursor = conn.cursor(dictionary=True)
+    applied, rejected, batches = 0, 0, 0
+    errors = []
+    try:
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="Pharmacy not found for this user"), 404
+
+        batch = []
+        def flush():
+            nonlocal applied, batches
+            _upsert_inventory(cursor, pharm_id, batch)
+            conn.commit()
+            applied += len(batch)
+            batches += 1
+            batch.clear()
+
+        for line_no, item, error in iter_inventory_rows(request.stream, fmt):
+            if error:
+                rejected += 1
+                if len(errors) < IMPORT_CONFIG['max_errors']:
+                    errors.append({"line": line_no, "error": error})
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        return jsonify(
+            rows=applied,
+            rejected=rejected,
+            batches=batches,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+            errors=errors,
+        ), 200
+
+    except ImportFormatError as e:
+        conn.rollback()
+        return jsonify(error=str(e), rows=applied), 400
+
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify(error="Internal server error", detail=str(err), rows=applied), 500
+
+    finally:
+        cursor.close()
 
 
 @pharmacy_prescriptions_bp.route('/api/pharmacy/inventory', methods=['GET'])
+@read_only
 def get_inventory():
+    """
+    Query:  ?user_id=<pharmacy_user_id>
+    Supports If-None-Match; the ETag is the row count and newest updated_at
+    of the pharmacy's inventory, read from an index before the main query.
+    """
     user_id = request.args.get('user_id', type=int)
     if not user_id:
         return jsonify(error="user_id is required"), 400
 
     try:
-        conn   = mysql.connector.connect(**DB_CONFIG)
+        conn   = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # 1) Resolve pharmacy_id
@@ -232,36 +435,47 @@ def get_inventory():
         if pharm_id is None:
             return jsonify(error="Pharmacy not found for this user"), 404
 
-        # 2) Fetch inventory
+        # 2) Cheap version check; answer 304 if the client is current
+        cursor.execute("""
+            SELECT COUNT(*) AS n, MAX(updated_at) AS changed
+              FROM pharmacy_inventory
+             WHERE pharmacy_id = %s
+        """, (pharm_id,))
+        version = cursor.fetchone() or {}
+        etag = make_etag('inventory', pharm_id, version.get('n'), version.get('changed'))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        # 3) Fetch inventory
         cursor.execute("""
-            SELECT drug_name, stock_quantity
+            SELECT drug_id, drug_name, stock_quantity
               FROM pharmacy_inventory
              WHERE pharmacy_id = %s
         """, (pharm_id,))
         inventory = cursor.fetchall()
 
-        return jsonify(inventory), 200
+        return with_etag(jsonify(inventory), etag), 200
 
     except mysql.connector.Error as err:
         return jsonify(error="Internal server error", detail=str(err)), 500
 
     finally:
         cursor.close()
-        conn.close()
     
 @pharmacy_prescriptions_bp.route('/api/pharmacy/getPharmacyId', methods=['GET'])
+@read_only
 def get_pharmacy_id():
     user_id = request.args.get('user_id')
     if not user_id:
         return jsonify({"error": "Missing user_id"}), 400
 
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT pharmacy_id FROM pharmacies WHERE user_id = %s", (user_id,))
         result = cursor.fetchone()
         cursor.close()
-        conn.close()
 
         if result:
             return jsonify(result)
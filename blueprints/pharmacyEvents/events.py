@@ -0,0 +1,90 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import mysql.connector
+import db
+from db import get_db
+from blueprints.common import events
+from blueprints.common.pharmacy import get_pharmacy_id_for_user as _get_pharmacy_id_for_user
+from config import SSE_CONFIG
+import sys
+
+pharmacy_events_bp = Blueprint('pharmacy_events', __name__, url_prefix='/api/pharmacy')
+
+@pharmacy_events_bp.route('/events', methods=['GET'])
+def stream_events():
+    """
+    Server-sent events for the pharmacy's prescriptions, replacing polling
+    of /queue and /prescriptions/filled.
+    Query:  ?user_id=<pharmacy_user_id>[&last_event_id=<id>]
+    Header: Last-Event-ID (sent by EventSource on reconnect; wins over the query)
+    Stream:
+      id: 42
+      event: prescription.created      (new pending prescription)
+      data: {"event_id": 42, "prescription_id": 7, "status": "pending", "at": "…"}
+
+      event: prescription.status       (filled / dispensed)
+    Without a last id the stream starts at the current end of the log;
+    with one, everything after it is replayed first.
+    Limits: a gunicorn worker holds at most SSE_CONFIG['max_streams'] open
+    streams (each occupies a request thread), an ASGI worker (asgi.py)
+    SSE_CONFIG['max_async_streams']; past that it answers 503 with
+    Retry-After. A stream closes after SSE_CONFIG['max_duration'] seconds
+    and EventSource reconnects with Last-Event-ID.
+    """
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify(error="user_id is required"), 400
+
+    raw_last = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(raw_last) if raw_last else None
+    except ValueError:
+        return jsonify(error="Last-Event-ID must be an integer"), 400
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="No active pharmacy found for that user"), 404
+        if last_id is None:
+            last_id = events.latest_event_id(cursor, pharm_id)
+
+    except mysql.connector.Error as err:
+        print(f"[ERROR] stream_events exception: {err}", file=sys.stderr)
+        return jsonify(error="Internal server error", detail=str(err)), 500
+
+    finally:
+        cursor.close()
+
+    # hand the request's connection back now: an open stream only borrows
+    # one while it reads the change log
+    db.release_db()
+
+    if events.ASYNC_STREAM in request.environ:
+        # asgi.py serves the stream from its event loop once this returns
+        request.environ[events.ASYNC_STREAM] = (pharm_id, last_id)
+        return _stream_response(iter(()))
+
+    wakeup = events.open_stream(pharm_id)
+    if wakeup is None:
+        response = jsonify(error="Too many open event streams on this worker, retry shortly")
+        response.headers['Retry-After'] = str(max(1, SSE_CONFIG['retry_ms'] // 1000))
+        return response, 503
+
+    response = _stream_response(stream_with_context(events.iter_stream(pharm_id, last_id, wakeup)))
+    # the generator's own cleanup never runs if it was never started
+    response.call_on_close(lambda: events.close_stream(pharm_id, wakeup))
+    return response
+
+
+def _stream_response(body):
+    response = Response(body, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # keep nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@pharmacy_events_bp.route('/events/stats', methods=['GET'])
+def event_stats():
+    return jsonify(events.stats())
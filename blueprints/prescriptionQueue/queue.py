@@ -1,35 +1,27 @@
 from flask import Blueprint, request, jsonify
 import mysql.connector
-from config import DB_CONFIG
+from db import get_db, read_only
+from blueprints.common import drugs, events
+from blueprints.common.pharmacy import get_pharmacy_id_for_user as _get_pharmacy_id_for_user
+from blueprints.common.batch import InvalidBatch, parse_id_list, placeholders
 import sys
 
 pharmacy_queue_bp = Blueprint('pharmacy_queue', __name__, url_prefix='/api/pharmacy')
 
-def _get_pharmacy_id_for_user(user_id, cursor):
-    cursor.execute("""
-        SELECT pharmacy_id
-          FROM pharmacies
-         WHERE user_id = %s
-           AND is_active = TRUE
-        LIMIT 1;
-    """, (user_id,))
-    row = cursor.fetchone()
-    return row['pharmacy_id'] if row else None
-
 @pharmacy_queue_bp.route('/queue', methods=['GET'])
+@read_only
 def get_prescription_queue():
     """Return all pending prescriptions for the current user’s pharmacy, oldest first."""
     user_id = request.args.get('user_id', type=int)
     if not user_id:
         return jsonify(error="user_id is required"), 400
 
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
 
     pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
     if pharm_id is None:
         cursor.close()
-        conn.close()
         return jsonify(error="No active pharmacy found for that user"), 404
 
     cursor.execute("""
@@ -49,7 +41,6 @@ def get_prescription_queue():
 
     rows = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(rows)
 
 
@@ -59,7 +50,7 @@ def fulfill_prescription(prescription_id):
     if not user_id:
         return jsonify(error="user_id is required"), 400
 
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     try:
         # 1) lookup pharmacy_id
@@ -79,44 +70,42 @@ def fulfill_prescription(prescription_id):
             return jsonify(error="Prescription not found or unauthorized"), 404
         drug_id = pres['drug_id']
 
-        # 3) fetch human‐readable drug_name
-        cursor.execute(
-            "SELECT name FROM weight_loss_drugs WHERE drug_id = %s",
-            (drug_id,)
-        )
-        row = cursor.fetchone()
-        if not row:
+        # 3) make sure the drug exists
+        if drugs.get_drug(drug_id) is None:
             return jsonify(error=f"Drug id {drug_id} not found"), 404
-        drug_name = row['name']
-
-        # 4) check inventory for that drug at this pharmacy
-        cursor.execute("""
-            SELECT stock_quantity
-              FROM pharmacy_inventory
-             WHERE pharmacy_id = %s
-               AND drug_name   = %s
-        """, (pharm_id, drug_name))
-        inv = cursor.fetchone()
-        if not inv or inv['stock_quantity'] <= 0:
-            return jsonify(error="Out of stock"), 400
 
-        # 5) decrement inventory
-        cursor.execute("""
-            UPDATE pharmacy_inventory
-               SET stock_quantity = stock_quantity - 1
-             WHERE pharmacy_id = %s
-               AND drug_name   = %s
-        """, (pharm_id, drug_name))
-
-        # 6) mark prescription as filled
+        # 4) claim the prescription. The status check lives in the WHERE
+        #    clause, so of two concurrent fulfills only one gets the row
         cursor.execute("""
             UPDATE prescriptions
                SET status = 'filled'
              WHERE prescription_id = %s
                AND pharmacy_id     = %s
+               AND status          = 'pending'
         """, (prescription_id, pharm_id))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return jsonify(error="Prescription is not pending"), 409
+
+        # 5) take one unit of stock. The stock check lives in the WHERE
+        #    clause too, so concurrent fulfills can't oversell and there is
+        #    no separate SELECT round trip
+        cursor.execute("""
+            UPDATE pharmacy_inventory
+               SET stock_quantity = stock_quantity - 1
+             WHERE pharmacy_id    = %s
+               AND drug_id        = %s
+               AND stock_quantity > 0
+        """, (pharm_id, drug_id))
+        if cursor.rowcount == 0:
+            # also undoes the claim in step 4
+            conn.rollback()
+            return jsonify(error="Out of stock"), 400
+
+        events.record(cursor, pharm_id, [prescription_id], events.STATUS, 'filled')
 
         conn.commit()
+        events.notify(pharm_id)
         return jsonify(message="Prescription marked as filled")
 
     except mysql.connector.Error as err:
@@ -126,4 +115,114 @@ def fulfill_prescription(prescription_id):
 
     finally:
         cursor.close()
-        conn.close()
+
+
+@pharmacy_queue_bp.route('/prescriptions/fulfill', methods=['POST'])
+def fulfill_prescriptions_batch():
+    """
+    Fulfill many pending prescriptions in one call.
+    Query:  ?user_id=<pharmacy_user_id>
+    Body:   { "prescription_ids": [12, 13, 14] }
+    Response: {
+      "results": { "12": {"status": "filled"}, "13": {"error": "Out of stock"}, … },
+      "filled": 1,
+      "failed": 1
+    }
+    Validation is one set-based query. Stock is then handed out in request
+    order, and inventory and statuses are updated with one statement each,
+    so the number of round trips doesn't grow with the batch size.
+    """
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify(error="user_id is required"), 400
+    try:
+        ids = parse_id_list(request.get_json(silent=True), 'prescription_ids')
+    except InvalidBatch as e:
+        return jsonify(error=str(e)), 400
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # 1) lookup pharmacy_id
+        pharm_id = _get_pharmacy_id_for_user(user_id, cursor)
+        if pharm_id is None:
+            return jsonify(error="No active pharmacy found for that user"), 404
+
+        # 2) validate every prescription and read its stock in one go,
+        #    locking the rows we are about to change
+        cursor.execute(f"""
+            SELECT pr.prescription_id,
+                   pr.drug_id,
+                   pr.status,
+                   pi.stock_quantity
+              FROM prescriptions pr
+              LEFT JOIN pharmacy_inventory pi ON pi.pharmacy_id = pr.pharmacy_id
+                                             AND pi.drug_id     = pr.drug_id
+             WHERE pr.pharmacy_id = %s
+               AND pr.prescription_id IN ({placeholders(len(ids))})
+               FOR UPDATE
+        """, (pharm_id, *ids))
+        found = {row['prescription_id']: row for row in cursor.fetchall()}
+
+        # 3) hand out stock in request order
+        results   = {}
+        remaining = {}
+        used      = {}
+        filled    = []
+        for pid in ids:
+            row = found.get(pid)
+            if not row:
+                results[pid] = {"error": "Prescription not found or unauthorized"}
+                continue
+            if drugs.get_drug(row['drug_id']) is None:
+                results[pid] = {"error": f"Drug id {row['drug_id']} not found"}
+                continue
+            if row['status'] != 'pending':
+                results[pid] = {"error": f"Prescription is {row['status']}, not pending"}
+                continue
+            drug_id = row['drug_id']
+            remaining.setdefault(drug_id, row['stock_quantity'] or 0)
+            if remaining[drug_id] <= 0:
+                results[pid] = {"error": "Out of stock"}
+                continue
+            remaining[drug_id] -= 1
+            used[drug_id] = used.get(drug_id, 0) + 1
+            filled.append(pid)
+            results[pid] = {"status": "filled"}
+
+        if filled:
+            # 4) decrement inventory once per drug
+            cases  = ' '.join(['WHEN %s THEN %s'] * len(used))
+            params = [v for item in used.items() for v in item]
+            cursor.execute(f"""
+                UPDATE pharmacy_inventory
+                   SET stock_quantity = stock_quantity - CASE drug_id {cases} END
+                 WHERE pharmacy_id = %s
+                   AND drug_id IN ({placeholders(len(used))})
+            """, (*params, pharm_id, *used))
+
+            # 5) mark them all as filled
+            cursor.execute(f"""
+                UPDATE prescriptions
+                   SET status = 'filled'
+                 WHERE pharmacy_id = %s
+                   AND prescription_id IN ({placeholders(len(filled))})
+            """, (pharm_id, *filled))
+            events.record(cursor, pharm_id, filled, events.STATUS, 'filled')
+
+        conn.commit()
+        if filled:
+            events.notify(pharm_id)
+        return jsonify(
+            results={str(pid): r for pid, r in results.items()},
+            filled=len(filled),
+            failed=len(ids) - len(filled),
+        ), 200
+
+    except mysql.connector.Error as err:
+        conn.rollback()
+        print(f"[ERROR] fulfill_prescriptions_batch exception: {err}", file=sys.stderr)
+        return jsonify(error="Internal server error", detail=str(err)), 500
+
+    finally:
+        cursor.close()
@@ -2,11 +2,14 @@
 
 from flask import Blueprint, request, jsonify
 import mysql.connector
-from config import DB_CONFIG
+from db import get_db, read_only
+from blueprints.common import drugs, events
+from blueprints.common.etag import not_modified, with_etag
 
 prescriptions_bp = Blueprint('prescriptions', __name__, url_prefix='/api/prescriptions')
 
 @prescriptions_bp.route('/drugs', methods=['GET'])
+@read_only
 def list_drugs():
     """
     Fetch the master list of the 5 weight-loss drugs.
@@ -15,25 +18,43 @@ def list_drugs():
       { "drug_id": 2, "name": "Orlistat",     "description": "..." },
       …
     ]
+    Served from the in-process drug catalog; see blueprints/common/drugs.py.
+    Supports If-None-Match: an unchanged catalog answers 304 with no body.
     """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT drug_id, name, description
-              FROM weight_loss_drugs
-            ORDER BY drug_id
-        """)
-        drugs = cursor.fetchall()
-        return jsonify(drugs), 200
+        catalog = drugs.current()
+        cached = not_modified(catalog.etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(list(catalog.rows)), catalog.etag), 200
 
     except mysql.connector.Error as err:
         print("❌ Error fetching drugs:", err)
         return jsonify(error="Internal server error"), 500
 
+
+@prescriptions_bp.route('/drugs/refresh', methods=['POST'])
+def refresh_drugs():
+    """
+    Reload the drug catalog now instead of waiting for its TTL, in this
+    worker and (through cache_versions) every other one.
+    Call after editing weight_loss_drugs.
+    Response: { "version": 3, "drugs": 5 }
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        version = drugs.refresh(cursor)
+        conn.commit()
+        return jsonify(version=version, drugs=len(drugs.all_drugs())), 200
+
+    except mysql.connector.Error as err:
+        conn.rollback()
+        print("❌ Error refreshing drug catalog:", err)
+        return jsonify(error="Internal server error"), 500
+
     finally:
         cursor.close()
-        conn.close()
 
 
 
@@ -67,20 +88,15 @@ def request_prescription():
     except (ValueError, TypeError):
         return jsonify(error="doctor_id, patient_id and drug_id must be integers"), 400
 
-    conn = None
     cursor = None
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-
         # ensure the drug exists
-        cursor.execute(
-            "SELECT 1 FROM weight_loss_drugs WHERE drug_id = %s",
-            (drug_id,)
-        )
-        if not cursor.fetchone():
+        if drugs.get_drug(drug_id) is None:
             return jsonify(error=f"Drug id {drug_id} not found"), 404
 
+        conn = get_db()
+        cursor = conn.cursor(dictionary=True)
+
         # look up patient's preferred pharmacy
         cursor.execute("""
             SELECT pharmacy_id
@@ -108,11 +124,14 @@ def request_prescription():
             dosage,
             instructions
         ))
+        prescription_id = cursor.lastrowid
+        events.record(cursor, pharmacy_id, [prescription_id], events.CREATED, 'pending')
         conn.commit()
+        events.notify(pharmacy_id)
 
         return jsonify(
           message="Prescription requested successfully",
-          prescription_id=cursor.lastrowid
+          prescription_id=prescription_id
         ), 201
 
     except mysql.connector.Error as err:
@@ -122,5 +141,3 @@ def request_prescription():
     finally:
         if cursor:
             cursor.close()
-        if conn:
-            conn.close()
@@ -1,8 +1,219 @@
+import math
 import os
 
+
+def cpu_limit(root='/sys/fs/cgroup'):
+    """
+    CPUs this process may use, rounded up: the container's cgroup CPU
+    quota (what Kubernetes sets from resources.limits.cpu) when there is
+    one, otherwise the cores it is allowed to run on. os.cpu_count()
+    alone reports the whole node.
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open(os.path.join(root, 'cpu.max')) as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: a quota of -1 means unlimited
+            with open(os.path.join(root, 'cpu', 'cpu.cfs_quota_us')) as f:
+                quota = f.read().strip()
+            with open(os.path.join(root, 'cpu', 'cpu.cfs_period_us')) as f:
+                period = f.read().strip()
+        except OSError:
+            quota = period = None
+    if quota not in (None, 'max', '-1') and int(period) > 0:
+        return max(1, math.ceil(int(quota) / int(period)))
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
 DB_CONFIG = {
     'host':     os.getenv('DB_HOST', 'localhost'),
     'user':     os.getenv('DB_USER', 'root'),
     'password': os.getenv('DB_PASS', 'Root123!'),
     'database': os.getenv('DB_NAME', 'weight_loss_clinic'),
 }
+
+# Read replica for the GET endpoints tagged ``db.read_only``. Unset
+# DB_REPLICA_HOST and every query goes to DB_CONFIG.
+DB_REPLICA_CONFIG = dict(
+    DB_CONFIG,
+    host=os.getenv('DB_REPLICA_HOST', ''),
+    user=os.getenv('DB_REPLICA_USER', DB_CONFIG['user']),
+    password=os.getenv('DB_REPLICA_PASS', DB_CONFIG['password']),
+)
+
+DB_ROUTING_CONFIG = {
+    # seconds a client keeps reading from the primary after a write, so it
+    # sees its own change however far the replica lags
+    'read_your_writes': float(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '5')),
+    'cookie':           os.getenv('DB_READ_YOUR_WRITES_COOKIE', 'db_primary_until'),
+}
+
+# Browser origins (the dashboards) allowed to call the API with
+# credentials, so the read-your-writes cookie travels cross-origin.
+# Comma-separated; credentials rule out '*', so list them explicitly.
+# Unset, any origin may call the API, but without credentials.
+CORS_CONFIG = {
+    'origins': [o.strip() for o in os.getenv('CORS_ORIGINS', '').split(',') if o.strip()],
+}
+
+# 'mysql', or 'sqlite' for the in-process backend in db_sqlite.py
+DB_DRIVER = os.getenv('DB_DRIVER', 'mysql')
+
+SQLITE_CONFIG = {
+    # ':memory:' keeps the database in this process for as long as any
+    # pooled connection to it is open
+    'database': os.getenv('SQLITE_DATABASE', ':memory:'),
+    'name':     os.getenv('SQLITE_NAME', 'pharmacy'),
+    'schema':   os.path.join(os.path.dirname(__file__), 'Database', 'sqlite', 'schema.sql'),
+}
+
+DB_POOL_CONFIG = {
+    'size':       int(os.getenv('DB_POOL_SIZE', '10')),
+    'timeout':    float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    'ping_after': float(os.getenv('DB_POOL_PING_AFTER', '30')),
+}
+
+QUERY_LOG_CONFIG = {
+    # statements slower than this are printed to stderr
+    'slow_ms': float(os.getenv('DB_SLOW_QUERY_MS', '200')),
+    # send X-DB-Queries / X-DB-Time outside debug mode too
+    'headers': os.getenv('DB_QUERY_HEADERS', '').lower() in ('1', 'true', 'yes'),
+}
+
+HEALTH_CONFIG = {
+    # seconds between background database pings
+    'interval':          float(os.getenv('HEALTH_CHECK_INTERVAL', '5')),
+    # failed pings in a row before the pod reports not ready
+    'failure_threshold': int(os.getenv('HEALTH_FAILURE_THRESHOLD', '2')),
+    # a status older than this counts as not ready (checker thread died)
+    'stale_after':       float(os.getenv('HEALTH_STALE_AFTER', '15')),
+}
+
+METRICS_CONFIG = {
+    # directory the worker processes share their metrics through, so any
+    # worker's /metrics reports the whole server; empty keeps them per process
+    'multiproc_dir':  os.getenv('METRICS_MULTIPROC_DIR', ''),
+    # seconds between writes of a worker's totals; other workers' numbers
+    # in a scrape are at most this old
+    'flush_interval': float(os.getenv('METRICS_FLUSH_INTERVAL', '5')),
+}
+
+INVALIDATION_CONFIG = {
+    # seconds between reads of cache_versions; a change reaches every
+    # worker's caches within this long of its commit
+    'interval': float(os.getenv('CACHE_VERSION_POLL_INTERVAL', '2')),
+}
+
+# Each worker keeps its own copy of these caches; writes made through the
+# API invalidate every worker's copy (invalidation.py), the TTL only
+# bounds edits made directly in the database.
+PHARMACY_CACHE_CONFIG = {
+    'max_size': int(os.getenv('PHARMACY_CACHE_SIZE', '4096')),
+    'ttl':      float(os.getenv('PHARMACY_CACHE_TTL', '300')),
+}
+
+PAGE_CONFIG = {
+    'default_limit': int(os.getenv('PAGE_DEFAULT_LIMIT', '50')),
+    'max_limit':     int(os.getenv('PAGE_MAX_LIMIT', '500')),
+}
+
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '500'))
+
+# shortest term sent to the ngram FULLTEXT index (MySQL's ngram_token_size)
+SEARCH_MIN_TERM_LENGTH = int(os.getenv('SEARCH_MIN_TERM_LENGTH', '2'))
+
+# largest list accepted by the bulk endpoints in one request
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '500'))
+
+IMPORT_CONFIG = {
+    'batch_size':     int(os.getenv('IMPORT_BATCH_SIZE', '500')),
+    'max_batch_size': int(os.getenv('IMPORT_MAX_BATCH_SIZE', '5000')),
+    # how many rejected rows are echoed back in the response
+    'max_errors':     int(os.getenv('IMPORT_MAX_ERRORS', '100')),
+}
+
+# see the note above PHARMACY_CACHE_CONFIG
+DRUG_CATALOG_CONFIG = {
+    'ttl':                float(os.getenv('DRUG_CATALOG_TTL', '600')),
+    # an unknown drug_id triggers a reload, at most this often
+    'miss_refresh_after': float(os.getenv('DRUG_CATALOG_MISS_REFRESH', '5')),
+}
+
+SSE_CONFIG = {
+    # idle streams re-check the change log this often, which picks up
+    # events written by other worker processes, and send a keepalive
+    'idle_check':    float(os.getenv('SSE_IDLE_CHECK', '10')),
+    # most events replayed per change-log query
+    'replay_limit':  int(os.getenv('SSE_REPLAY_LIMIT', '500')),
+    # client reconnect delay sent in the stream's retry: field, in ms
+    'retry_ms':      int(os.getenv('SSE_RETRY_MS', '3000')),
+    # Under gunicorn's gthread workers an open stream holds one of the
+    # worker's SERVER_CONFIG['threads'] request threads. Past this many
+    # streams a worker answers 503 so the rest stay free for requests.
+    'max_streams':   int(os.getenv('SSE_MAX_STREAMS', '4')),
+    # a stream ends after this many seconds and EventSource reconnects
+    # with Last-Event-ID, so no stream holds a thread indefinitely
+    'max_duration':  float(os.getenv('SSE_MAX_DURATION', '300')),
+    # under the ASGI server (SERVER_CONFIG['mode']) a stream holds no thread,
+    # only a socket and a coroutine, so the per-worker cap is much higher
+    'max_async_streams': int(os.getenv('SSE_MAX_ASYNC_STREAMS', '1000')),
+}
+
+SERVER_CONFIG = {
+    # 'wsgi': gunicorn gthread workers (gunicorn.conf.py)
+    # 'asgi': uvicorn workers with an event loop in front (asgi.py)
+    'mode':                os.getenv('SERVER_MODE', 'wsgi'),
+    'bind':                os.getenv('BIND', '0.0.0.0:5001'),
+    # one process per CPU of the container's quota unless told otherwise
+    'workers':             int(os.getenv('WEB_CONCURRENCY') or cpu_limit()),
+    # requests in flight per worker; capped at DB_POOL_SIZE below
+    'threads':             int(os.getenv('GUNICORN_THREADS', '8')),
+    'keepalive':           int(os.getenv('GUNICORN_KEEPALIVE', '5')),
+    'timeout':             int(os.getenv('GUNICORN_TIMEOUT', '30')),
+    'graceful_timeout':    int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30')),
+    # recycle workers now and then; 0 disables
+    'max_requests':        int(os.getenv('GUNICORN_MAX_REQUESTS', '5000')),
+    'max_requests_jitter': int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500')),
+    # ASGI mode: threads per worker that run the (blocking) Flask handlers;
+    # the event loop holds any number of idle or streaming connections.
+    # 0 (the default) means one per pooled connection; capped the same way
+    'asgi_threads':        int(os.getenv('ASGI_THREADS', '0')),
+}
+
+
+def fit_connection_budget(budget, workers, pool_size, reserved=0):
+    """
+    ``(workers, pool_size)`` cut down so ``workers * (pool_size + reserved)``
+    stays within ``budget`` connections, ``reserved`` being the connections
+    each worker holds outside its pool. A budget of 0 changes nothing.
+    """
+    if not budget:
+        return workers, pool_size
+    workers = max(1, min(workers, budget // (1 + reserved)))
+    return workers, max(1, min(pool_size, budget // workers - reserved))
+
+
+def handler_threads(requested, pool_size):
+    """
+    Handler threads per worker: ``requested`` (0 for one per pooled
+    connection), never more than ``pool_size``. Every request holds a pooled
+    connection, so a thread past the pool size would only wait on it and
+    fail with PoolTimeout under load.
+    """
+    return min(requested or pool_size, pool_size)
+
+
+# MySQL connections one pod may hold across all its workers: the server's
+# max_connections, less headroom for admin and migrations, divided by the
+# number of pods. Every worker opens its own pool (and its own replica
+# pool) plus the health checker's connection, so the worker count and pool
+# size shrink to fit.
+DB_CONNECTION_BUDGET = int(os.getenv('DB_MAX_CONNECTIONS_PER_POD', '0'))
+SERVER_CONFIG['workers'], DB_POOL_CONFIG['size'] = fit_connection_budget(
+    DB_CONNECTION_BUDGET, SERVER_CONFIG['workers'], DB_POOL_CONFIG['size'], reserved=1)
+SERVER_CONFIG['threads'] = handler_threads(SERVER_CONFIG['threads'], DB_POOL_CONFIG['size'])
+SERVER_CONFIG['asgi_threads'] = handler_threads(SERVER_CONFIG['asgi_threads'], DB_POOL_CONFIG['size'])
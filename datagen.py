@@ -0,0 +1,379 @@
+"""
+Deterministic synthetic data for load testing.
+
+    python datagen.py db  --prescriptions 100000              # into the configured database
+    python datagen.py tsv --prescriptions 4000000 --out data  # LOAD DATA files + data/load.sql
+    python datagen.py sql --prescriptions 4000000 --out data  # multi-row INSERT scripts + data/load.sql
+
+    mysql --local-infile=1 pharmacy < data/load.sql && python rollups.py rebuild
+
+Every table is sized from ``--prescriptions`` (see ``plan``). The same
+``--seed`` always produces the same rows, byte for byte. Rows carry
+explicit ids, so load them into empty tables. ``db`` writes through the
+``DB_DRIVER`` backend, so a SQLite file works too (set SQLITE_DATABASE).
+
+The data is shaped like production:
+- Pharmacy size is Zipf-like: pharmacy 1 is the busiest and a long tail
+  shares the rest.
+- Every patient has a preferred pharmacy and fills 9 in 10 prescriptions
+  there. A minority of chronic patients account for most refills.
+- Volume grows over ``--days``, dips at weekends and peaks in opening
+  hours.
+- Pending and filled prescriptions are mostly from the last OPEN_DAYS.
+  Older ones are almost all dispensed.
+- Each dispensed prescription has one payment and one pharmacy_logs row.
+  Both are billed at its pharmacy's price for the drug. Payments older
+  than a month are nearly all fulfilled.
+- Every pharmacy stocks every drug, at prices spread around a list price,
+  and a few lines are out of stock.
+- Every pharmacy and doctor has its users row, so the data loads with
+  foreign key checks on.
+
+pharmacy_events is left empty. payments_daily is rebuilt from the payments
+by ``db``; after loading files, run ``python rollups.py rebuild``.
+
+Rows are generated and written in chunks, so memory stays flat at any
+size. The generator runs at roughly 150k rows/s, so a 10M-row dataset
+(``--prescriptions 4000000``) takes about a minute as TSV.
+"""
+import argparse
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+import os
+import random
+import sys
+import time
+
+from blueprints.common import rollups
+
+EPOCH        = datetime(2025, 1, 1)  # default end of the generated history
+USER_BASE    = 1000                  # pharmacy n belongs to user USER_BASE + n, doctors follow
+CHUNK        = 10_000                # rows per generated batch
+INSERT_CHUNK = 500                   # rows per multi-row INSERT
+OPEN_DAYS    = 3
+
+# name, description, dosage, list price, share of prescriptions
+DRUGS = [
+    ('Metformin',   'Biguanide for blood sugar control', '500mg',  12.00, 30),
+    ('Orlistat',    'Lipase inhibitor',                  '120mg',  55.00, 10),
+    ('Phentermine', 'Appetite suppressant',              '37.5mg', 30.00, 20),
+    ('Semaglutide', 'GLP-1 receptor agonist',            '0.5mg', 935.00, 28),
+    ('Liraglutide', 'GLP-1 receptor agonist',            '1.8mg', 700.00, 12),
+]
+INSTRUCTIONS = ['Take once daily', 'Take twice daily with meals', 'Inject once weekly', 'Take before breakfast']
+FIRST_NAMES  = ['Ann', 'Bob', 'Carla', 'Dev', 'Elena', 'Femi', 'Grace', 'Hiro', 'Ines', 'Jamal', 'Kira', 'Luis',
+                'Maya', 'Noah', 'Olga', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tariq', 'Uma', 'Victor', 'Wen', 'Yusuf']
+LAST_NAMES   = ['Lee', 'Stone', 'Garcia', 'Patel', 'Nguyen', 'Okafor', 'Smith', 'Kim', 'Rossi', 'Haddad',
+                'Brown', 'Cohen', 'Diaz', 'Evans', 'Fischer', 'Ivanova', 'Jones', 'Khan', 'Lopez', 'Murphy']
+STREETS      = ['Main St', 'Oak Ave', 'Pine Rd', 'Maple Dr', 'Cedar Ln', 'Elm St', 'Lake Blvd', 'Hill Rd']
+PASSWORD_HASH = 'x'  # no generated user can sign in
+
+# (status, weight) for prescriptions younger than OPEN_DAYS, and older ones
+OPEN_STATUSES = (('pending', 50), ('filled', 25), ('dispensed', 25))
+OLD_STATUSES  = (('pending', 2), ('filled', 1), ('dispensed', 97))
+HOUR_WEIGHTS  = (1, 1, 1, 1, 1, 2, 4, 8, 14, 16, 16, 15, 14, 15, 16, 16, 15, 13, 10, 7, 5, 3, 2, 1)
+DAY_WEIGHTS   = (1.0, 1.0, 1.0, 1.0, 1.0, 0.6, 0.4)  # Monday first
+PHARMACY_SKEW = 0.8   # Zipf exponent of pharmacy size
+PATIENT_SKEW  = 2.0   # higher: refills concentrate on fewer patients
+
+# table -> columns, in foreign-key order
+TABLES = {
+    'users':                      ('user_id', 'email', 'password_hash', 'user_type'),
+    'doctors':                    ('doctor_id', 'user_id', 'first_name', 'last_name'),
+    'weight_loss_drugs':          ('drug_id', 'name', 'description'),
+    'pharmacies':                 ('pharmacy_id', 'user_id', 'name', 'is_active'),
+    'patients':                   ('patient_id', 'first_name', 'last_name', 'address', 'phone_number',
+                                   'zip_code', 'is_active'),
+    'patient_preferred_pharmacy': ('patient_id', 'pharmacy_id'),
+    'pharmacy_inventory':         ('pharmacy_id', 'drug_name', 'drug_id', 'stock_quantity', 'price'),
+    'pharmacy_drug_prices':       ('pharmacy_id', 'drug_id', 'price'),
+    'prescriptions':              ('prescription_id', 'doctor_id', 'patient_id', 'pharmacy_id', 'drug_id',
+                                   'medication_name', 'dosage', 'instructions', 'status', 'created_at'),
+    'payments_pharmacy':          ('payment_id', 'pharmacy_id', 'patient_id', 'amount', 'is_fulfilled',
+                                   'payment_date'),
+    'pharmacy_logs':              ('log_id', 'prescription_id', 'pharmacy_id', 'patient_id', 'amount_billed',
+                                   'timestamp'),
+}
+
+# session settings for bulk loads into MySQL. ``db`` keeps foreign key
+# checks on, so a row that references nothing fails the load; load.sql
+# turns them off, since checking LOAD DATA row by row halves its rate and
+# the files come from the same generator
+MYSQL_BULK_SESSION = ('SET unique_checks = 0',)
+LOAD_FILE_SESSION  = ('SET foreign_key_checks = 0',) + MYSQL_BULK_SESSION
+
+
+def plan(prescriptions, pharmacies=None, patients=None):
+    """Row counts for a dataset of ``prescriptions`` prescriptions."""
+    return {
+        'pharmacies':    pharmacies or max(2, prescriptions // 400),
+        'patients':      patients or max(10, prescriptions // 10),
+        'prescriptions': prescriptions,
+    }
+
+
+class _Clock:
+    """Formats seconds since ``start`` as DATETIME strings, one strftime per day."""
+
+    def __init__(self, start):
+        self.start = start
+        self._days = {}
+
+    def __call__(self, seconds):
+        day, rest = divmod(seconds, 86400)
+        prefix = self._days.get(day)
+        if prefix is None:
+            prefix = self._days[day] = (self.start + timedelta(days=day)).strftime('%Y-%m-%d')
+        hour, rest = divmod(rest, 3600)
+        minute, second = divmod(rest, 60)
+        return f'{prefix} {hour:02d}:{minute:02d}:{second:02d}'
+
+
+def _chunks(rows, size=CHUNK):
+    for lo in range(0, len(rows), size):
+        yield rows[lo:lo + size]
+
+
+def generate(counts, seed_value=0, days=365, end=EPOCH):
+    """
+    Yield ``(table, rows)`` batches in foreign-key order, each at most
+    CHUNK rows. Rows are tuples in the column order of ``TABLES[table]``
+    and hold only ints and plain strings (dates as 'YYYY-MM-DD HH:MM:SS').
+    """
+    rng = random.Random(seed_value)
+    rand, randrange, choice = rng.random, rng.randrange, rng.choice
+    n_pharm, n_patients, n_rx = counts['pharmacies'], counts['patients'], counts['prescriptions']
+    start = end - timedelta(days=days)
+    clock = _Clock(start)
+    last_second = days * 86400 - 1
+
+    # every pharmacy and doctor signs in as a user of its own
+    n_doctors = max(5, n_patients // 200)
+    doctor_user = USER_BASE + n_pharm
+    for rows in _chunks([(USER_BASE + i, f'pharmacy{i}@example.com', PASSWORD_HASH, 'pharmacy')
+                         for i in range(1, n_pharm + 1)] +
+                        [(doctor_user + i, f'doctor{i}@example.com', PASSWORD_HASH, 'doctor')
+                         for i in range(1, n_doctors + 1)]):
+        yield 'users', rows
+    # names are picked by id, not drawn from ``rng``, so adding doctors left
+    # every other generated row as it was
+    for rows in _chunks([(i, doctor_user + i, FIRST_NAMES[i % len(FIRST_NAMES)],
+                          LAST_NAMES[i * 7 % len(LAST_NAMES)]) for i in range(1, n_doctors + 1)]):
+        yield 'doctors', rows
+
+    yield 'weight_loss_drugs', [(i, name, desc) for i, (name, desc, *_) in enumerate(DRUGS, 1)]
+    for rows in _chunks([(i, USER_BASE + i, f'Pharmacy {i}', 1) for i in range(1, n_pharm + 1)]):
+        yield 'pharmacies', rows
+
+    pharm_cum = list(accumulate(1 / i ** PHARMACY_SKEW for i in range(1, n_pharm + 1)))
+    pharm_total = pharm_cum[-1]
+
+    def pick_pharmacy():
+        return min(bisect(pharm_cum, rand() * pharm_total), n_pharm - 1) + 1
+
+    preferred = [pick_pharmacy() for _ in range(n_patients)]
+    for lo in range(0, n_patients, CHUNK):
+        ids = range(lo + 1, min(lo + CHUNK, n_patients) + 1)
+        yield 'patients', [
+            (pid, choice(FIRST_NAMES), choice(LAST_NAMES), f'{randrange(1, 10_000)} {choice(STREETS)}',
+             f'555-{randrange(10_000):04d}', f'{randrange(10_000, 100_000)}', 1)
+            for pid in ids
+        ]
+        yield 'patient_preferred_pharmacy', [(pid, preferred[pid - 1]) for pid in ids]
+
+    # prices[(pharmacy - 1) * n_drugs + drug - 1]
+    n_drugs = len(DRUGS)
+    prices = [round(DRUGS[d][3] * rng.lognormvariate(0, 0.15), 2) for _ in range(n_pharm) for d in range(n_drugs)]
+    inventory = []
+    for ph in range(1, n_pharm + 1):
+        for d, (name, *_) in enumerate(DRUGS):
+            stock = 0 if rand() < 0.05 else int(rng.lognormvariate(4, 1))
+            inventory.append((ph, name, d + 1, stock, f'{prices[(ph - 1) * n_drugs + d]:.2f}'))
+    for rows in _chunks(inventory):
+        yield 'pharmacy_inventory', rows
+    for rows in _chunks([(ph, d, f'{prices[(ph - 1) * n_drugs + d - 1]:.2f}')
+                         for ph in range(1, n_pharm + 1) for d in range(1, n_drugs + 1)]):
+        yield 'pharmacy_drug_prices', rows
+    del inventory
+
+    drug_cum = list(accumulate(d[4] for d in DRUGS))
+    drug_total = drug_cum[-1]
+    hour_cum = list(accumulate(HOUR_WEIGHTS))
+    status_cum = {}
+    for key, table in (('open', OPEN_STATUSES), ('old', OLD_STATUSES)):
+        names, weights = zip(*table)
+        status_cum[key] = (names, list(accumulate(weights)))
+
+    # prescriptions per day: a linear ramp times the weekday pattern, split
+    # so the days add up to exactly n_rx
+    day_cum = list(accumulate((1 + d / days) * DAY_WEIGHTS[(start + timedelta(days=d)).weekday()]
+                              for d in range(days)))
+    rx_id = pay_id = allotted = 0
+    rx, payments, logs = [], [], []
+    for day in range(days):
+        upto = round(n_rx * day_cum[day] / day_cum[-1])
+        n, allotted = upto - allotted, upto
+        if not n:
+            continue
+        names, cum = status_cum['open' if days - day <= OPEN_DAYS else 'old']
+        seconds = sorted(day * 86400 + h * 3600 + randrange(3600)
+                         for h in rng.choices(range(24), cum_weights=hour_cum, k=n))
+        for t in seconds:
+            rx_id += 1
+            patient = int(n_patients * rand() ** PATIENT_SKEW) + 1
+            pharm = preferred[patient - 1] if rand() < 0.9 else pick_pharmacy()
+            d = bisect(drug_cum, rand() * drug_total)
+            name, _, dosage, _, _ = DRUGS[d]
+            status = names[bisect(cum, rand() * cum[-1])]
+            rx.append((rx_id, randrange(1, n_doctors + 1), patient, pharm, d + 1, name, dosage,
+                       choice(INSTRUCTIONS), status, clock(t)))
+            if status == 'dispensed':
+                pay_id += 1
+                paid = min(t + randrange(3600, 3 * 86400), last_second)
+                amount = f'{prices[(pharm - 1) * n_drugs + d] * (3 if rand() < 0.2 else 1):.2f}'
+                fulfilled = 1 if rand() < (0.98 if last_second - paid > 30 * 86400 else 0.6) else 0
+                when = clock(paid)
+                payments.append((pay_id, pharm, patient, amount, fulfilled, when))
+                logs.append((pay_id, rx_id, pharm, patient, amount, when))
+        if len(rx) >= CHUNK or day == days - 1:
+            yield 'prescriptions', rx
+            if payments:
+                yield 'payments_pharmacy', payments
+                yield 'pharmacy_logs', logs
+            rx, payments, logs = [], [], []
+
+
+def insert(conn, batches):
+    """
+    Write ``batches`` through ``conn`` as multi-row INSERTs, committing after
+    each batch, then rebuild the payments_daily rollup. Returns rows per table.
+    """
+    written = {}
+    cursor = conn.cursor()
+    try:
+        for table, rows in batches:
+            columns = TABLES[table]
+            row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+            for chunk in _chunks(rows, INSERT_CHUNK):
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(chunk))}",
+                    tuple(v for row in chunk for v in row),
+                )
+            conn.commit()
+            written[table] = written.get(table, 0) + len(rows)
+        rollups.rebuild(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+    return written
+
+
+def _sql_value(value):
+    if isinstance(value, int):
+        return str(value)
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _sql_lines(table, rows):
+    head = f"INSERT INTO {table} ({', '.join(TABLES[table])}) VALUES\n"
+    for chunk in _chunks(rows, INSERT_CHUNK):
+        yield head + ',\n'.join('(' + ', '.join(map(_sql_value, row)) + ')' for row in chunk) + ';\n'
+
+
+def _tsv_lines(table, rows):
+    # generated strings never contain tabs, newlines or backslashes, so
+    # LOAD DATA's default format needs no escaping
+    yield ''.join('\t'.join(map(str, row)) + '\n' for row in rows)
+
+
+def write_files(batches, out_dir, fmt='tsv'):
+    """
+    Write one ``<table>.tsv`` (LOAD DATA) or ``<table>.sql`` (INSERTs) file
+    per table into ``out_dir``, plus a ``load.sql`` that loads them all in
+    order. Returns rows per table.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    lines = _tsv_lines if fmt == 'tsv' else _sql_lines
+    files, written = {}, {}
+    try:
+        for table, rows in batches:
+            f = files.get(table)
+            if f is None:
+                f = files[table] = open(os.path.join(out_dir, f'{table}.{fmt}'), 'w', encoding='utf-8')
+            f.writelines(lines(table, rows))
+            written[table] = written.get(table, 0) + len(rows)
+    finally:
+        for f in files.values():
+            f.close()
+
+    with open(os.path.join(out_dir, 'load.sql'), 'w', encoding='utf-8') as f:
+        f.write(''.join(f'{statement};\n' for statement in LOAD_FILE_SESSION))
+        for table in files:
+            path = os.path.abspath(os.path.join(out_dir, f'{table}.{fmt}'))
+            if fmt == 'tsv':
+                f.write(f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} ({', '.join(TABLES[table])});\n")
+            else:
+                f.write(f"SOURCE {path};\n")
+        f.write('SET unique_checks = 1;\nSET foreign_key_checks = 1;\n')
+    return written
+
+
+def _connect():
+    import db
+    from config import DB_CONFIG, DB_DRIVER, SQLITE_CONFIG
+
+    conn = db.DRIVERS[DB_DRIVER](SQLITE_CONFIG if DB_DRIVER == 'sqlite' else DB_CONFIG)
+    if DB_DRIVER == 'mysql':
+        cursor = conn.cursor()
+        for statement in MYSQL_BULK_SESSION:
+            cursor.execute(statement)
+        cursor.close()
+    return conn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('command', choices=('db', 'tsv', 'sql'))
+    parser.add_argument('--prescriptions', type=int, default=100_000)
+    parser.add_argument('--pharmacies', type=int, help="default: one per 400 prescriptions")
+    parser.add_argument('--patients', type=int, help="default: one per 10 prescriptions")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--days', type=int, default=365, help="length of the generated history")
+    parser.add_argument('--end', type=datetime.fromisoformat, default=EPOCH,
+                        help=f"end of the generated history (default {EPOCH.date()})")
+    parser.add_argument('--out', default='data', help="output directory for tsv / sql")
+    args = parser.parse_args(argv)
+
+    counts = plan(args.prescriptions, args.pharmacies, args.patients)
+    batches = generate(counts, args.seed, args.days, args.end)
+    started = time.perf_counter()
+    if args.command == 'db':
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM prescriptions")
+            (existing,) = cursor.fetchone()
+            cursor.close()
+            if existing:
+                print(f"prescriptions already holds {existing} rows; datagen needs empty tables", file=sys.stderr)
+                return 1
+            written = insert(conn, batches)
+        finally:
+            conn.close()
+    else:
+        written = write_files(batches, args.out, args.command)
+    elapsed = time.perf_counter() - started
+
+    for table, rows in written.items():
+        print(f"{table:<28} {rows:>12,}")
+    total = sum(written.values())
+    print(f"{'total':<28} {total:>12,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    if args.command != 'db':
+        print(f"load with: mysql --local-infile=1 <database> < {os.path.join(args.out, 'load.sql')}"
+              " && python rollups.py rebuild")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""
+Shared MySQL connection pool.
+
+Blueprints call ``get_db()`` to check out a connection for the current
+request; the same connection is reused for the rest of that request and is
+handed back to the pool by the teardown hook registered in ``init_app``.
+
+The pool opens connections through a driver from ``DRIVERS``: ``mysql``
+in production, or the in-process ``sqlite`` backend in db_sqlite.py for
+tests and benchmarks. ``DB_DRIVER`` picks the process-wide default.
+
+Connections are handed out wrapped by querylog.py, which times every
+statement; the pool itself only ever holds the raw connections.
+
+With ``DB_REPLICA_HOST`` set there is a second pool for a read replica.
+A GET view tagged ``@read_only`` gets its request connection from the
+replica; everything else (writes, untagged views, ``connection()``) uses
+the primary. A successful write sets a short-lived cookie, and while it is
+valid the same client reads from the primary too, so it never sees a
+replica that hasn't caught up with its own change.
+"""
+from contextlib import contextmanager
+import queue
+import sys
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+import mysql.connector
+
+import querylog
+from config import (
+    DB_CONFIG, DB_DRIVER, DB_POOL_CONFIG, DB_REPLICA_CONFIG, DB_ROUTING_CONFIG, SQLITE_CONFIG,
+)
+
+
+def _connect_mysql(config):
+    return mysql.connector.connect(**config)
+
+
+def _connect_sqlite(config):
+    import db_sqlite
+    return db_sqlite.connect(**config)
+
+
+# driver name -> function opening one connection from a config dict
+DRIVERS = {
+    'mysql':  _connect_mysql,
+    'sqlite': _connect_sqlite,
+}
+
+
+class PoolTimeout(mysql.connector.Error):
+    """Raised when no pooled connection frees up within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    Connections are opened lazily up to ``size``; once every slot is checked
+    out, callers block for up to ``timeout`` seconds. Idle connections are
+    kept LIFO so the warmest one is handed out first, and anything idle for
+    longer than ``ping_after`` seconds is pinged before reuse.
+    """
+
+    def __init__(self, db_config, size=10, timeout=5.0, ping_after=30.0, driver='mysql'):
+        if driver not in DRIVERS:
+            raise ValueError(f"Unknown database driver: {driver}")
+        self.driver     = driver
+        self.size       = size
+        self.timeout    = timeout
+        self.ping_after = ping_after
+        self._db_config = db_config
+        self._slots     = threading.BoundedSemaphore(size)
+        self._idle      = queue.LifoQueue()
+        self._lock      = threading.Lock()
+        self._stats     = {
+            'created':    0,
+            'discarded':  0,
+            'checkouts':  0,
+            'in_use':     0,
+            'timeouts':   0,
+            'wait_total': 0.0,
+            'wait_max':   0.0,
+        }
+
+    def _connect(self):
+        conn = DRIVERS[self.driver](self._db_config)
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    def connect_unpooled(self):
+        """Open a connection to the pool's database that the pool doesn't track; the caller closes it."""
+        return DRIVERS[self.driver](self._db_config)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats['discarded'] += 1
+
+    def _take_idle(self):
+        """Pop a reusable idle connection, or None if we need a fresh one."""
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - idle_since < self.ping_after:
+                return conn
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except Exception:
+                self._discard(conn)
+
+    def acquire(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(
+                f"No database connection available after {self.timeout}s"
+            )
+        waited = time.monotonic() - start
+
+        try:
+            conn = self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts']  += 1
+            self._stats['in_use']     += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max']    = max(self._stats['wait_max'], waited)
+        return conn
+
+    def release(self, conn):
+        # end any open transaction so the next borrower doesn't inherit
+        # uncommitted writes or a stale REPEATABLE READ snapshot
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        checkouts = s['checkouts']
+        return {
+            'driver':           self.driver,
+            'pool_size':        self.size,
+            'in_use':           s['in_use'],
+            'idle':             self._idle.qsize(),
+            'created':          s['created'],
+            'discarded':        s['discarded'],
+            'checkouts':        checkouts,
+            'timeouts':         s['timeouts'],
+            'wait_time_total_ms': round(s['wait_total'] * 1000, 3),
+            'wait_time_avg_ms':   round(s['wait_total'] * 1000 / checkouts, 3) if checkouts else 0.0,
+            'wait_time_max_ms':   round(s['wait_max'] * 1000, 3),
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# None: no replica, reads use the primary; _UNSET: not built yet
+_UNSET = object()
+_replica_pool = _UNSET
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = SQLITE_CONFIG if DB_DRIVER == 'sqlite' else DB_CONFIG
+                _pool = ConnectionPool(config, driver=DB_DRIVER, **DB_POOL_CONFIG)
+    return _pool
+
+
+def get_replica_pool():
+    """Return the read replica's pool, or None when no replica is configured."""
+    global _replica_pool
+    if _replica_pool is _UNSET:
+        with _pool_lock:
+            if _replica_pool is _UNSET:
+                _replica_pool = None
+                if DB_DRIVER == 'mysql' and DB_REPLICA_CONFIG.get('host'):
+                    _replica_pool = ConnectionPool(DB_REPLICA_CONFIG, driver=DB_DRIVER, **DB_POOL_CONFIG)
+    return _replica_pool
+
+
+def reset_pool():
+    """Close idle connections and drop the pools; the next checkout rebuilds them."""
+    global _pool, _replica_pool
+    with _pool_lock:
+        for pool in (_pool, _replica_pool):
+            if pool is not None and pool is not _UNSET:
+                pool.close()
+        _pool, _replica_pool = None, _UNSET
+
+
+def set_pool(pool, replica=None):
+    """
+    Install specific pools (used by tooling that supplies its own
+    connection). Without ``replica`` every query goes to ``pool``.
+    """
+    global _pool, _replica_pool
+    with _pool_lock:
+        for old in (_pool, _replica_pool):
+            if old is not None and old is not _UNSET:
+                old.close()
+        _pool, _replica_pool = pool, replica
+
+
+def read_only(view):
+    """
+    Tag a GET view as safe to serve from the read replica. Put it under
+    the ``route`` decorator.
+    """
+    view.db_read_only = True
+    return view
+
+
+def _recently_wrote():
+    value = request.cookies.get(DB_ROUTING_CONFIG['cookie'])
+    try:
+        return value is not None and float(value) > time.time()
+    except ValueError:
+        return False
+
+
+def _route_to_replica():
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'db_read_only', False) and not _recently_wrote()
+
+
+def _acquire_for_request():
+    """Check out this request's connection: (pool, role, raw connection)."""
+    if _route_to_replica():
+        replica = get_replica_pool()
+        if replica is not None:
+            try:
+                return replica, 'replica', replica.acquire()
+            except mysql.connector.Error as err:
+                # a replica that's down or saturated shouldn't fail reads
+                # the primary can still serve
+                print(f"[WARN] replica unavailable, reading from primary: {err}", file=sys.stderr)
+    pool = get_pool()
+    return pool, 'primary', pool.acquire()
+
+
+def get_db():
+    """Return this request's pooled connection, checking one out if needed."""
+    if 'db_conn' not in g:
+        pool, role, conn = _acquire_for_request()
+        g.db_conn = querylog.InstrumentedConnection(conn)
+        # remember the owning pool so a reset mid-request can't mix them up
+        g.db_pool = pool
+        g.db_role = role
+    return g.db_conn
+
+
+def release_db(exc=None):
+    conn = g.pop('db_conn', None)
+    pool = g.pop('db_pool', None)
+    if conn is not None:
+        pool.release(conn.raw)
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled connection for a short block of work, independent of
+    the request's connection. Long-lived responses (event streams) use this
+    so they hold a connection only while they actually query. It is always
+    a primary connection: the event stream must see a change as soon as
+    the writer's notify() wakes it.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield querylog.InstrumentedConnection(conn)
+    finally:
+        pool.release(conn)
+
+
+def pool_stats():
+    stats = get_pool().stats()
+    replica = get_replica_pool()
+    if replica is not None:
+        stats['replica'] = replica.stats()
+    return stats
+
+
+def _after_request(response):
+    # a write that went through keeps this client on the primary for a while
+    window = DB_ROUTING_CONFIG['read_your_writes']
+    if (window > 0 and request.method not in READ_METHODS and g.get('db_role') == 'primary'
+            and response.status_code < 400):
+        # the dashboards call from another origin, and Lax would keep the
+        # browser from sending the cookie back on their requests. But
+        # SameSite=None needs Secure, which browsers drop over plain HTTP,
+        # so that gets Lax: same-site clients at least keep the guarantee.
+        # The header is the ingress reporting TLS it terminated; it only
+        # picks these flags
+        secure = request.is_secure or request.headers.get('X-Forwarded-Proto') == 'https'
+        response.set_cookie(
+            DB_ROUTING_CONFIG['cookie'], f'{time.time() + window:.3f}',
+            max_age=max(1, int(window + 0.999)), httponly=True,
+            samesite='None' if secure else 'Lax', secure=secure,
+        )
+    return response
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db)
+    app.after_request(_after_request)
+    querylog.init_app(app)
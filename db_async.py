@@ -0,0 +1,118 @@
+"""
+Async access to the pooled database connections, for code that runs on
+the ASGI event loop (asgi.py).
+
+The drivers in ``db.DRIVERS`` block, so every call that can wait on the
+database (checkout, execute, fetch, commit, release) runs on a dedicated
+thread pool while the coroutine awaits it. The event loop keeps serving
+other connections meanwhile. The connections come from the same pool
+``get_db`` uses, so the driver seam (MySQL, or SQLite in tests) and the
+querylog instrumentation apply unchanged.
+
+    async with db_async.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        await cursor.execute("SELECT ...", params)
+        rows = await cursor.fetchall()
+        await cursor.close()
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+import threading
+
+import db
+import querylog
+from config import DB_POOL_CONFIG
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # more threads than pooled connections would only queue on the pool
+                _executor = ThreadPoolExecutor(DB_POOL_CONFIG['size'], thread_name_prefix='db-async')
+    return _executor
+
+
+async def run(fn, *args, **kwargs):
+    """Run blocking ``fn`` on the database thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(fn, *args, **kwargs))
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, operation, params=()):
+        return await run(self._cursor.execute, operation, params)
+
+    async def fetchone(self):
+        return await run(self._cursor.fetchone)
+
+    async def fetchmany(self, size=1):
+        return await run(self._cursor.fetchmany, size)
+
+    async def fetchall(self):
+        return await run(self._cursor.fetchall)
+
+    async def close(self):
+        return await run(self._cursor.close)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+class AsyncConnection:
+    """Awaitable wrapper around a pooled connection; ``sync`` is the wrapped one."""
+
+    def __init__(self, conn):
+        self.sync = conn
+
+    def cursor(self, *args, **kwargs):
+        return AsyncCursor(self.sync.cursor(*args, **kwargs))
+
+    async def commit(self):
+        return await run(self.sync.commit)
+
+    async def rollback(self):
+        return await run(self.sync.rollback)
+
+
+@asynccontextmanager
+async def connection():
+    """Borrow a pooled connection for a short block of async work."""
+    pool = db.get_pool()
+    checkout = asyncio.get_running_loop().run_in_executor(_get_executor(), pool.acquire)
+    try:
+        # shielded so a cancelled caller can't strand a connection the
+        # thread goes on to check out anyway
+        conn = await asyncio.shield(checkout)
+    except asyncio.CancelledError:
+        checkout.add_done_callback(
+            lambda f: f.cancelled() or f.exception() or _get_executor().submit(pool.release, f.result())
+        )
+        raise
+    try:
+        yield AsyncConnection(querylog.InstrumentedConnection(conn))
+    finally:
+        await asyncio.shield(run(pool.release, conn))
+
+
+def shutdown():
+    """Stop the database thread pool; the next call starts a new one."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
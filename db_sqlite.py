@@ -0,0 +1,275 @@
+"""
+In-process SQLite backend with the slice of the mysql-connector API the
+blueprints use.
+
+Select it with ``DB_DRIVER=sqlite`` (see ``SQLITE_CONFIG``), or hand a
+``ConnectionPool(..., driver='sqlite')`` to ``db.set_pool``. Tests and
+benchmarks use it to run the real handlers end to end without a MySQL
+server. The schema lives in Database/sqlite/schema.sql and is applied
+on connect (``SQLITE_CONFIG['schema']``).
+
+Statements are written for MySQL and rewritten once per distinct query
+text: ``%s`` placeholders become ``?``, ``FOR UPDATE`` is dropped (a
+SQLite write transaction already locks the whole database),
+``ON DUPLICATE KEY UPDATE`` becomes an ``ON CONFLICT`` upsert, and
+``MATCH ... AGAINST`` calls an ngram scorer (natural language mode) or
+phrase matcher (boolean mode) registered on the connection.
+Results come back with the types mysql-connector returns: DECIMAL columns
+and SUM() as Decimal, DATE and TIMESTAMP columns as date and datetime.
+Each connection reads its column types from the schema when it opens and
+converts results and parameters itself, so nothing is registered with the
+sqlite3 module and other sqlite3 users in the process are unaffected.
+"""
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from functools import lru_cache
+import re
+import sqlite3
+
+import mysql.connector
+
+# every DECIMAL column in the schema is money with two places
+_CENTS = Decimal('0.01')
+# MySQL's ngram_token_size
+_NGRAM = 2
+
+
+class DatabaseError(mysql.connector.Error):
+    """A sqlite3 error, raised as the mysql.connector.Error handlers catch."""
+
+
+def _to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value)).quantize(_CENTS)
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+# declared column type (first word) -> converter for values read from it
+_CONVERTERS = {
+    'DECIMAL':   _to_decimal,
+    'DATE':      _to_date,
+    'DATETIME':  _to_datetime,
+    'TIMESTAMP': _to_datetime,
+}
+
+
+def _adapt(value):
+    """A parameter in a form sqlite3 stores natively, as MySQL would store it."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _concat(*parts):
+    if any(p is None for p in parts):
+        return None
+    return ''.join(str(p) for p in parts)
+
+
+def _now(fsp=0):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.isoformat(' ', timespec='microseconds' if fsp else 'seconds')
+
+
+def _ngrams(text):
+    return {text[i:i + _NGRAM] for i in range(len(text) - _NGRAM + 1)}
+
+
+def _match_against(term, *columns):
+    """Relevance as the number of the term's ngrams found in the columns."""
+    term = (term or '').lower()
+    text = ' '.join(c for c in columns if c).lower()
+    if len(term) < _NGRAM:
+        return 1.0 if term and term in text else 0.0
+    return float(len(_ngrams(term) & _ngrams(text)))
+
+
+def _match_boolean(query, *columns):
+    """1.0 when every ``+"phrase"`` of the query occurs in the columns, as the ngram parser matches phrases."""
+    text = ' '.join(c for c in columns if c).lower()
+    phrases = _PHRASE.findall((query or '').lower())
+    return 1.0 if phrases and all(p in text for p in phrases) else 0.0
+
+
+_MATCH       = re.compile(r'MATCH\(([^)]*)\)\s*AGAINST\s*\(\s*%s\s+IN NATURAL LANGUAGE MODE\s*\)', re.I)
+_MATCH_BOOL  = re.compile(r'MATCH\(([^)]*)\)\s*AGAINST\s*\(\s*%s\s+IN BOOLEAN MODE\s*\)', re.I)
+_PHRASE      = re.compile(r'\+"([^"]*)"')
+_FOR_UPDATE  = re.compile(r'\s+FOR\s+UPDATE\b', re.I)
+_ON_DUP      = re.compile(r'ON\s+DUPLICATE\s+KEY\s+UPDATE', re.I)
+_VALUES_REF  = re.compile(r'VALUES\((\w+)\)', re.I)
+_LIKE_PARAM  = re.compile(r'\bLIKE\s+%s', re.I)
+_DATE_ALIAS  = re.compile(r'\bDATE\([^()]*\)\s+AS\s+(\w+)', re.I)
+_SUM_ALIAS   = re.compile(r'\bSUM\([^()]*\)(?:\s*,\s*0\s*\))?\s+AS\s+(\w+)', re.I)
+# "p.created_at AS prescribed_at": a plain column under another name
+_COLUMN_ALIAS = re.compile(r'(?<![\w.(])(?:\w+\.)?(\w+)\s+AS\s+(\w+)', re.I)
+
+
+@lru_cache(maxsize=512)
+def translate(operation):
+    """
+    Rewrite one MySQL statement for SQLite. Returns ``(sql, converters)``,
+    where ``converters`` maps result aliases to either the function that
+    gives them MySQL's Python type (``DATE(...) AS day``, ``SUM(...) AS
+    total``, which have no declared type) or the name of the column they
+    rename, whose declared type then applies.
+    """
+    sql = _MATCH.sub(r'MATCH_AGAINST(%s, \1)', operation)
+    sql = _MATCH_BOOL.sub(r'MATCH_BOOLEAN(%s, \1)', sql)
+    sql = _FOR_UPDATE.sub('', sql)
+    parts = _ON_DUP.split(sql, maxsplit=1)
+    if len(parts) == 2:
+        head, tail = parts
+        sql = head + 'ON CONFLICT DO UPDATE SET' + _VALUES_REF.sub(r'excluded.\1', tail)
+    sql = _LIKE_PARAM.sub(r"LIKE %s ESCAPE '\\'", sql)
+    sql = sql.replace('%s', '?').replace('%%', '%')
+
+    converters = {alias: column for column, alias in _COLUMN_ALIAS.findall(sql) if column != alias}
+    converters.update({alias: _to_date for alias in _DATE_ALIAS.findall(sql)})
+    converters.update({alias: _to_decimal for alias in _SUM_ALIAS.findall(sql)})
+    return sql, converters
+
+
+class Cursor:
+    def __init__(self, conn, dictionary=False):
+        self._conn       = conn
+        self._cursor     = conn._raw.cursor()
+        self._dictionary = dictionary
+        self._columns    = None
+        self._convert    = ()
+        self.rowcount    = -1
+        self.lastrowid   = None
+
+    def execute(self, operation, params=()):
+        sql, converters = translate(operation)
+        try:
+            self._cursor.execute(sql, tuple(_adapt(p) for p in params or ()))
+        except sqlite3.Error as err:
+            raise DatabaseError(str(err)) from err
+
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        # MySQL reports the first id of a multi-row INSERT, SQLite the last
+        if (self.rowcount > 1 and self.lastrowid
+                and sql.lstrip()[:6].upper() == 'INSERT' and 'ON CONFLICT' not in sql):
+            self.lastrowid -= self.rowcount - 1
+        description = self._cursor.description
+        self._columns = [d[0] for d in description] if description else None
+        self._convert = self._conn._converters_for(self._columns, converters) if description else ()
+
+    def _row(self, row):
+        if row is None:
+            return None
+        if self._convert:
+            row = list(row)
+            for i, convert in self._convert:
+                if row[i] is not None:
+                    row[i] = convert(row[i])
+        return dict(zip(self._columns, row)) if self._dictionary else tuple(row)
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    @property
+    def column_names(self):
+        return tuple(self._columns or ())
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, raw):
+        self._raw = raw
+        self._column_types = self._read_column_types()
+
+    def _read_column_types(self):
+        """Column name -> converter, for names with one converting type across the schema."""
+        types, ambiguous = {}, set()
+        tables = [r[0] for r in self._raw.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            for _, column, decltype, *_ in self._raw.execute(f'PRAGMA table_info("{table}")'):
+                convert = _CONVERTERS.get(re.split(r'[\s(]', decltype.upper(), 1)[0]) if decltype else None
+                if types.get(column, convert) is not convert:
+                    ambiguous.add(column)
+                types[column] = convert
+        return {c: f for c, f in types.items() if f is not None and c not in ambiguous}
+
+    def _converters_for(self, columns, converters):
+        """``(index, converter)`` for every result column that needs one."""
+        found = []
+        for i, name in enumerate(columns):
+            convert = converters.get(name, name)
+            if isinstance(convert, str):
+                convert = self._column_types.get(convert)
+            if convert is not None:
+                found.append((i, convert))
+        return tuple(found)
+
+    def cursor(self, dictionary=False, buffered=None):
+        return Cursor(self, dictionary=dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def consume_results(self):
+        # results are read from SQLite on demand; nothing is left in flight
+        pass
+
+    def ping(self, reconnect=False):
+        try:
+            self._raw.execute('SELECT 1')
+        except sqlite3.Error as err:
+            raise DatabaseError(str(err)) from err
+
+    def close(self):
+        self._raw.close()
+
+
+def connect(database=':memory:', name='pharmacy', schema=None):
+    """
+    Open a connection. ``:memory:`` databases are shared by ``name`` within
+    the process and live as long as any connection to them is open.
+    ``schema`` is a SQL script (CREATE ... IF NOT EXISTS) run on connect.
+    """
+    if database == ':memory:':
+        target, uri = f'file:{name}?mode=memory&cache=shared', True
+    else:
+        target, uri = database, False
+    raw = sqlite3.connect(target, uri=uri, check_same_thread=False)
+    raw.create_function('CONCAT', -1, _concat, deterministic=True)
+    raw.create_function('NOW', -1, _now)
+    raw.create_function('MATCH_AGAINST', -1, _match_against, deterministic=True)
+    raw.create_function('MATCH_BOOLEAN', -1, _match_boolean, deterministic=True)
+    if schema:
+        with open(schema) as f:
+            raw.executescript(f.read())
+    return Connection(raw)
@@ -0,0 +1,229 @@
+"""
+EXPLAIN every query the blueprints issue and fail on unindexed full scans.
+
+Each route in ``ROUTES`` is driven through the Flask test client against
+the configured database. The statements it executes are recorded and
+re-run under EXPLAIN. Every route runs as a dry run: commit() is turned
+into rollback(), so writes never stick.
+
+A plan step with ``type = ALL`` and no ``possible_keys`` means MySQL has no
+index it could use, and that fails the check. ``type = ALL`` with candidate
+keys is only reported as a warning, because on a small development
+database the optimizer often prefers a scan even when the index exists.
+The search routes in ``NO_SCAN_ROUTES`` get no such allowance: any full
+scan in their plans fails. Steps over MySQL's own temporary results
+(``<derived2>``, ``<union2,3>``) are never counted.
+
+    python migrate.py explain
+"""
+import sys
+
+# lookup tables small enough that scanning them is the right plan
+SMALL_TABLES = {'weight_loss_drugs'}
+
+# (method, path, body): a dict is sent as JSON, a str as text/csv. Format
+# fields come from sample_ids().
+# /api/pharmacy/patients and the unpaged list endpoints are left out on
+# purpose: they return every row, so they scan by design.
+ROUTES = [
+    ('GET',   '/api/pharmacy/queue?user_id={user_id}', None),
+    ('GET',   '/api/pharmacy/prescriptions/filled?user_id={user_id}', None),
+    ('POST',  '/api/pharmacy/prescriptions/{prescription_id}/fulfill?user_id={user_id}', None),
+    ('POST',  '/api/pharmacy/prescriptions/fulfill?user_id={user_id}', {'prescription_ids': ['{prescription_id}']}),
+    ('POST',  '/api/pharmacy/prescriptions/{prescription_id}/dispense?user_id={user_id}', None),
+    ('POST',  '/api/pharmacy/prescriptions/dispense?user_id={user_id}', {'prescription_ids': ['{prescription_id}']}),
+    ('GET',   '/api/prices/current-prices?user_id={user_id}', None),
+    ('PATCH', '/api/prices/update', {'user_id': '{user_id}', 'drug_id': '{drug_id}', 'price': 1}),
+    ('PATCH', '/api/prices/bulk-update', {'user_id': '{user_id}', 'prices': [{'drug_id': '{drug_id}', 'price': 1}]}),
+    ('GET',   '/api/pharmacy/payments?user_id={user_id}', None),
+    ('GET',   '/api/pharmacy/payments?user_id={user_id}&status=fulfilled&limit=50', None),
+    ('GET',   '/api/pharmacy/payments/summary?user_id={user_id}', None),
+    ('GET',   '/api/pharmacy/payments/revenue?user_id={user_id}', None),
+    ('GET',   '/api/pharmacy/prescriptions?limit=50', None),
+    ('GET',   '/api/pharmacy/prescriptions?search=met&limit=50', None),
+    ('GET',   '/api/pharmacy/prescriptions/{prescription_id}', None),
+    ('GET',   '/api/pharmacy/requests?pharmacy_id={pharmacy_id}', None),
+    ('GET',   '/api/pharmacy/logs?limit=50', None),
+    ('GET',   '/api/pharmacy/logs?search=met&limit=50', None),
+    ('POST',  '/api/pharmacy/inventory/add', {'user_id': '{user_id}', 'drug_name': 'Metformin', 'stock_quantity': 1}),
+    ('POST',  '/api/pharmacy/inventory/import?user_id={user_id}', 'drug_name,stock_quantity\nMetformin,1\n'),
+    ('GET',   '/api/pharmacy/inventory?user_id={user_id}', None),
+    ('GET',   '/api/pharmacy/getPharmacyId?user_id={user_id}', None),
+    ('GET',   '/api/prescriptions/drugs', None),
+    ('POST',  '/api/prescriptions/request', {
+        'doctor_id': '{doctor_id}', 'patient_id': '{patient_id}', 'drug_id': '{drug_id}',
+        'dosage': '1mg', 'instructions': 'explain check',
+    }),
+]
+
+
+# GET /api/pharmacy/events streams until the client leaves, so its change
+# log reads are issued directly rather than through the test client
+EVENTS_ROUTE = 'GET /api/pharmacy/events'
+
+# search-box routes run on every keystroke against the largest tables, and
+# a scan there (e.g. MATCH ... OR MATCH ...) is a query-shape bug, not an
+# optimizer choice. Every open event stream re-reads the change log, so the
+# same goes for it.
+NO_SCAN_ROUTES = {
+    'GET /api/pharmacy/prescriptions?search=met&limit=50',
+    'GET /api/pharmacy/logs?search=met&limit=50',
+    EVENTS_ROUTE,
+}
+
+
+class RecordingCursor:
+    def __init__(self, cursor, log):
+        self._cursor = cursor
+        self._log    = log
+
+    def execute(self, query, params=()):
+        self._log.append((query, params))
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class DryRunConnection:
+    """Connection proxy that records statements and never commits."""
+
+    def __init__(self, conn):
+        self._conn   = conn
+        self.queries = []
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._conn.cursor(*args, **kwargs), self.queries)
+
+    def commit(self):
+        self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SingleConnectionPool:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def acquire(self):
+        return self._conn
+
+    def release(self, conn):
+        conn.rollback()
+
+    def close(self):
+        pass
+
+
+def sample_ids(conn):
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT p.user_id, p.pharmacy_id, pr.prescription_id, pr.patient_id,
+                   pr.doctor_id, pr.drug_id
+              FROM pharmacies p
+              JOIN prescriptions pr ON pr.pharmacy_id = p.pharmacy_id
+             WHERE p.is_active = TRUE
+               AND pr.drug_id IS NOT NULL
+             LIMIT 1
+        """)
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row:
+        raise SystemExit("explain check needs at least one active pharmacy with a prescription")
+    return row
+
+
+def _fill(value, ids):
+    if isinstance(value, dict):
+        return {k: _fill(v, ids) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, ids) for v in value]
+    if isinstance(value, str):
+        filled = value.format(**ids)
+        return int(filled) if filled != value and filled.isdigit() else filled
+    return value
+
+
+def capture_queries(conn, routes=ROUTES):
+    """Run every route once and return ``[(route, query, params), ...]``."""
+    import db
+    from app import app
+    from blueprints.common import drugs, events, pharmacy
+    from config import SSE_CONFIG
+
+    ids = sample_ids(conn)
+    proxy = DryRunConnection(conn)
+    captured = []
+    db.set_pool(SingleConnectionPool(proxy))
+    pharmacy.clear_cache()
+    drugs.clear_cache()
+    try:
+        client = app.test_client()
+        for method, path, body in routes:
+            route = f"{method} {path}"
+            before = len(proxy.queries)
+            if isinstance(body, str):
+                client.open(_fill(path, ids), method=method, data=body, content_type='text/csv')
+            else:
+                client.open(_fill(path, ids), method=method, json=_fill(body, ids))
+            captured.extend((route, q, p) for q, p in proxy.queries[before:])
+
+        before = len(proxy.queries)
+        cursor = proxy.cursor(dictionary=True)
+        try:
+            last_id = events.latest_event_id(cursor, ids['pharmacy_id'])
+            events.events_since(cursor, ids['pharmacy_id'], last_id, SSE_CONFIG['replay_limit'])
+        finally:
+            cursor.close()
+        captured.extend((EVENTS_ROUTE, q, p) for q, p in proxy.queries[before:])
+    finally:
+        db.reset_pool()
+    return captured
+
+
+def problems(plan_rows, strict=False):
+    """
+    Split EXPLAIN rows into (errors, warnings) describing full scans.
+    With ``strict`` every full scan is an error.
+    """
+    errors, warnings = [], []
+    for row in plan_rows:
+        table = row.get('table') or ''
+        if row.get('type') != 'ALL' or table in SMALL_TABLES or table.startswith('<'):
+            continue
+        msg = f"full scan of {table} (~{row.get('rows')} rows)"
+        if strict:
+            errors.append(msg + (f", not using {row['possible_keys']}" if row.get('possible_keys') else ", no usable index"))
+        elif row.get('possible_keys'):
+            warnings.append(msg + f", optimizer skipped {row['possible_keys']}")
+        else:
+            errors.append(msg + ", no usable index")
+    return errors, warnings
+
+
+def run_explain_check(conn, out=sys.stdout):
+    seen = set()
+    failures = 0
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for route, query, params in capture_queries(conn):
+            statement = ' '.join(query.split()).rstrip(';')
+            if statement in seen or not statement.upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT')):
+                continue
+            seen.add(statement)
+            cursor.execute("EXPLAIN " + statement, params or ())
+            errors, warnings = problems(cursor.fetchall(), strict=route in NO_SCAN_ROUTES)
+            for msg in errors:
+                print(f"FAIL  {route}: {msg}\n      {statement[:160]}", file=out)
+            for msg in warnings:
+                print(f"WARN  {route}: {msg}", file=out)
+            failures += len(errors)
+    finally:
+        cursor.close()
+        conn.rollback()
+
+    print(f"{len(seen)} statements explained, {failures} unindexed full scans", file=out)
+    return 1 if failures else 0
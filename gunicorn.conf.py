@@ -0,0 +1,41 @@
+# gunicorn settings; every value comes from SERVER_CONFIG in config.py.
+#
+#     gunicorn -c gunicorn.conf.py wsgi:app
+
+from config import SERVER_CONFIG
+
+bind                = SERVER_CONFIG['bind']
+workers             = SERVER_CONFIG['workers']
+# gthread: each worker serves `threads` requests at once, so a request
+# waiting on MySQL doesn't hold up the rest of the worker
+worker_class        = 'gthread'
+threads             = SERVER_CONFIG['threads']
+keepalive           = SERVER_CONFIG['keepalive']
+timeout             = SERVER_CONFIG['timeout']
+graceful_timeout    = SERVER_CONFIG['graceful_timeout']
+max_requests        = SERVER_CONFIG['max_requests']
+max_requests_jitter = SERVER_CONFIG['max_requests_jitter']
+# build the app in each worker, after the fork
+preload_app         = False
+accesslog           = '-'
+
+
+def on_starting(server):
+    import metrics
+    metrics.clear_multiproc_dir()
+
+
+def post_worker_init(worker):
+    import wsgi
+    wsgi.start_worker()
+
+
+def worker_exit(server, worker):
+    import wsgi
+    wsgi.stop_worker()
+
+
+def child_exit(server, worker):
+    # runs in the master, also for a worker killed before worker_exit
+    import metrics
+    metrics.mark_process_dead(worker.pid)
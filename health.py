@@ -0,0 +1,182 @@
+"""
+Liveness and readiness probes.
+
+``GET /api/health/live`` answers as long as the process can serve HTTP.
+``GET /api/health/ready`` reports whether this worker can reach the
+database, from a status that a background ``HealthChecker`` refreshes every
+``interval`` seconds. A probe only reads that cached status, so it costs
+nothing however often Kubernetes asks, and a pod whose database goes away
+drops out of rotation within a couple of intervals instead of making
+callers sit through connect timeouts.
+
+The checker pings on a connection of its own, outside the request pool.
+A pool that is busy serving requests is not a database that is down, and
+pulling a pod from rotation because it is loaded only piles its traffic
+onto the others. The pool's state goes in the status as ``pool`` (with its
+checkout timeouts) for dashboards, but never decides readiness. Each
+worker so holds one connection more than its pool size, which
+``config.fit_connection_budget`` accounts for.
+
+``wsgi.start_worker`` starts the checker. Where nothing started it (flask
+run, tests) the ready probe runs the check inline, at most once an interval.
+"""
+import threading
+import time
+
+from flask import jsonify
+
+import db
+from config import HEALTH_CONFIG
+
+
+class HealthChecker:
+    def __init__(self, interval=5.0, failure_threshold=2, stale_after=15.0):
+        self.interval          = interval
+        self.failure_threshold = failure_threshold
+        self.stale_after       = stale_after
+        self._lock     = threading.Lock()
+        self._stop     = threading.Event()
+        self._thread   = None
+        # the dedicated ping connection and the pool whose database it reaches
+        self._conn_lock = threading.Lock()
+        self._conn      = None
+        self._conn_pool = None
+        self.reset()
+
+    def reset(self):
+        """Stop the background thread, close its connection and forget every check so far."""
+        self.stop()
+        with self._conn_lock:
+            self._close()
+        self._failures = 0
+        # replaced wholesale after every check, so readers never need the lock
+        self._status   = {
+            'ready':      False,
+            'checked_at': None,
+            'latency_ms': None,
+            'failures':   0,
+            'error':      'not checked yet',
+            'pool':       None,
+        }
+
+    def _close(self):
+        conn, self._conn, self._conn_pool = self._conn, None, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _ping(self, pool):
+        with self._conn_lock:
+            # the worker's pool is rebuilt after fork and swapped in tests
+            if self._conn_pool is not pool:
+                self._close()
+            try:
+                if self._conn is None:
+                    self._conn = pool.connect_unpooled()
+                    self._conn_pool = pool
+                self._conn.ping(reconnect=False)
+            except Exception:
+                # reconnect from scratch on the next check
+                self._close()
+                raise
+
+    def check(self):
+        """Ping the database once and update the cached status."""
+        pool = db.get_pool()
+        start = time.monotonic()
+        error = None
+        try:
+            self._ping(pool)
+        except Exception as err:
+            error = str(err) or type(err).__name__
+        latency = time.monotonic() - start
+        stats = pool.stats()
+
+        with self._lock:
+            self._failures = self._failures + 1 if error else 0
+            # one blip doesn't pull the pod; failure_threshold in a row does
+            ready = self._status['ready'] if error else True
+            if self._failures >= self.failure_threshold:
+                ready = False
+            self._status = {
+                'ready':      ready,
+                'checked_at': time.time(),
+                'latency_ms': round(latency * 1000, 3),
+                'failures':   self._failures,
+                'error':      error,
+                'pool':       {
+                    'size':     stats['pool_size'],
+                    'in_use':   stats['in_use'],
+                    'timeouts': stats['timeouts'],
+                },
+            }
+        return self._status
+
+    def status(self):
+        """The cached status, marked not ready if the checker has stopped reporting."""
+        status = dict(self._status)
+        checked_at = status['checked_at']
+        age = None if checked_at is None else time.time() - checked_at
+        status['age_s'] = None if age is None else round(age, 3)
+        if age is not None and age > self.stale_after:
+            status['ready'] = False
+            status['error'] = f"health check is {age:.0f}s old"
+        return status
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def current(self):
+        """Status for a probe; checks inline when no background thread runs."""
+        if not self.running:
+            checked_at = self._status['checked_at']
+            if checked_at is None or time.time() - checked_at >= self.interval:
+                self.check()
+        return self.status()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='health-checker', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+
+checker = HealthChecker(**HEALTH_CONFIG)
+
+
+def live():
+    return jsonify(status="alive"), 200
+
+
+def ready():
+    status = checker.current()
+    body = dict(status, status="ready" if status['ready'] else "unavailable")
+    return jsonify(body), 200 if status['ready'] else 503
+
+
+def start():
+    checker.start()
+
+
+def stop():
+    checker.stop(timeout=checker.interval)
+
+
+def init_app(app):
+    app.add_url_rule('/api/health/live', 'health_live', live, methods=['GET'])
+    app.add_url_rule('/api/health/ready', 'health_ready', ready, methods=['GET'])
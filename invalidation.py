@@ -0,0 +1,112 @@
+"""
+Cache invalidation across worker processes.
+
+Every worker keeps its own in-process caches (the user -> pharmacy_id map,
+the drug catalog), so dropping an entry in the worker that made a change
+leaves the others serving it until their TTL runs out. Instead, a write
+that makes a cache stale calls ``bump(cursor, name)`` inside its
+transaction, which increments that cache's row in ``cache_versions``.
+Each worker runs a ``VersionWatcher`` that reads the table every
+``interval`` seconds and calls the handlers ``register``-ed for every
+version that moved, so a change reaches all workers (and pods) within one
+interval of its commit.
+
+``wsgi.start_worker`` starts the watcher. Where nothing started it (flask
+run, tests) there is only one process and the writer's own local
+invalidation is enough. The TTLs stay as a backstop for edits made
+outside the API that forget to bump the row.
+"""
+import sys
+import threading
+
+import db
+from config import INVALIDATION_CONFIG
+
+PHARMACIES = 'pharmacies'
+DRUGS      = 'drugs'
+
+
+def bump(cursor, name):
+    """Mark cache ``name`` stale in every worker once the caller commits."""
+    cursor.execute("""
+        INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (name,))
+
+
+class VersionWatcher:
+    def __init__(self, interval=2.0):
+        self.interval  = interval
+        self._handlers = {}
+        self._seen     = {}
+        self._stop     = threading.Event()
+        self._thread   = None
+        self.polls     = 0
+
+    def register(self, name, handler):
+        """Call ``handler()`` whenever cache ``name`` is bumped."""
+        self._handlers.setdefault(name, []).append(handler)
+
+    def poll(self):
+        """Read every version once and run the handlers of those that moved. Returns their names."""
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT name, version FROM cache_versions")
+                versions = dict(cursor.fetchall())
+            finally:
+                cursor.close()
+        self.polls += 1
+        # the first poll fires too: the caches may have filled before it
+        moved = [name for name, version in versions.items() if self._seen.get(name) != version]
+        self._seen = versions
+        for name in moved:
+            for handler in self._handlers.get(name, ()):
+                handler()
+        return moved
+
+    def reset(self):
+        self.stop()
+        self._seen = {}
+        self.polls = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as err:
+                # keep serving from the TTL-bounded caches until the database is back
+                print(f"[WARN] cache version poll failed: {err}", file=sys.stderr)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cache-versions', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+
+watcher = VersionWatcher(**INVALIDATION_CONFIG)
+
+
+def register(name, handler):
+    watcher.register(name, handler)
+
+
+def start():
+    watcher.start()
+
+
+def stop():
+    watcher.stop(timeout=watcher.interval)
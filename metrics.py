@@ -0,0 +1,402 @@
+"""
+Request metrics in the Prometheus text exposition format.
+
+``init_app`` hooks every request: ``before_request`` starts a timer and
+bumps the in-flight gauge, ``after_request`` records the latency, status
+and response size under the request's blueprint and endpoint, and
+``teardown_request`` drops the in-flight gauge again (it also runs after a
+streamed body finishes or a view raises). ``GET /metrics`` renders it all.
+
+Each thread records into its own shard, so the request path never takes a
+lock: it's a dict lookup and a few integer adds. A scrape copies every
+shard and sums them. Shards outlive their threads so counters never go
+backwards.
+
+A server runs several worker processes, and a scrape lands on any one of
+them. With ``METRICS_CONFIG['multiproc_dir']`` set, ``start`` (run by
+``wsgi.start_worker``) has each worker write its totals to its own file
+in that directory every ``flush_interval`` seconds, and ``/metrics``
+adds every other worker's file to the live numbers of the worker that
+answers. A worker that exits folds its totals into one archive file and
+removes its own, so totals never drop when a worker is recycled and the
+directory holds one file per live worker plus the archive, however many
+have come and gone. Workers that die without running their exit hook are
+folded in by the server (``mark_process_dead``, from gunicorn's
+``child_exit``). The server clears the directory when it starts
+(``clear_multiproc_dir``).
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import fcntl
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from flask import Response, g, request
+
+from config import METRICS_CONFIG
+
+# seconds; Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bytes
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# in the multiprocess directory: the summed totals of exited workers, and
+# the lock that keeps a scrape from seeing a worker both there and in its
+# own file
+ARCHIVE_FILE = 'metrics-archive.json'
+LOCK_FILE    = 'metrics.lock'
+
+
+class _Shard:
+    """One thread's share of the metrics; only that thread writes to it."""
+
+    def __init__(self, latency_slots, size_slots):
+        self.requests  = {}   # (blueprint, endpoint, method, status) -> count
+        self.latency   = {}   # (blueprint, endpoint, method) -> [bucket counts..., sum]
+        self.sizes     = {}   # (blueprint, endpoint, method) -> [bucket counts..., sum]
+        self.in_flight = 0
+        self._latency_slots = latency_slots
+        self._size_slots    = size_slots
+
+    @staticmethod
+    def _observe(series, key, buckets, slots, value):
+        counts = series.get(key)
+        if counts is None:
+            counts = series[key] = [0] * slots + [0]
+        # the slot past the last bound is +Inf; the final entry is the sum
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def observe(self, route, status, seconds, size, latency_buckets, size_buckets):
+        key = route + (status,)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self._observe(self.latency, route, latency_buckets, self._latency_slots, seconds)
+        if size is not None:
+            self._observe(self.sizes, route, size_buckets, self._size_slots, size)
+
+
+class MetricsCollector:
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self.size_buckets    = tuple(size_buckets)
+        self._lock   = threading.Lock()
+        self._local  = threading.local()
+        self._shards = []
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(len(self.latency_buckets) + 1, len(self.size_buckets) + 1)
+            # the only lock on the hot path, once per thread
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def request_started(self):
+        self._shard().in_flight += 1
+
+    def request_finished(self):
+        self._shard().in_flight -= 1
+
+    def observe(self, blueprint, endpoint, method, status, seconds, size=None):
+        self._shard().observe(
+            (blueprint, endpoint, method), str(status), seconds, size,
+            self.latency_buckets, self.size_buckets,
+        )
+
+    def reset(self):
+        with self._lock:
+            self._shards = []
+            self._local  = threading.local()
+
+    def snapshot(self):
+        """Sum every shard: ``{'requests': {...}, 'latency': {...}, 'sizes': {...}, 'in_flight': n}``."""
+        with self._lock:
+            shards = list(self._shards)
+        merged = _empty()
+        for shard in shards:
+            # dict.copy() is atomic under the GIL, so a writer adding a new
+            # series mid-scrape can't break the iteration
+            merge(merged, {
+                'requests':  shard.requests.copy(),
+                'latency':   {k: list(v) for k, v in shard.latency.copy().items()},
+                'sizes':     {k: list(v) for k, v in shard.sizes.copy().items()},
+                'in_flight': shard.in_flight,
+            })
+        return merged
+
+    def render(self, snap=None):
+        """The exposition text for ``snap``, by default this process's ``snapshot()``."""
+        snap  = self.snapshot() if snap is None else snap
+        lines = [
+            '# HELP http_requests_total Requests handled, by route and status code.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (bp, ep, method, status), count in sorted(snap['requests'].items()):
+            labels = _labels(blueprint=bp, endpoint=ep, method=method, status=status)
+            lines.append(f'http_requests_total{{{labels}}} {count}')
+
+        lines += [
+            '# HELP http_requests_in_flight Requests currently being served.',
+            '# TYPE http_requests_in_flight gauge',
+            f"http_requests_in_flight {snap['in_flight']}",
+        ]
+        lines += _histogram(
+            'http_request_duration_seconds', 'Time to build the response, by route.',
+            snap['latency'], self.latency_buckets,
+        )
+        lines += _histogram(
+            'http_response_size_bytes', 'Response body size, by route; streamed bodies are not counted.',
+            snap['sizes'], self.size_buckets,
+        )
+        return '\n'.join(lines) + '\n'
+
+
+def _empty():
+    return {'requests': {}, 'latency': {}, 'sizes': {}, 'in_flight': 0}
+
+
+def merge(into, snap):
+    """Add snapshot ``snap`` to ``into``, in place."""
+    for key, count in snap['requests'].items():
+        into['requests'][key] = into['requests'].get(key, 0) + count
+    for name in ('latency', 'sizes'):
+        target = into[name]
+        for key, counts in snap[name].items():
+            total = target.setdefault(key, [0] * len(counts))
+            for i, c in enumerate(counts):
+                total[i] += c
+    into['in_flight'] += snap['in_flight']
+    return into
+
+
+def _dump(snap):
+    return json.dumps({
+        'requests':  [[list(k), v] for k, v in snap['requests'].items()],
+        'latency':   [[list(k), v] for k, v in snap['latency'].items()],
+        'sizes':     [[list(k), v] for k, v in snap['sizes'].items()],
+        'in_flight': snap['in_flight'],
+    })
+
+
+def _load(text):
+    data = json.loads(text)
+    return {
+        'requests':  {tuple(k): v for k, v in data['requests']},
+        'latency':   {tuple(k): v for k, v in data['latency']},
+        'sizes':     {tuple(k): v for k, v in data['sizes']},
+        'in_flight': data['in_flight'],
+    }
+
+
+class ProcessFiles:
+    """Writes this worker's totals to ``directory`` and reads the other workers'."""
+
+    def __init__(self, collector, directory, flush_interval=5.0):
+        self.collector      = collector
+        self.directory      = directory
+        self.flush_interval = flush_interval
+        self.path    = None
+        self._stop   = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _write(path, snap):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(_dump(snap))
+        # readers only ever see a whole file
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return _load(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            print(f"[WARN] skipping metrics file {path}: {err}", file=sys.stderr)
+            return None
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def flush(self, in_flight=True):
+        snap = self.collector.snapshot()
+        if not in_flight:
+            snap['in_flight'] = 0
+        self._write(self.path, snap)
+
+    def archive(self, paths):
+        """Add the files of exited workers to the archive and remove them. Returns how many there were."""
+        archive = os.path.join(self.directory, ARCHIVE_FILE)
+        with self._locked(exclusive=True):
+            paths = [p for p in paths if os.path.exists(p)]
+            if not paths:
+                return 0
+            total = self._read(archive) or _empty()
+            for path in paths:
+                snap = self._read(path)
+                if snap is not None:
+                    merge(total, snap)
+            # an exited worker serves nothing, but its counts stand
+            total['in_flight'] = 0
+            self._write(archive, total)
+            for path in paths:
+                os.remove(path)
+        return len(paths)
+
+    def mark_process_dead(self, pid):
+        """Archive the files of worker ``pid``, which exited without doing it itself."""
+        return self.archive(glob.glob(os.path.join(self.directory, f'metrics-{pid}-*.json')))
+
+    def others(self):
+        """Snapshots of every other live worker, plus the archive of the exited ones."""
+        found = []
+        with self._locked(exclusive=False):
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                if path == self.path:
+                    continue
+                snap = self._read(path)
+                if snap is not None:
+                    found.append(snap)
+        return found
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self.running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # pid plus a token: a recycled pid must not overwrite a dead worker's totals
+        self.path = os.path.join(self.directory, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        self.flush()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+            self.flush()
+            self.archive([self.path])
+        self.path = None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _format_bound(bound):
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+def _histogram(name, help_text, series, buckets):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for (bp, ep, method), counts in sorted(series.items()):
+        labels = _labels(blueprint=bp, endpoint=ep, method=method)
+        cumulative = 0
+        for bound, count in zip(buckets, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{_format_bound(bound)}"}} {cumulative}')
+        cumulative += counts[len(buckets)]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {counts[-1]}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return lines
+
+
+collector = MetricsCollector()
+files = ProcessFiles(collector, METRICS_CONFIG['multiproc_dir'], METRICS_CONFIG['flush_interval'])
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    collector.request_started()
+
+
+def _after_request(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        collector.observe(
+            request.blueprint or '',
+            # unmatched URLs share one series instead of one per path
+            request.endpoint or 'unmatched',
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+            None if response.is_streamed else response.calculate_content_length(),
+        )
+    return response
+
+
+def _teardown_request(exc=None):
+    if g.pop('metrics_start', None) is not None:
+        collector.request_finished()
+
+
+def metrics_view():
+    snap = collector.snapshot()
+    if files.path is not None:
+        for other in files.others():
+            merge(snap, other)
+    return Response(collector.render(snap), content_type=CONTENT_TYPE)
+
+
+def start():
+    """Share this worker's metrics through the multiprocess directory, if one is configured."""
+    if files.directory:
+        files.start()
+
+
+def stop():
+    files.stop(timeout=files.flush_interval)
+
+
+def mark_process_dead(pid):
+    """Fold a dead worker's totals into the archive; call from the server process."""
+    if files.directory and os.path.isdir(files.directory):
+        files.mark_process_dead(pid)
+
+
+def clear_multiproc_dir():
+    """Remove every worker's file and the archive; call once as the server starts, before any worker."""
+    if files.directory:
+        for path in glob.glob(os.path.join(files.directory, 'metrics-*.json*')):
+            os.remove(path)
+        if os.path.exists(os.path.join(files.directory, LOCK_FILE)):
+            os.remove(os.path.join(files.directory, LOCK_FILE))
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
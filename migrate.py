@@ -0,0 +1,178 @@
+"""
+Versioned schema migrations.
+
+Migration files live in Database/migrations and are named
+``<version>_<description>.sql``. They are applied in version order, and each
+applied version is recorded in ``schema_migrations``, so running ``up``
+again only applies new files.
+
+    python migrate.py status     # list applied / pending migrations
+    python migrate.py up         # apply everything pending
+    python migrate.py explain    # EXPLAIN every route's queries, fail on full scans
+
+MySQL commits DDL implicitly, so a migration that fails halfway is not
+rolled back. Its version is only recorded once every statement succeeded,
+so fix the file (or the schema) and run ``up`` again.
+"""
+import argparse
+import os
+import re
+import sys
+
+import mysql.connector
+
+from config import DB_CONFIG
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Database', 'migrations')
+_FILENAME = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name    = name
+        self.path    = path
+
+    def statements(self):
+        with open(self.path, encoding='utf-8') as f:
+            return split_statements(f.read())
+
+    def __repr__(self):
+        return f"<Migration {self.version:03d} {self.name}>"
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Return the migrations in ``directory`` sorted by version."""
+    found = {}
+    for filename in os.listdir(directory):
+        m = _FILENAME.match(filename)
+        if not m:
+            continue
+        version = int(m.group(1))
+        if version in found:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        found[version] = Migration(version, m.group(2), os.path.join(directory, filename))
+    return [found[v] for v in sorted(found)]
+
+
+def split_statements(sql):
+    """Split a SQL script on ';', ignoring comments and semicolons inside quotes."""
+    statements, current = [], []
+    quote = None
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if quote:
+            current.append(ch)
+            if ch == '\\' and i + 1 < n:
+                current.append(sql[i + 1])
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in ("'", '"', '`'):
+            quote = ch
+            current.append(ch)
+        elif ch == '#' or sql.startswith('--', i):
+            while i < n and sql[i] != '\n':
+                i += 1
+            continue
+        elif ch == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    INT PRIMARY KEY,
+            name       VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending(conn, migrations):
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+    return [m for m in migrations if m.version not in done]
+
+
+def apply(conn, migration, out=sys.stdout):
+    cursor = conn.cursor()
+    try:
+        for statement in migration.statements():
+            cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (migration.version, migration.name)
+        )
+        conn.commit()
+        print(f"applied {migration.version:03d}_{migration.name}", file=out)
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def migrate_up(conn, migrations=None, out=sys.stdout):
+    todo = pending(conn, discover() if migrations is None else migrations)
+    for migration in todo:
+        apply(conn, migration, out=out)
+    if not todo:
+        print("database is up to date", file=out)
+    return todo
+
+
+def cmd_status(conn):
+    migrations = discover()
+    todo = {m.version for m in pending(conn, migrations)}
+    for m in migrations:
+        state = 'pending' if m.version in todo else 'applied'
+        print(f"{m.version:03d}_{m.name:<40} {state}")
+    return 0
+
+
+def cmd_up(conn):
+    migrate_up(conn)
+    return 0
+
+
+def cmd_explain(conn):
+    # imported lazily: only the explain check needs the Flask app
+    from explain_check import run_explain_check
+    return run_explain_check(conn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('command', choices=('status', 'up', 'explain'))
+    args = parser.parse_args(argv)
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        return {'status': cmd_status, 'up': cmd_up, 'explain': cmd_explain}[args.command](conn)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Per-query instrumentation for pooled connections.
+
+``db.get_db()`` and ``db.connection()`` hand out connections wrapped in
+``InstrumentedConnection``; every cursor they open times its ``execute``
+and fetches and counts the rows. The request keeps a running query count
+and total time, sent back as ``X-DB-Queries`` / ``X-DB-Time`` (ms) when
+the app runs in debug mode or ``QUERY_LOG_CONFIG['headers']`` is set.
+
+A statement that takes longer than ``QUERY_LOG_CONFIG['slow_ms']`` is
+printed to stderr by its fingerprint: the SQL with literals replaced by
+``?`` and repeated ``(...)`` groups (multi-row VALUES, IN lists) folded
+into one, so a query shows up the same however many rows it carried.
+
+``capture()`` collects every ``QueryRecord`` issued inside it; the tests
+use it to put a ceiling on the number of queries per endpoint.
+"""
+from contextlib import contextmanager
+from functools import lru_cache
+import re
+import sys
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+
+from config import QUERY_LOG_CONFIG
+
+_STRING   = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER   = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PARAM    = re.compile(r'%s|%\(\w+\)s')
+_SPACE    = re.compile(r'\s+')
+# a parenthesised group (one level of nesting allowed, for NOW()) repeated
+# back to back: "(?, ?), (?, ?), (?, ?)" -> "(?, ?), ..."
+_REPEATED = re.compile(r'(\((?:[^()]|\([^()]*\))*\))(?:\s*,\s*\1)+')
+_IN_LIST  = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement):
+    """Normalised form of ``statement`` that is the same for every parameter set."""
+    sql = _STRING.sub('?', statement)
+    sql = _PARAM.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip().rstrip(';').strip()
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _REPEATED.sub(r'\1, ...', sql)
+
+
+class QueryRecord:
+    __slots__ = ('statement', 'duration', 'rows')
+
+    def __init__(self, statement, duration):
+        self.statement = statement
+        self.duration  = duration
+        self.rows      = None
+
+    @property
+    def fingerprint(self):
+        return fingerprint(self.statement)
+
+    def __repr__(self):
+        return f"<QueryRecord {self.duration * 1000:.2f}ms rows={self.rows} {self.fingerprint}>"
+
+
+_listeners = []
+
+
+@contextmanager
+def capture():
+    """Collect every query run inside the block into the yielded list."""
+    records = []
+    _listeners.append(records)
+    try:
+        yield records
+    finally:
+        _listeners.remove(records)
+
+
+def _add_time(seconds, queries=0):
+    if has_app_context():
+        g.db_queries = g.get('db_queries', 0) + queries
+        g.db_time    = g.get('db_time', 0.0) + seconds
+
+
+def _log_slow(record):
+    if record.duration * 1000 < QUERY_LOG_CONFIG['slow_ms']:
+        return
+    where = request.endpoint if has_request_context() else '-'
+    print(
+        f"[SLOW QUERY] {record.duration * 1000:.1f}ms rows={record.rows} "
+        f"endpoint={where} {record.fingerprint}",
+        file=sys.stderr,
+    )
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._record = None
+        self._fetched = None
+
+    def _finish(self):
+        record, self._record = self._record, None
+        if record is None:
+            return
+        if self._fetched is not None:
+            record.rows = self._fetched
+        else:
+            rowcount = getattr(self._cursor, 'rowcount', -1)
+            record.rows = rowcount if rowcount is not None and rowcount >= 0 else None
+        _log_slow(record)
+
+    def execute(self, operation, *args, **kwargs):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record  = QueryRecord(operation, elapsed)
+            self._fetched = None
+            _add_time(elapsed, queries=1)
+            for records in _listeners:
+                records.append(self._record)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        rows = fetch(*args)
+        elapsed = time.perf_counter() - start
+        _add_time(elapsed)
+        if self._record is not None:
+            self._record.duration += elapsed
+            if isinstance(rows, list):
+                self._fetched = (self._fetched or 0) + len(rows)
+            elif rows is not None:
+                self._fetched = (self._fetched or 0) + 1
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented; ``raw`` is the pooled connection."""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.raw.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def _after_request(response):
+    if current_app.debug or QUERY_LOG_CONFIG['headers']:
+        response.headers['X-DB-Queries'] = str(g.get('db_queries', 0))
+        response.headers['X-DB-Time']    = f"{g.get('db_time', 0.0) * 1000:.3f}"
+    return response
+
+
+def init_app(app):
+    app.after_request(_after_request)
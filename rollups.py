@@ -0,0 +1,51 @@
+"""
+Maintain the payments_daily rollup table.
+
+    python rollups.py rebuild                   # recompute every pharmacy
+    python rollups.py rebuild --pharmacy-id 3   # recompute one pharmacy
+
+Use ``rebuild`` once after applying migration 006, and whenever the rollup
+may have drifted from payments_pharmacy (e.g. after payments were edited
+by hand). It runs in a single transaction, so readers see either the old
+totals or the new ones.
+"""
+import argparse
+import sys
+
+import mysql.connector
+
+from config import DB_CONFIG
+from blueprints.common import rollups
+
+
+def rebuild(conn, pharmacy_id=None, out=sys.stdout):
+    cursor = conn.cursor()
+    try:
+        written = rollups.rebuild(cursor, pharmacy_id)
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    scope = f"pharmacy {pharmacy_id}" if pharmacy_id is not None else "all pharmacies"
+    print(f"rebuilt payments_daily for {scope}: {written} day rows", file=out)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('command', choices=('rebuild',))
+    parser.add_argument('--pharmacy-id', type=int)
+    args = parser.parse_args(argv)
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        rebuild(conn, args.pharmacy_id)
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# tests/conftest.py
+
+from contextlib import contextmanager
+
+import pytest
+
+# user_id of the pharmacy seeded by the sqlite_db fixture
+SQLITE_PHARMACY_USER = 7
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_state():
+    """Give every test a fresh connection pool and empty caches so mocked data never leaks between tests."""
+    yield
+    import db
+    import health
+    import invalidation
+    import metrics
+    from blueprints.common import drugs, pharmacy
+    health.checker.reset()
+    invalidation.watcher.reset()
+    db.reset_pool()
+    metrics.collector.reset()
+    pharmacy.clear_cache()
+    drugs.clear_cache()
+
+
+def seed_sqlite(conn):
+    """Insert the rows the ``sqlite_db`` fixture promises and commit them."""
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO pharmacies (user_id, name) VALUES (%s, %s)", (SQLITE_PHARMACY_USER, 'Main St'))
+    cursor.execute("""
+        INSERT INTO patients (first_name, last_name) VALUES (%s, %s), (%s, %s)
+    """, ('Ann', 'Lee', 'Bob', 'Stone'))
+    cursor.execute("""
+        INSERT INTO patient_preferred_pharmacy (patient_id, pharmacy_id) VALUES (1, 1), (2, 1)
+    """)
+    cursor.execute("""
+        INSERT INTO weight_loss_drugs (name, description) VALUES (%s, %s), (%s, %s)
+    """, ('Metformin', 'Oral', 'Orlistat', 'Oral'))
+    cursor.execute("""
+        INSERT INTO pharmacy_inventory (pharmacy_id, drug_name, drug_id, stock_quantity)
+        VALUES (1, 'Metformin', 1, 5)
+    """)
+    conn.commit()
+    cursor.close()
+
+
+@pytest.fixture
+def sqlite_db(request):
+    """
+    A seeded in-memory SQLite database behind the shared pool: one pharmacy
+    (user_id SQLITE_PHARMACY_USER), two patients who prefer it, two drugs
+    and some stock. The fixture's own connection keeps the database alive
+    for the test.
+    """
+    import config
+    import db
+    import db_sqlite
+
+    cfg = dict(config.SQLITE_CONFIG, database=':memory:', name=request.node.name)
+    keeper = db_sqlite.connect(**cfg)
+    seed_sqlite(keeper)
+
+    db.set_pool(db.ConnectionPool(cfg, size=2, driver='sqlite'))
+    yield keeper
+    db.reset_pool()
+    keeper.close()
+
+
+@pytest.fixture
+def max_queries():
+    """
+    ``with max_queries(5): client.get(...)`` fails the test if the block runs
+    more than five statements, listing what ran. Guards endpoints against
+    N+1 regressions.
+    """
+    import querylog
+
+    @contextmanager
+    def check(limit):
+        with querylog.capture() as queries:
+            yield queries
+        ran = '\n'.join(f"  {q.fingerprint}" for q in queries)
+        assert len(queries) <= limit, f"expected at most {limit} queries, ran {len(queries)}:\n{ran}"
+
+    return check
+
+
+@pytest.fixture
+def asgi_request():
+    """
+    ``asgi_request('GET', '/api/hello')`` runs one request through asgi.app
+    on a fresh event loop and returns ``(status, headers, chunks)``.
+    ``body`` may be a list of chunks, sent as separate ASGI messages. With
+    ``disconnect_after=n`` the client goes away once ``n`` body chunks have
+    arrived; otherwise it stays connected until the response completes.
+    """
+    import asyncio
+    import asgi
+
+    def run(method, path, query='', headers=(), body=b'', disconnect_after=None):
+        parts = body if isinstance(body, list) else [body]
+        incoming = [{'type': 'http.request', 'body': part, 'more_body': i < len(parts) - 1}
+                    for i, part in enumerate(parts)]
+        sent = []
+
+        async def go():
+            gone = asyncio.Event()
+
+            async def receive():
+                if incoming:
+                    return incoming.pop(0)
+                await gone.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                chunks = [m for m in sent if m['type'] == 'http.response.body']
+                if disconnect_after is not None and len(chunks) >= disconnect_after:
+                    gone.set()
+
+            scope = {
+                'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+                'path': path, 'query_string': query.encode(), 'root_path': '',
+                'headers': [(k.lower().encode(), v.encode()) for k, v in headers],
+                'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+            }
+            await asgi.app(scope, receive, send)
+
+        asyncio.run(go())
+        start = sent[0]
+        chunks = [m['body'] for m in sent[1:] if m['body']]
+        return start['status'], dict((k.decode(), v.decode()) for k, v in start['headers']), chunks
+
+    return run
@@ -0,0 +1,110 @@
+# tests/test_datagen.py
+
+import os
+import sys
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import datagen
+import db_sqlite
+
+SMALL = datagen.plan(2_000)
+
+
+def _tables(batches):
+    tables = {}
+    for table, rows in batches:
+        tables.setdefault(table, []).extend(rows)
+    return tables
+
+
+def test_plan_scales_with_prescriptions():
+    assert datagen.plan(2_000) == {'pharmacies': 5, 'patients': 200, 'prescriptions': 2_000}
+    assert datagen.plan(100, pharmacies=3)['pharmacies'] == 3
+    assert datagen.plan(10)['pharmacies'] == 2
+
+
+def test_generate_is_deterministic():
+    first = _tables(datagen.generate(SMALL, seed_value=1))
+    assert _tables(datagen.generate(SMALL, seed_value=1)) == first
+    assert _tables(datagen.generate(SMALL, seed_value=2))['prescriptions'] != first['prescriptions']
+
+
+def test_generated_rows_are_consistent():
+    tables = _tables(datagen.generate(SMALL, seed_value=0, days=30))
+    for table, rows in tables.items():
+        assert all(len(row) == len(datagen.TABLES[table]) for row in rows), table
+
+    rx = tables['prescriptions']
+    assert [r[0] for r in rx] == list(range(1, SMALL['prescriptions'] + 1))
+    # ids follow creation time, as they would in production
+    assert [r[9] for r in rx] == sorted(r[9] for r in rx)
+    assert {r[8] for r in rx} == {'pending', 'filled', 'dispensed'}
+
+    # one payment and one log per dispensed prescription, billed alike
+    dispensed = {r[0]: r for r in rx if r[8] == 'dispensed'}
+    logs = tables['pharmacy_logs']
+    assert len(tables['payments_pharmacy']) == len(logs) == len(dispensed)
+    for pay, log in zip(tables['payments_pharmacy'], logs):
+        prescription = dispensed[log[1]]
+        assert pay[1:4] == log[2:5] == (prescription[3], prescription[2], pay[3])
+        assert pay[5] == log[5] >= prescription[9]
+
+    # the busiest pharmacy is pharmacy 1, and every pharmacy stocks every drug
+    per_pharmacy = {}
+    for r in rx:
+        per_pharmacy[r[3]] = per_pharmacy.get(r[3], 0) + 1
+    assert max(per_pharmacy, key=per_pharmacy.get) == 1
+    assert len(tables['pharmacy_inventory']) == SMALL['pharmacies'] * len(datagen.DRUGS)
+
+
+def test_referenced_users_and_doctors_exist():
+    tables = _tables(datagen.generate(SMALL, days=30))
+    users = {r[0]: r[3] for r in tables['users']}
+    doctors = {r[0]: r[1] for r in tables['doctors']}
+    assert {users[r[1]] for r in tables['pharmacies']} == {'pharmacy'}
+    assert {users[u] for u in doctors.values()} == {'doctor'}
+    assert {r[1] for r in tables['prescriptions']} <= set(doctors)
+    assert len({r[1] for r in tables['users']}) == len(users)
+    # db mode loads with foreign key checks on
+    assert not any('foreign_key_checks' in s for s in datagen.MYSQL_BULK_SESSION)
+
+
+def test_insert_loads_a_sqlite_database(request):
+    conn = db_sqlite.connect(**dict(config.SQLITE_CONFIG, name=request.node.name))
+    try:
+        written = datagen.insert(conn, datagen.generate(SMALL))
+        cur = conn.cursor()
+        for table, rows in written.items():
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            assert cur.fetchone()[0] == rows, table
+        cur.execute("SELECT COALESCE(SUM(amount_total), 0) FROM payments_daily")
+        rollup = cur.fetchone()[0]
+        cur.execute("SELECT COALESCE(SUM(amount), 0) FROM payments_pharmacy")
+        # SQLite sums DECIMAL as float
+        assert round(rollup, 2) == round(cur.fetchone()[0], 2) > 0
+    finally:
+        conn.close()
+
+
+def test_write_files_tsv_and_sql(tmp_path):
+    counts = datagen.plan(300)
+    written = datagen.write_files(datagen.generate(counts), str(tmp_path / 'tsv'), 'tsv')
+    lines = (tmp_path / 'tsv' / 'prescriptions.tsv').read_text().splitlines()
+    assert len(lines) == written['prescriptions'] == 300
+    assert len(lines[0].split('\t')) == len(datagen.TABLES['prescriptions'])
+    load = (tmp_path / 'tsv' / 'load.sql').read_text()
+    assert load.index('INTO TABLE pharmacies') < load.index('INTO TABLE prescriptions') < load.index('INTO TABLE pharmacy_logs')
+    assert 'LOAD DATA LOCAL INFILE' in load
+
+    datagen.write_files(datagen.generate(counts), str(tmp_path / 'sql'), 'sql')
+    script = (tmp_path / 'sql' / 'patients.sql').read_text()
+    assert script.startswith('INSERT INTO patients (patient_id, first_name,')
+    assert script.count('INSERT INTO') == 1
+    assert 'SOURCE ' in (tmp_path / 'sql' / 'load.sql').read_text()
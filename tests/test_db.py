@@ -0,0 +1,215 @@
+# tests/test_db.py
+
+import os
+import sys
+import pytest
+import mysql.connector
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# stub out config before importing app
+import config
+config.DB_CONFIG = {}
+
+from app import app, create_app
+import db
+from conftest import SQLITE_PHARMACY_USER
+
+# --- Helper classes ---
+class DummyConn:
+    def __init__(self):
+        self.in_transaction = False
+        self.closed = False
+    def rollback(self):
+        self.in_transaction = False
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def connects(monkeypatch):
+    made = []
+    def fake_connect(**kw):
+        made.append(DummyConn())
+        return made[-1]
+    monkeypatch.setattr(mysql.connector, 'connect', fake_connect)
+    return made
+
+def test_connection_reused_across_requests(connects):
+    pool = db.ConnectionPool({}, size=2, timeout=0.1)
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    assert second is first
+    assert len(connects) == 1
+    stats = pool.stats()
+    assert stats['checkouts'] == 2
+    assert stats['created'] == 1
+    assert stats['in_use'] == 1
+
+def test_release_rolls_back_open_transaction(connects):
+    pool = db.ConnectionPool({}, size=1, timeout=0.1)
+    conn = pool.acquire()
+    conn.in_transaction = True
+    pool.release(conn)
+    assert conn.in_transaction is False
+
+def test_pool_timeout_when_exhausted(connects):
+    pool = db.ConnectionPool({}, size=1, timeout=0.01)
+    pool.acquire()
+    with pytest.raises(db.PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+def test_get_db_is_one_connection_per_request(connects):
+    with app.test_request_context('/'):
+        assert db.get_db() is db.get_db()
+    assert len(connects) == 1
+    assert db.pool_stats()['in_use'] == 0
+
+def test_pool_stats_endpoint(connects):
+    resp = app.test_client().get('/api/db/pool')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    for key in ('pool_size', 'checkouts', 'wait_time_avg_ms', 'wait_time_max_ms'):
+        assert key in data
+
+# --- Read/write splitting ---
+
+@pytest.fixture
+def replica(sqlite_db, request):
+    """A lagging copy of sqlite_db (same rows, older stock) installed as the read replica."""
+    import db_sqlite
+
+    cfg = dict(config.SQLITE_CONFIG, database=':memory:', name=request.node.name + '-replica')
+    keeper = db_sqlite.connect(**cfg)
+    cursor = keeper.cursor()
+    cursor.execute("INSERT INTO pharmacies (user_id, name) VALUES (%s, %s)", (SQLITE_PHARMACY_USER, 'Main St'))
+    cursor.execute("""
+        INSERT INTO pharmacy_inventory (pharmacy_id, drug_name, drug_id, stock_quantity)
+        VALUES (1, 'Metformin', 1, 3)
+    """)
+    keeper.commit()
+    cursor.close()
+
+    pool = db.ConnectionPool(cfg, size=1, timeout=0.1, driver='sqlite')
+    db.set_pool(db.get_pool(), replica=pool)
+    yield pool
+    keeper.close()
+
+
+def _stock(client):
+    resp = client.get(f'/api/pharmacy/inventory?user_id={SQLITE_PHARMACY_USER}')
+    assert resp.status_code == 200
+    return resp.get_json()[0]['stock_quantity']
+
+
+def test_no_replica_configured_by_default():
+    assert db.get_replica_pool() is None
+
+
+def test_read_only_get_is_served_by_replica(replica):
+    client = app.test_client()
+    assert _stock(client) == 3
+    assert replica.stats()['checkouts'] == 1
+    assert db.pool_stats()['replica']['checkouts'] == 1
+
+
+def test_write_goes_to_primary_and_keeps_client_there(replica):
+    client = app.test_client()
+    resp = client.post('/api/pharmacy/inventory/add',
+                       json={'user_id': SQLITE_PHARMACY_USER, 'drug_name': 'Metformin', 'stock_quantity': 1})
+    assert resp.status_code in (200, 201)
+    assert config.DB_ROUTING_CONFIG['cookie'] in resp.headers['Set-Cookie']
+    assert replica.stats()['checkouts'] == 0
+
+    # inside the read-your-writes window the writer reads its own change...
+    assert _stock(client) == 6
+    assert replica.stats()['checkouts'] == 0
+    # ...while everyone else keeps reading from the replica
+    assert _stock(app.test_client()) == 3
+
+
+DASHBOARD = 'https://dashboard.example'
+
+
+@pytest.fixture
+def dashboard_app(monkeypatch):
+    """The app as deployed with CORS_ORIGINS set to the dashboard's origin."""
+    monkeypatch.setitem(config.CORS_CONFIG, 'origins', [DASHBOARD])
+    return create_app()
+
+
+def test_cross_origin_dashboard_keeps_its_cookie(replica, dashboard_app):
+    origin = DASHBOARD
+    client = dashboard_app.test_client()
+
+    preflight = client.options('/api/pharmacy/inventory/add', headers={
+        'Origin': origin, 'Access-Control-Request-Method': 'POST',
+        'Access-Control-Request-Headers': 'Content-Type',
+    })
+    assert preflight.headers['Access-Control-Allow-Origin'] == origin
+    assert preflight.headers['Access-Control-Allow-Credentials'] == 'true'
+
+    resp = client.post('/api/pharmacy/inventory/add', headers={'Origin': origin}, base_url='https://api.example',
+                       json={'user_id': SQLITE_PHARMACY_USER, 'drug_name': 'Metformin', 'stock_quantity': 1})
+    assert resp.headers['Access-Control-Allow-Origin'] == origin
+    assert resp.headers['Access-Control-Allow-Credentials'] == 'true'
+    # a cross-site fetch with credentials only carries SameSite=None cookies
+    cookie = resp.headers['Set-Cookie']
+    assert 'SameSite=None' in cookie and 'Secure' in cookie
+
+    resp = client.get(f'/api/pharmacy/inventory?user_id={SQLITE_PHARMACY_USER}',
+                      headers={'Origin': origin}, base_url='https://api.example')
+    assert resp.get_json()[0]['stock_quantity'] == 6
+    assert replica.stats()['checkouts'] == 0
+
+
+def test_unlisted_origin_gets_no_cors_grant(replica, dashboard_app):
+    resp = dashboard_app.test_client().get('/api/hello', headers={'Origin': 'https://evil.example'})
+    assert 'Access-Control-Allow-Origin' not in resp.headers
+
+
+def test_plain_http_gets_a_lax_cookie(replica):
+    # a Secure cookie would be dropped over http and never come back
+    resp = app.test_client().post('/api/pharmacy/inventory/add',
+                                  json={'user_id': SQLITE_PHARMACY_USER, 'drug_name': 'Metformin', 'stock_quantity': 1})
+    cookie = resp.headers['Set-Cookie']
+    assert 'SameSite=Lax' in cookie and 'Secure' not in cookie
+
+    # TLS terminated at the ingress
+    resp = app.test_client().post('/api/pharmacy/inventory/add', headers={'X-Forwarded-Proto': 'https'},
+                                  json={'user_id': SQLITE_PHARMACY_USER, 'drug_name': 'Metformin', 'stock_quantity': 1})
+    cookie = resp.headers['Set-Cookie']
+    assert 'SameSite=None' in cookie and 'Secure' in cookie
+
+
+def test_any_origin_without_credentials_by_default():
+    resp = app.test_client().get('/api/hello', headers={'Origin': 'https://evil.example'})
+    assert resp.headers['Access-Control-Allow-Origin'] == 'https://evil.example'
+    assert 'Access-Control-Allow-Credentials' not in resp.headers
+
+
+def test_expired_or_bad_cookie_reads_replica(replica):
+    client = app.test_client()
+    cookie = config.DB_ROUTING_CONFIG['cookie']
+    client.set_cookie(cookie, '1')
+    assert _stock(client) == 3
+    client.set_cookie(cookie, 'soon')
+    assert _stock(client) == 3
+
+
+def test_failed_write_does_not_pin_client(replica):
+    resp = app.test_client().post('/api/pharmacy/inventory/add',
+                                  json={'user_id': 999, 'drug_name': 'Metformin', 'stock_quantity': 1})
+    assert resp.status_code == 404
+    assert 'Set-Cookie' not in resp.headers
+
+
+def test_unavailable_replica_falls_back_to_primary(replica):
+    held = replica.acquire()
+    try:
+        assert _stock(app.test_client()) == 5
+    finally:
+        replica.release(held)
+    assert replica.stats()['timeouts'] == 1
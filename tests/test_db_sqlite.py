@@ -0,0 +1,188 @@
+# tests/test_db_sqlite.py
+
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import db
+import db_sqlite
+from conftest import SQLITE_PHARMACY_USER as PHARMACY_USER
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def _request(client, patient_id, drug_id=1):
+    resp = client.post('/api/prescriptions/request', json={
+        'doctor_id': 3, 'patient_id': patient_id, 'drug_id': drug_id,
+        'dosage': '500mg', 'instructions': 'Take twice daily',
+    })
+    assert resp.status_code == 201
+    return resp.get_json()['prescription_id']
+
+
+def test_translate_rewrites_mysql_dialect():
+    sql, converters = db_sqlite.translate("""
+        SELECT DATE(d) AS day, COALESCE(SUM(amount), 0) AS total FROM t
+         WHERE MATCH(a, b) AGAINST (%s IN NATURAL LANGUAGE MODE) AND c LIKE %s
+         FOR UPDATE
+    """)
+    assert '%s' not in sql and 'FOR UPDATE' not in sql
+    assert "MATCH_AGAINST(?, a, b)" in sql
+    assert "LIKE ? ESCAPE '\\'" in sql
+    assert set(converters) == {'day', 'total'}
+
+    sql, _ = db_sqlite.translate("SELECT 1 FROM t WHERE MATCH(a) AGAINST (%s IN BOOLEAN MODE)")
+    assert "MATCH_BOOLEAN(?, a)" in sql
+
+    sql, _ = db_sqlite.translate(
+        "INSERT INTO t (k, v) VALUES (%s, %s) ON DUPLICATE KEY UPDATE v = v + VALUES(v)"
+    )
+    assert sql.endswith("ON CONFLICT DO UPDATE SET v = v + excluded.v")
+
+
+def test_unknown_driver_rejected():
+    with pytest.raises(ValueError):
+        db.ConnectionPool({}, driver='oracle')
+
+
+def test_prescription_lifecycle_end_to_end(client, sqlite_db):
+    first = _request(client, 1)
+    second = _request(client, 2)
+
+    queue = client.get(f'/api/pharmacy/queue?user_id={PHARMACY_USER}').get_json()
+    assert [r['prescription_id'] for r in queue] == [first, second]
+    assert queue[0]['patient_name'] == 'Ann Lee'
+
+    resp = client.post(f'/api/pharmacy/prescriptions/fulfill?user_id={PHARMACY_USER}',
+                       json={'prescription_ids': [first, second]})
+    assert resp.status_code == 200
+
+    resp = client.patch('/api/prices/bulk-update',
+                        json={'user_id': PHARMACY_USER, 'prices': [{'drug_id': 1, 'price': 12.5}]})
+    assert resp.status_code == 200
+
+    resp = client.post(f'/api/pharmacy/prescriptions/dispense?user_id={PHARMACY_USER}',
+                       json={'prescription_ids': [first, second]})
+    assert resp.status_code == 200
+
+    inventory = client.get(f'/api/pharmacy/inventory?user_id={PHARMACY_USER}').get_json()
+    assert inventory[0]['stock_quantity'] == 3
+
+    payments = client.get(f'/api/pharmacy/payments?user_id={PHARMACY_USER}&status=unfulfilled').get_json()
+    assert sorted(p['amount'] for p in payments) == ['12.50', '12.50']
+
+    today = date.today().isoformat()
+    revenue = client.get(f'/api/pharmacy/payments/revenue?user_id={PHARMACY_USER}').get_json()
+    assert revenue['count'] == 2 and Decimal(revenue['total']) == Decimal('25.00')
+    summary = client.get(f'/api/pharmacy/payments/summary?user_id={PHARMACY_USER}').get_json()
+    assert summary['by_status']['unfulfilled'] == {'count': 2, 'total': '25.00'}
+    assert len(summary['by_day']) == 1 and summary['by_day'][0]['day'] <= today
+
+    cursor = sqlite_db.cursor(dictionary=True)
+    cursor.execute("SELECT kind, status FROM pharmacy_events ORDER BY event_id")
+    assert [r['status'] for r in cursor.fetchall()] == ['pending'] * 2 + ['filled'] * 2 + ['dispensed'] * 2
+    cursor.close()
+
+
+def test_inventory_upsert_and_etag(client, sqlite_db):
+    url = f'/api/pharmacy/inventory?user_id={PHARMACY_USER}'
+    first = client.get(url)
+    etag = first.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    resp = client.post('/api/pharmacy/inventory/add', json={
+        'user_id': PHARMACY_USER, 'drug_name': ' metformin ', 'stock_quantity': 2,
+    })
+    assert resp.status_code in (200, 201)
+
+    second = client.get(url, headers={'If-None-Match': etag})
+    assert second.status_code == 200
+    assert [(r['drug_name'], r['stock_quantity']) for r in second.get_json()] == [('Metformin', 7)]
+
+
+def test_failed_statement_surfaces_as_driver_error():
+    conn = db_sqlite.connect(**dict(config.SQLITE_CONFIG, name='test_failed_statement_surfaces_as_driver_error'))
+    cursor = conn.cursor()
+    with pytest.raises(db_sqlite.DatabaseError):
+        cursor.execute("SELECT missing FROM pharmacies")
+    conn.close()
+
+
+def test_types_are_scoped_to_the_connection(sqlite_db):
+    import sqlite3
+    from datetime import datetime
+
+    # nothing leaks into sqlite3's process-wide registries
+    assert 'DECIMAL' not in sqlite3.converters
+    assert db_sqlite._to_datetime not in sqlite3.converters.values()
+    assert Decimal not in {t for t, _ in sqlite3.adapters}
+
+    cursor = sqlite_db.cursor(dictionary=True)
+    cursor.execute("INSERT INTO payments_pharmacy (pharmacy_id, patient_id, amount, payment_date) VALUES (%s, %s, %s, %s)",
+                   (1, 1, Decimal('12.5'), datetime(2025, 3, 4, 5, 6, 7)))
+    cursor.execute("SELECT amount, payment_date AS paid_at, DATE(payment_date) AS day FROM payments_pharmacy")
+    row = cursor.fetchone()
+    assert row == {'amount': Decimal('12.50'), 'paid_at': datetime(2025, 3, 4, 5, 6, 7), 'day': date(2025, 3, 4)}
+    cursor.close()
+
+
+def test_log_search_finds_medication_or_patient(client, sqlite_db):
+    cursor = sqlite_db.cursor()
+    cursor.execute("""
+        INSERT INTO prescriptions (patient_id, pharmacy_id, drug_id, medication_name, status)
+        VALUES (1, 1, 1, 'Metformin', 'dispensed'), (2, 1, 2, 'Orlistat', 'dispensed')
+    """)
+    cursor.execute("""
+        INSERT INTO pharmacy_logs (prescription_id, pharmacy_id, patient_id, amount_billed)
+        VALUES (1, 1, 1, 10), (2, 1, 2, 20)
+    """)
+    sqlite_db.commit()
+    cursor.close()
+
+    def search(term):
+        return sorted(r['log_id'] for r in client.get(f'/api/pharmacy/logs?search={term}&limit=10').get_json()['items'])
+
+    # terms whose ngrams occur in one name only
+    assert search('metf') == [1]
+    assert search('bob') == [2]
+    assert search('lee') == [1]
+    assert search('o') == [2]      # prefix: Orlistat
+    assert search('zzzz') == []
+    # sharing an ngram is not a match: "metformin" and "Orlistat" share "or",
+    # "lena" and "Lee" share "le"
+    assert search('metformin') == [1]
+    assert search('lena') == []
+    # every word has to match, in any of the name columns
+    assert search('ann lee') == [1]
+    assert search('bob lee') == []
+
+
+def test_prescription_search_excludes_other_drugs(client, sqlite_db):
+    cursor = sqlite_db.cursor()
+    cursor.execute("""
+        INSERT INTO prescriptions (patient_id, pharmacy_id, drug_id, medication_name)
+        VALUES (1, 1, 1, 'Metformin'), (2, 1, 2, 'Orlistat'), (2, 1, 1, 'Metformin ER')
+    """)
+    sqlite_db.commit()
+    cursor.close()
+
+    page = client.get('/api/pharmacy/prescriptions?search=metformin&limit=10').get_json()['items']
+    assert sorted(r['medication_name'] for r in page) == ['Metformin', 'Metformin ER']
+    ranked = client.get('/api/pharmacy/prescriptions?search=metformin').get_json()
+    assert [r['medication_name'] for r in ranked] == ['Metformin', 'Metformin ER']
@@ -5,12 +5,12 @@ import sys
 # ensure project root is on PYTHONPATH
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import types
 import pytest
 import mysql.connector
 
 # stub out config before importing app
-sys.modules['config'] = types.SimpleNamespace(DB_CONFIG={})
+import config
+config.DB_CONFIG = {}
 
 from app import app
 import blueprints.dispensePrescription.dispense as disp_mod
@@ -104,7 +104,7 @@ class SuccessConn:
     def commit(self): pass
     def close(self): pass
 class SuccessCursor:
-    def __init__(self): self.call = 0; self.lastrowid = 999
+    def __init__(self): self.call = 0; self.lastrowid = 999; self.rowcount = 1
     def execute(self, query, params=None): self.call += 1
     def fetchone(self):
         if self.call == 1:
@@ -125,6 +125,47 @@ def test_success(monkeypatch, client):
     assert data['amount'] == 42.0
     assert data['payment_id'] == 999
 
+def test_success_updates_rollup_before_commit(monkeypatch, client):
+    events = []
+    class RecordingCursor(SuccessCursor):
+        def execute(self, query, params=None):
+            super().execute(query, params)
+            words = query.split()
+            events.append(words[2] if words[0] == 'INSERT' else words[0])
+            if words[2] == 'payments_daily':
+                assert params == (999, 999)
+    class RecordingConn(SuccessConn):
+        def cursor(self, dictionary=True): return RecordingCursor()
+        def commit(self): events.append('COMMIT')
+    monkeypatch.setattr(disp_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: RecordingConn())
+    resp = client.post('/api/pharmacy/prescriptions/5/dispense?user_id=1')
+    assert resp.status_code == 200
+    assert events[-4:] == ['payments_pharmacy', 'payments_daily', 'pharmacy_events', 'COMMIT']
+
+# Dispensed concurrently: the status guard on the UPDATE matches no row
+def test_dispensed_concurrently(monkeypatch, client):
+    queries = []
+    class RaceCursor(SuccessCursor):
+        def execute(self, query, params=None):
+            super().execute(query, params)
+            queries.append(query)
+            # the SELECT saw 'filled', another request got there first
+            self.rowcount = 0
+    class RaceConn(SuccessConn):
+        def cursor(self, dictionary=True): return RaceCursor()
+        def commit(self): raise AssertionError('must not commit')
+        def rollback(self): queries.append('ROLLBACK')
+    monkeypatch.setattr(disp_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: RaceConn())
+    resp = client.post('/api/pharmacy/prescriptions/5/dispense?user_id=1')
+    assert resp.status_code == 409
+    assert resp.get_json()['error'] == 'Prescription already dispensed'
+    assert "AND status          = 'filled'" in queries[-2]
+    # no payment is created
+    assert queries[-1] == 'ROLLBACK'
+    assert not any('payments_pharmacy' in q for q in queries)
+
 # 7) Get filled prescriptions -> 200
 class FilledConn:
     def cursor(self, dictionary=True): return FilledCursor()
@@ -153,3 +194,79 @@ def test_get_filled(monkeypatch, client):
         'dosage':'5mg',
         'requested_at':'2025-04-29T10:00:00'
     }]
+
+# 8) Bulk dispense
+class BulkConn:
+    def __init__(self, rows, payment_ids=(500, 501)):
+        self.rows = rows
+        self.payment_ids = payment_ids
+        self.calls = []
+        self.lastrowid = payment_ids[0]
+        self.committed = False
+    def cursor(self, dictionary=True): return self
+    def execute(self, query, params=None): self.calls.append((query, params))
+    def fetchall(self):
+        if 'SELECT payment_id' in self.calls[-1][0]:
+            return [{'payment_id': pid} for pid in self.payment_ids]
+        return self.rows
+    def fetchone(self): return None
+    def commit(self): self.committed = True
+    def rollback(self): pass
+    def close(self): pass
+
+def test_bulk_dispense(monkeypatch, client):
+    rows = [
+        {'prescription_id': 1, 'patient_id': 11, 'status': 'filled',  'price': 10.0},
+        {'prescription_id': 2, 'patient_id': 12, 'status': 'pending', 'price': 10.0},
+        {'prescription_id': 3, 'patient_id': 13, 'status': 'filled',  'price': None},
+        {'prescription_id': 4, 'patient_id': 14, 'status': 'filled',  'price': 25.0},
+    ]
+    conn = BulkConn(rows)
+    monkeypatch.setattr(disp_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    resp = client.post('/api/pharmacy/prescriptions/dispense?user_id=1',
+                       json={'prescription_ids': [1, 2, 3, 4, 5]})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['payment_ids'] == [500, 501]
+    assert data['dispensed'] == 2 and data['failed'] == 3
+    assert data['results']['1'] == {'payment_id': 500, 'amount': 10.0}
+    assert data['results']['4'] == {'payment_id': 501, 'amount': 25.0}
+    assert 'not ready' in data['results']['2']['error']
+    assert 'Price not set' in data['results']['3']['error']
+    assert 'not found' in data['results']['5']['error']
+
+    # price lookup, one multi-row insert, the id read-back, one rollup
+    # upsert, one status update, one change-log insert
+    assert len(conn.calls) == 6
+    insert_query, insert_params = conn.calls[1]
+    assert insert_query.count('(%s, %s, %s, FALSE, NOW())') == 2
+    assert insert_params == (1, 11, 10.0, 1, 14, 25.0)
+    assert conn.calls[2][1] == (1, 500, 2)
+    rollup_query, rollup_params = conn.calls[3]
+    assert 'INSERT INTO payments_daily' in rollup_query
+    assert rollup_params == (500, 501)
+    assert conn.calls[4][1] == (1, 1, 4)
+    assert conn.calls[5][1] == (1, 1, 'status', 'dispensed', 1, 4, 'status', 'dispensed')
+    assert conn.committed
+
+def test_bulk_dispense_reads_back_spaced_payment_ids(monkeypatch, client):
+    # auto_increment_increment = 2: the second payment is 502, not 501
+    rows = [
+        {'prescription_id': 1, 'patient_id': 11, 'status': 'filled', 'price': 10.0},
+        {'prescription_id': 2, 'patient_id': 12, 'status': 'filled', 'price': 25.0},
+    ]
+    conn = BulkConn(rows, payment_ids=(500, 502))
+    monkeypatch.setattr(disp_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    resp = client.post('/api/pharmacy/prescriptions/dispense?user_id=1',
+                       json={'prescription_ids': [1, 2]})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['payment_ids'] == [500, 502]
+    assert data['results']['2'] == {'payment_id': 502, 'amount': 25.0}
+    assert conn.calls[3][1] == (500, 502)
+
+def test_bulk_dispense_bad_body(client):
+    resp = client.post('/api/pharmacy/prescriptions/dispense?user_id=1', json={})
+    assert resp.status_code == 400
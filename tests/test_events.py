@@ -0,0 +1,225 @@
+# tests/test_events.py
+
+import os
+import sys
+import json
+import pytest
+import mysql.connector
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# stub out config before importing app
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import db
+import blueprints.pharmacyEvents.events as events_mod
+from blueprints.common import events
+
+# --- A change log the fake connection reads from ---
+class LogCursor:
+    def __init__(self, log):
+        self._log = log
+        self._rows = []
+    def execute(self, query, params=None):
+        if 'MAX(event_id)' in query:
+            pharm_id, = params
+            ids = [e['event_id'] for e in self._log if e['pharmacy_id'] == pharm_id]
+            self._rows = [{'last': max(ids, default=0)}]
+        elif 'FROM pharmacy_events' in query:
+            pharm_id, last_id, limit = params
+            self._rows = [e for e in self._log
+                          if e['pharmacy_id'] == pharm_id and e['event_id'] > last_id][:limit]
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+    def fetchall(self):
+        return self._rows
+    def close(self):
+        pass
+
+class LogConn:
+    in_transaction = False
+    def __init__(self, log):
+        self._log = log
+    def cursor(self, dictionary=True):
+        return LogCursor(self._log)
+    def rollback(self): pass
+    def close(self): pass
+
+def _event(event_id, prescription_id, kind='created', status='pending', pharmacy_id=5):
+    return {'event_id': event_id, 'pharmacy_id': pharmacy_id, 'prescription_id': prescription_id,
+            'kind': kind, 'status': status, 'created_at': '2025-04-28 10:00:00'}
+
+def _parse(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n') if not line.startswith(':'))
+    if 'data' in fields:
+        fields['data'] = json.loads(fields['data'])
+    return fields
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+@pytest.fixture
+def open_stream(client):
+    """Open an event stream; returns (response, iterator of decoded chunks). Closed after the test."""
+    opened = []
+    def _open(url, **kwargs):
+        resp = client.get(url, **kwargs)
+        opened.append(resp)
+        return resp, (chunk.decode() for chunk in resp.response)
+    yield _open
+    for resp in opened:
+        resp.close()
+
+@pytest.fixture
+def log(monkeypatch):
+    entries = [_event(1, 10), _event(2, 11, pharmacy_id=6), _event(3, 10, 'status', 'filled')]
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: LogConn(entries))
+    monkeypatch.setattr(events_mod, '_get_pharmacy_id_for_user', lambda u, c: 5)
+    monkeypatch.setitem(config.SSE_CONFIG, 'idle_check', 0.01)
+    return entries
+
+# --- Tests for GET /api/pharmacy/events ---
+
+def test_events_requires_user(client):
+    assert client.get('/api/pharmacy/events').status_code == 400
+
+def test_events_bad_last_event_id(client, log):
+    resp = client.get('/api/pharmacy/events?user_id=1', headers={'Last-Event-ID': 'abc'})
+    assert resp.status_code == 400
+
+def test_events_no_pharmacy(monkeypatch, client, log):
+    monkeypatch.setattr(events_mod, '_get_pharmacy_id_for_user', lambda u, c: None)
+    assert client.get('/api/pharmacy/events?user_id=1').status_code == 404
+
+def test_events_replay_after_last_event_id(open_stream, log):
+    resp, chunks = open_stream('/api/pharmacy/events?user_id=1', headers={'Last-Event-ID': '1'})
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/event-stream'
+    assert next(chunks).startswith('retry:')
+    event = _parse(next(chunks))
+    # pharmacy 6's event 2 is not ours
+    assert event['id'] == '3'
+    assert event['event'] == 'prescription.status'
+    assert event['data']['prescription_id'] == 10 and event['data']['status'] == 'filled'
+    assert next(chunks).startswith(': keepalive')
+
+def test_events_live_push_without_holding_a_connection(open_stream, log):
+    resp, chunks = open_stream('/api/pharmacy/events?user_id=1')
+    next(chunks)
+    # no last id: starts at the end of the log, nothing replayed
+    assert next(chunks).startswith(': keepalive')
+    assert db.pool_stats()['in_use'] == 0
+    assert events.stats() == {'pharmacies': 1, 'subscribers': 1}
+
+    log.append(_event(4, 12))
+    events.notify(5)
+    event = _parse(next(chunks))
+    assert event['id'] == '4' and event['event'] == 'prescription.created'
+    resp.close()
+    assert events.stats() == {'pharmacies': 0, 'subscribers': 0}
+
+def test_events_replay_is_paged(monkeypatch, open_stream, log):
+    monkeypatch.setitem(config.SSE_CONFIG, 'replay_limit', 1)
+    log.extend([_event(4, 12), _event(5, 13)])
+    resp, chunks = open_stream('/api/pharmacy/events?user_id=1&last_event_id=0')
+    next(chunks)
+    assert [_parse(next(chunks))['id'] for _ in range(4)] == ['1', '3', '4', '5']
+
+def test_events_first_chunk_carries_resume_id(open_stream, log):
+    resp, chunks = open_stream('/api/pharmacy/events?user_id=1')
+    first = next(chunks)
+    assert first.startswith('retry:')
+    # latest event of pharmacy 5, so a reconnect before any event resumes there
+    assert 'id: 3\n' in first
+
+def test_events_capped_per_worker(monkeypatch, open_stream, client, log):
+    monkeypatch.setitem(config.SSE_CONFIG, 'max_streams', 1)
+    resp, chunks = open_stream('/api/pharmacy/events?user_id=1')
+    next(chunks)
+    refused = client.get('/api/pharmacy/events?user_id=1')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '3'
+    resp.close()
+    # the slot is free again once the first stream closes
+    again, chunks = open_stream('/api/pharmacy/events?user_id=1')
+    assert again.status_code == 200
+
+def test_events_unstarted_stream_releases_its_slot(monkeypatch, client, log):
+    monkeypatch.setitem(config.SSE_CONFIG, 'max_streams', 1)
+    client.get('/api/pharmacy/events?user_id=1').close()
+    assert events.stats()['subscribers'] == 0
+
+def test_events_stream_ends_after_max_duration(monkeypatch, open_stream, log):
+    monkeypatch.setitem(config.SSE_CONFIG, 'max_duration', 0.05)
+    resp, chunks = open_stream('/api/pharmacy/events?user_id=1')
+    rest = list(chunks)
+    assert rest[0].startswith('retry:')
+    assert all(c.startswith(': keepalive') for c in rest[1:])
+    assert events.stats()['subscribers'] == 0
+
+# --- change-log writes ---
+
+def test_record_is_one_multi_row_insert():
+    calls = []
+    class Cursor:
+        def execute(self, query, params=None): calls.append((query, params))
+    events.record(Cursor(), 5, [1, 2], events.STATUS, 'filled')
+    events.record(Cursor(), 5, [], events.STATUS, 'filled')
+    assert len(calls) == 1
+    assert calls[0][1] == (5, 1, 'status', 'filled', 5, 2, 'status', 'filled')
+
+# --- under the ASGI server ---
+
+def test_asgi_stream_is_served_from_the_event_loop(asgi_request, log):
+    status, headers, chunks = asgi_request('GET', '/api/pharmacy/events', query='user_id=1',
+                                           headers=[('Last-Event-ID', '1')], disconnect_after=3)
+    assert status == 200 and headers['content-type'].startswith('text/event-stream')
+    assert 'content-length' not in headers
+    chunks = [c.decode() for c in chunks]
+    assert chunks[0].startswith('retry:')
+    assert _parse(chunks[1])['id'] == '3'
+    assert chunks[2].startswith(': keepalive')
+    # the client went away: the stream unsubscribed and returned its connection
+    assert events.stats()['subscribers'] == 0
+    assert db.pool_stats()['in_use'] == 0
+
+def test_asgi_stream_wakes_on_notify(monkeypatch, log):
+    import asyncio
+    import asgi
+
+    # only a notify can deliver the new event before the test times out
+    monkeypatch.setitem(config.SSE_CONFIG, 'idle_check', 30)
+
+    async def go():
+        sent, gone = [], asyncio.Event()
+        incoming = [{'type': 'http.request', 'body': b''}]
+        async def receive():
+            if incoming:
+                return incoming.pop(0)
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 3:
+                # start, retry, keepalive: now something happens
+                log.append(_event(4, 12))
+                events.notify(5)
+            if len(sent) == 4:
+                gone.set()
+        scope = {'type': 'http', 'method': 'GET', 'path': '/api/pharmacy/events',
+                 'query_string': b'user_id=1', 'headers': []}
+        await asyncio.wait_for(asgi.app(scope, receive, send), 5)
+        return sent
+
+    sent = asyncio.run(go())
+    assert _parse(sent[3]['body'].decode())['id'] == '4'
+
+def test_asgi_streams_capped_separately(monkeypatch, asgi_request, log):
+    monkeypatch.setitem(config.SSE_CONFIG, 'max_async_streams', 0)
+    status, headers, chunks = asgi_request('GET', '/api/pharmacy/events', query='user_id=1')
+    assert status == 503 and headers['retry-after'] == '3'
+    assert events.stats()['subscribers'] == 0
@@ -0,0 +1,149 @@
+# tests/test_health.py
+
+import os
+import sys
+import time
+
+import pytest
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import db
+import health
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+class PingConn:
+    def __init__(self, healthy):
+        self.healthy = healthy
+        self.in_transaction = False
+    def ping(self, reconnect=False):
+        if not self.healthy['ok']:
+            raise RuntimeError("Lost connection to MySQL server")
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Flip ``state['ok']`` to take the fake database up and down."""
+    state = {'ok': True}
+    monkeypatch.setattr(db, 'DRIVERS', dict(db.DRIVERS, mysql=lambda cfg: PingConn(state)))
+    return state
+
+
+def test_live_never_touches_the_database(client, monkeypatch):
+    monkeypatch.setattr(health.checker, 'check', lambda: pytest.fail("live probe pinged the database"))
+    resp = client.get('/api/health/live')
+    assert resp.status_code == 200
+    assert resp.get_json() == {'status': 'alive'}
+
+
+def test_ready_reflects_database(client, database):
+    resp = client.get('/api/health/ready')
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['status'] == 'ready' and body['error'] is None
+
+
+def test_ready_fails_when_database_unreachable(client):
+    # the default mysql stub refuses every connection
+    resp = client.get('/api/health/ready')
+    assert resp.status_code == 503
+    assert 'not available' in resp.get_json()['error']
+
+
+def test_probe_serves_cached_status(client, database, monkeypatch):
+    client.get('/api/health/ready')
+    calls = []
+    monkeypatch.setattr(health.checker, 'check', lambda: calls.append(1))
+    for _ in range(5):
+        assert client.get('/api/health/ready').status_code == 200
+    assert calls == []
+
+
+def test_one_failed_ping_does_not_drop_readiness(database):
+    checker = health.HealthChecker(interval=60, failure_threshold=2)
+    assert checker.check()['ready']
+    database['ok'] = False
+    assert checker.check()['ready']
+    assert not checker.check()['ready']
+    database['ok'] = True
+    assert checker.check()['ready']
+
+
+def test_stale_status_is_not_ready(database):
+    checker = health.HealthChecker(interval=60, stale_after=0.01)
+    checker.check()
+    time.sleep(0.02)
+    status = checker.status()
+    assert not status['ready'] and 'old' in status['error']
+
+
+def test_background_checker_refreshes_status(database):
+    checker = health.HealthChecker(interval=0.01, failure_threshold=1)
+    checker.start()
+    try:
+        assert checker.running
+        deadline = time.time() + 2
+        while not checker.status()['ready'] and time.time() < deadline:
+            time.sleep(0.01)
+        assert checker.status()['ready']
+
+        database['ok'] = False
+        while checker.status()['ready'] and time.time() < deadline:
+            time.sleep(0.01)
+        assert not checker.status()['ready']
+    finally:
+        checker.stop()
+    assert not checker.running
+
+
+def test_ping_uses_its_own_connection(database):
+    checker = health.HealthChecker(interval=60)
+    checker.check()
+    checker.check()
+    # the request pool is never borrowed from
+    assert db.get_pool().stats()['checkouts'] == 0
+    checker.reset()
+
+
+def test_exhausted_pool_is_not_a_database_outage(database):
+    pool = db.ConnectionPool({}, size=1, timeout=0.01)
+    db.set_pool(pool)
+    held = pool.acquire()
+    try:
+        with pytest.raises(db.PoolTimeout):
+            pool.acquire()
+        checker = health.HealthChecker(interval=60, failure_threshold=1)
+        status = checker.check()
+        assert status['ready'] and status['error'] is None
+        assert status['pool'] == {'size': 1, 'in_use': 1, 'timeouts': 1}
+    finally:
+        pool.release(held)
+    checker.reset()
+
+
+def test_lost_ping_connection_is_reopened(database, monkeypatch):
+    opened = []
+    monkeypatch.setattr(db, 'DRIVERS', dict(db.DRIVERS, mysql=lambda cfg: opened.append(1) or PingConn(database)))
+    checker = health.HealthChecker(interval=60, failure_threshold=1)
+    checker.check()
+    database['ok'] = False
+    assert not checker.check()['ready']
+    database['ok'] = True
+    assert checker.check()['ready']
+    assert len(opened) == 2
+    checker.reset()
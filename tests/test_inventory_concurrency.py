@@ -0,0 +1,129 @@
+# tests/test_inventory_concurrency.py
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# stub out config before importing app
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import db
+import db_sqlite
+from blueprints.common import drugs
+from conftest import SQLITE_PHARMACY_USER, seed_sqlite
+
+THREADS = 25
+
+
+# The requests below race through the real handlers on real SQLite
+# connections, one per thread, so the guarded UPDATEs are what keep the
+# stock and the statuses right; an in-memory shared-cache database would
+# fail concurrent writers with "table is locked" instead of waiting.
+@pytest.fixture
+def shared_db(tmp_path):
+    cfg = dict(config.SQLITE_CONFIG, database=str(tmp_path / 'pharmacy.db'))
+    conn = db_sqlite.connect(**cfg)
+    seed_sqlite(conn)
+    db.set_pool(db.ConnectionPool(cfg, size=THREADS, driver='sqlite'))
+    yield conn
+    db.reset_pool()
+    conn.close()
+
+
+def _query(conn, sql, params=()):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.commit()
+    return rows
+
+
+def _set_stock(conn, qty):
+    _query(conn, "UPDATE pharmacy_inventory SET stock_quantity = %s WHERE pharmacy_id = 1 AND drug_id = 1", (qty,))
+
+
+def _stock(conn):
+    return _query(conn, "SELECT stock_quantity FROM pharmacy_inventory WHERE pharmacy_id = 1 AND drug_id = 1")[0]['stock_quantity']
+
+
+def _add_prescriptions(conn, n):
+    for _ in range(n):
+        _query(conn, """
+            INSERT INTO prescriptions (doctor_id, patient_id, pharmacy_id, drug_id, medication_name, dosage)
+            VALUES (3, 1, 1, 1, 'Metformin', '500mg')
+        """)
+
+
+def _fire(n, fn):
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(lambda i: fn(i), range(n)))
+
+
+def _fulfill(prescription_id):
+    return app.test_client().post(
+        f'/api/pharmacy/prescriptions/{prescription_id}/fulfill?user_id={SQLITE_PHARMACY_USER}'
+    )
+
+
+def test_parallel_fulfills_never_oversell(shared_db):
+    _set_stock(shared_db, 7)
+    _add_prescriptions(shared_db, THREADS)
+
+    responses = _fire(THREADS, lambda i: _fulfill(i + 1))
+    codes = sorted(r.status_code for r in responses)
+    assert codes.count(200) == 7
+    assert codes.count(400) == THREADS - 7
+    assert all(r.get_json()['error'] == 'Out of stock' for r in responses if r.status_code == 400)
+    assert _stock(shared_db) == 0
+    # a prescription whose stock ran out is left pending, not filled
+    statuses = _query(shared_db, "SELECT status, COUNT(*) AS n FROM prescriptions GROUP BY status")
+    assert {r['status']: r['n'] for r in statuses} == {'filled': 7, 'pending': THREADS - 7}
+    # the drug catalog is loaded once, not once per request thread
+    assert drugs.cache_stats()['loads'] == 1
+
+
+def test_parallel_fulfills_of_one_prescription_fill_it_once(shared_db):
+    _add_prescriptions(shared_db, 1)
+
+    responses = _fire(THREADS, lambda i: _fulfill(1))
+    codes = sorted(r.status_code for r in responses)
+    assert codes.count(200) == 1
+    assert codes.count(409) == THREADS - 1
+    assert all(r.get_json()['error'] == 'Prescription is not pending' for r in responses if r.status_code == 409)
+    # one unit for one fill, however many requests raced
+    assert _stock(shared_db) == 4
+
+
+def test_parallel_dispenses_create_one_payment(shared_db):
+    _add_prescriptions(shared_db, 1)
+    _query(shared_db, "UPDATE prescriptions SET status = 'filled' WHERE prescription_id = 1")
+    _query(shared_db, "INSERT INTO pharmacy_drug_prices (pharmacy_id, drug_id, price) VALUES (1, 1, 12.50)")
+
+    responses = _fire(THREADS, lambda i: app.test_client().post(
+        f'/api/pharmacy/prescriptions/1/dispense?user_id={SQLITE_PHARMACY_USER}'))
+    codes = sorted(r.status_code for r in responses)
+    assert codes.count(200) == 1
+    # 400 for a request that read the status after the winner committed,
+    # 409 for one that read 'filled' and lost the UPDATE
+    assert codes.count(400) + codes.count(409) == THREADS - 1
+    assert _query(shared_db, "SELECT COUNT(*) AS n FROM payments_pharmacy")[0]['n'] == 1
+
+
+def test_parallel_restocks_add_up(shared_db):
+    def restock(i):
+        return app.test_client().post('/api/pharmacy/inventory/add', json={
+            'user_id': SQLITE_PHARMACY_USER, 'drug_name': ' Metformin' if i % 2 else 'metformin',
+            'stock_quantity': 3,
+        })
+
+    responses = _fire(20, restock)
+    assert all(r.status_code == 201 for r in responses)
+    rows = _query(shared_db, "SELECT drug_key, stock_quantity FROM pharmacy_inventory WHERE pharmacy_id = 1")
+    assert rows == [{'drug_key': 'metformin', 'stock_quantity': 5 + 60}]
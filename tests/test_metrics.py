@@ -0,0 +1,154 @@
+# tests/test_metrics.py
+
+import os
+import sys
+import threading
+
+import pytest
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import metrics
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def _scrape(client):
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    return resp.get_data(as_text=True)
+
+
+def test_requests_are_counted_per_route_and_status(client):
+    for _ in range(3):
+        client.get('/api/hello')
+    client.get('/api/pharmacy/queue')       # 400: user_id missing
+    client.get('/no/such/route')
+
+    body = _scrape(client)
+    assert 'http_requests_total{blueprint="",endpoint="hello",method="GET",status="200"} 3' in body
+    assert ('http_requests_total{blueprint="pharmacy_queue",endpoint="pharmacy_queue.get_prescription_queue",'
+            'method="GET",status="400"} 1') in body
+    assert 'http_requests_total{blueprint="",endpoint="unmatched",method="GET",status="404"} 1' in body
+
+
+def test_latency_and_size_histograms(client):
+    client.get('/api/hello')
+    client.get('/api/hello')
+    body = _scrape(client)
+
+    labels = 'blueprint="",endpoint="hello",method="GET"'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in body
+    assert f'http_request_duration_seconds_count{{{labels}}} 2' in body
+    # {"message":"Hello World!"} is well under 100 bytes
+    assert f'http_response_size_bytes_bucket{{{labels},le="100"}} 2' in body
+    # the scrape itself is still in flight while it renders
+    assert 'http_requests_in_flight 1' in body
+
+
+def test_buckets_are_cumulative():
+    collector = metrics.MetricsCollector(latency_buckets=(0.1, 1.0), size_buckets=(10,))
+    for seconds in (0.05, 0.5, 0.5, 5.0):
+        collector.observe('bp', 'bp.view', 'GET', 200, seconds, size=20)
+    body = collector.render()
+
+    labels = 'blueprint="bp",endpoint="bp.view",method="GET"'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in body
+    assert f'http_request_duration_seconds_bucket{{{labels},le="1.0"}} 3' in body
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 4' in body
+    assert f'http_request_duration_seconds_sum{{{labels}}} 6.05' in body
+    assert f'http_response_size_bytes_bucket{{{labels},le="10"}} 0' in body
+    assert f'http_response_size_bytes_sum{{{labels}}} 80' in body
+
+
+def test_shards_from_many_threads_are_summed():
+    collector = metrics.MetricsCollector()
+
+    def work():
+        for _ in range(500):
+            collector.request_started()
+            collector.observe('bp', 'bp.view', 'GET', 200, 0.001)
+            collector.request_finished()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    snap = collector.snapshot()
+    assert snap['requests'][('bp', 'bp.view', 'GET', '200')] == 4000
+    assert snap['in_flight'] == 0
+    # the shards of finished threads still count
+    assert sum(snap['latency'][('bp', 'bp.view', 'GET')][:-1]) == 4000
+
+
+def test_label_values_are_escaped():
+    collector = metrics.MetricsCollector()
+    collector.observe('bp', 'say "hi"\\', 'GET', 200, 0.01)
+    assert 'endpoint="say \\"hi\\"\\\\"' in collector.render()
+
+
+def test_scrape_adds_up_every_worker(client, tmp_path, monkeypatch):
+    # a worker that served two requests and has since exited
+    other = metrics.ProcessFiles(metrics.MetricsCollector(), str(tmp_path))
+    other.start()
+    other.collector.request_started()
+    for _ in range(2):
+        other.collector.observe('', 'hello', 'GET', 200, 0.001, 10)
+    other.stop()
+
+    monkeypatch.setattr(metrics.files, 'directory', str(tmp_path))
+    metrics.start()
+    try:
+        client.get('/api/hello')
+        body = _scrape(client)
+    finally:
+        metrics.stop()
+    assert 'http_requests_total{blueprint="",endpoint="hello",method="GET",status="200"} 3' in body
+    # an exited worker's in-flight requests don't linger
+    assert 'http_requests_in_flight 1' in body
+    # both exited workers live on in the archive only
+    assert [p.name for p in tmp_path.glob('metrics-*.json')] == [metrics.ARCHIVE_FILE]
+    archived = metrics.files._read(str(tmp_path / metrics.ARCHIVE_FILE))
+    assert archived['requests'][('', 'hello', 'GET', '200')] == 3
+
+    metrics.clear_multiproc_dir()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_killed_worker_is_archived_by_the_server(tmp_path):
+    files = metrics.ProcessFiles(metrics.MetricsCollector(), str(tmp_path))
+    files.start()
+    files.collector.request_started()
+    files.collector.observe('', 'hello', 'GET', 200, 0.001)
+    files.flush()
+    # the worker dies without running stop(); the master reaps it
+    files._stop.set()
+    files._thread.join()
+    assert files.mark_process_dead(os.getpid()) == 1
+    assert [p.name for p in tmp_path.glob('metrics-*.json')] == [metrics.ARCHIVE_FILE]
+
+    reader = metrics.ProcessFiles(metrics.MetricsCollector(), str(tmp_path))
+    snap, = reader.others()
+    assert snap['requests'] == {('', 'hello', 'GET', '200'): 1}
+    assert snap['in_flight'] == 0
+
+
+def test_metrics_stay_per_process_without_a_directory(client):
+    metrics.start()
+    assert metrics.files.path is None
+    client.get('/api/hello')
+    assert 'status="200"} 1' in _scrape(client)
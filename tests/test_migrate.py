@@ -0,0 +1,177 @@
+# tests/test_migrate.py
+
+import io
+import os
+import sys
+import pytest
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+import migrate
+import explain_check
+import rollups
+
+# --- Helper classes ---
+class DummyCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self.rowcount = 0
+    def execute(self, query, params=None):
+        self._conn.executed.append((query, params))
+    def fetchall(self):
+        return [(v,) for v in self._conn.applied]
+    def close(self):
+        pass
+
+class DummyConn:
+    def __init__(self, applied=()):
+        self.applied = set(applied)
+        self.executed = []
+        self.commits = 0
+    def cursor(self, dictionary=False):
+        return DummyCursor(self)
+    def commit(self):
+        self.commits += 1
+    def rollback(self):
+        pass
+
+def _write(directory, name, sql):
+    path = directory / name
+    path.write_text(sql)
+    return path
+
+# --- statement splitting ---
+
+def test_split_statements_ignores_comments_and_quoted_semicolons():
+    sql = """
+    -- leading comment; with a semicolon
+    CREATE INDEX a ON t (x);
+    # hash comment
+    INSERT INTO t (s) VALUES ('a;b');
+    UPDATE t SET s = "it's" WHERE x = 1
+    """
+    assert migrate.split_statements(sql) == [
+        "CREATE INDEX a ON t (x)",
+        "INSERT INTO t (s) VALUES ('a;b')",
+        'UPDATE t SET s = "it\'s" WHERE x = 1',
+    ]
+
+def test_shipped_migrations_parse_in_order():
+    migrations = migrate.discover()
+    versions = [m.version for m in migrations]
+    assert versions == sorted(versions)
+    assert versions[:3] == [1, 2, 3]
+    for m in migrations:
+        assert m.statements()
+
+# --- discovery ---
+
+def test_discover_sorts_numerically_and_skips_other_files(tmp_path):
+    _write(tmp_path, '010_later.sql', 'SELECT 1;')
+    _write(tmp_path, '002_early.sql', 'SELECT 1;')
+    _write(tmp_path, 'README.md', '')
+    assert [m.version for m in migrate.discover(str(tmp_path))] == [2, 10]
+
+def test_discover_rejects_duplicate_versions(tmp_path):
+    _write(tmp_path, '001_a.sql', 'SELECT 1;')
+    _write(tmp_path, '1_b.sql', 'SELECT 1;')
+    with pytest.raises(ValueError):
+        migrate.discover(str(tmp_path))
+
+# --- applying ---
+
+def test_migrate_up_applies_only_pending(tmp_path):
+    _write(tmp_path, '001_done.sql', 'CREATE INDEX done ON t (x);')
+    _write(tmp_path, '002_new.sql', 'CREATE INDEX a ON t (x);\nCREATE INDEX b ON t (y);')
+    conn = DummyConn(applied={1})
+    applied = migrate.migrate_up(conn, migrate.discover(str(tmp_path)), out=open(os.devnull, 'w'))
+    assert [m.version for m in applied] == [2]
+    statements = [q for q, _ in conn.executed]
+    assert 'CREATE INDEX done ON t (x)' not in statements
+    assert 'CREATE INDEX a ON t (x)' in statements
+    assert ('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)', (2, 'new')) in conn.executed
+    assert conn.commits == 1
+
+# --- explain check ---
+
+def test_full_scan_without_index_fails():
+    errors, warnings = explain_check.problems([
+        {'table': 'prescriptions', 'type': 'ALL', 'possible_keys': None, 'rows': 1000},
+        {'table': 'pharmacies', 'type': 'ref', 'possible_keys': 'idx', 'rows': 1},
+    ])
+    assert len(errors) == 1 and 'prescriptions' in errors[0]
+    assert warnings == []
+
+def test_full_scan_with_candidate_index_only_warns():
+    errors, warnings = explain_check.problems([
+        {'table': 'payments_pharmacy', 'type': 'ALL', 'possible_keys': 'idx_payments_pharmacy_date', 'rows': 3},
+        {'table': 'weight_loss_drugs', 'type': 'ALL', 'possible_keys': None, 'rows': 5},
+    ])
+    assert errors == []
+    assert len(warnings) == 1
+
+def test_search_routes_fail_on_any_full_scan():
+    plan = [
+        {'table': '<derived2>', 'type': 'ALL', 'possible_keys': None, 'rows': 40},
+        {'table': 'pharmacy_logs', 'type': 'ALL', 'possible_keys': 'PRIMARY', 'rows': 90000},
+    ]
+    errors, warnings = explain_check.problems(plan, strict=True)
+    assert len(errors) == 1 and 'pharmacy_logs' in errors[0] and warnings == []
+    assert explain_check.problems(plan) == ([], [errors[0].replace(', not using', ', optimizer skipped')])
+    assert 'GET /api/pharmacy/logs?search=met&limit=50' in explain_check.NO_SCAN_ROUTES
+    routes = {f'{m} {p}' for m, p, _ in explain_check.ROUTES} | {explain_check.EVENTS_ROUTE}
+    assert explain_check.NO_SCAN_ROUTES <= routes
+
+def test_capture_covers_the_bulk_routes_and_the_change_log(sqlite_db):
+    cursor = sqlite_db.cursor()
+    cursor.execute("""
+        INSERT INTO prescriptions (doctor_id, patient_id, pharmacy_id, drug_id, medication_name, dosage)
+        VALUES (3, 1, 1, 1, 'Metformin', '500mg')
+    """)
+    sqlite_db.commit()
+    captured = explain_check.capture_queries(sqlite_db)
+    routes = {route for route, _, _ in captured}
+    for route in (
+        'POST /api/pharmacy/prescriptions/fulfill?user_id={user_id}',
+        'POST /api/pharmacy/prescriptions/dispense?user_id={user_id}',
+        'PATCH /api/prices/bulk-update',
+        'POST /api/pharmacy/inventory/import?user_id={user_id}',
+    ):
+        assert route in routes, route
+    log_reads = [q for route, q, _ in captured if route == explain_check.EVENTS_ROUTE]
+    assert len(log_reads) == 2 and all('pharmacy_events' in q for q in log_reads)
+    # a dry run leaves the data as it was
+    cursor.execute("SELECT status FROM prescriptions")
+    assert cursor.fetchall() == [('pending',)]
+
+def test_dry_run_connection_never_commits():
+    class Conn:
+        def __init__(self): self.rolled_back = False
+        def rollback(self): self.rolled_back = True
+        def commit(self): raise AssertionError("must not commit")
+    conn = Conn()
+    explain_check.DryRunConnection(conn).commit()
+    assert conn.rolled_back
+
+# --- rollups.py ---
+
+def test_rollup_rebuild_one_pharmacy():
+    conn = DummyConn()
+    out = io.StringIO()
+    rollups.rebuild(conn, pharmacy_id=3, out=out)
+    (delete, d_params), (insert, i_params) = conn.executed
+    assert delete.startswith('DELETE FROM payments_daily') and d_params == (3,)
+    assert 'GROUP BY pharmacy_id, DATE(payment_date)' in insert and i_params == (3,)
+    assert conn.commits == 1
+    assert 'pharmacy 3' in out.getvalue()
+
+def test_rollup_rebuild_all():
+    conn = DummyConn()
+    rollups.rebuild(conn, out=io.StringIO())
+    assert all(params == () for _, params in conn.executed)
+    assert 'WHERE' not in conn.executed[0][0]
@@ -2,7 +2,6 @@
 
 import os
 import sys
-import types
 import pytest
 import mysql.connector
 
@@ -10,7 +9,8 @@ import mysql.connector
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Stub out config before importing
-sys.modules['config'] = types.SimpleNamespace(DB_CONFIG={})
+import config
+config.DB_CONFIG = {}
 
 from app import app
 import blueprints.paymentHistory.payments as payments_mod
@@ -37,6 +37,25 @@ class DummyConn:
     def close(self):
         pass
 
+class StatusConn:
+    """Filters rows by the is_fulfilled parameter, like the real WHERE clause."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+    def cursor(self, dictionary=True):
+        return self
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+        self._result = self.rows
+        if 'p.is_fulfilled = %s' in query:
+            self._result = [r for r in self.rows if r['is_fulfilled'] == params[1]]
+    def fetchall(self):
+        return self._result
+    def fetchone(self):
+        return None
+    def close(self):
+        pass
+
 @pytest.fixture
 def client():
     return app.test_client()
@@ -65,12 +84,167 @@ def test_get_payments_success(monkeypatch, client):
         {'payment_id': 3, 'patient_name': 'C', 'amount': 30.0, 'is_fulfilled': True, 'payment_date': '2025-04-26'}
     ]
     # stub pharmacy_id resolution and DB connection
+    conn = StatusConn(rows)
     monkeypatch.setattr(payments_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
-    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: DummyConn(rows=rows))
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
 
     resp = client.get('/api/pharmacy/payments?user_id=1')
     assert resp.status_code == 200
     data = resp.get_json()
     assert 'fulfilled' in data and 'unfulfilled' in data
     assert data['fulfilled'] == [rows[0], rows[2]]
-    assert data['unfulfilled'] == [rows[1]]
\ No newline at end of file
+    assert data['unfulfilled'] == [rows[1]]
+    # split by SQL, one query per status
+    assert [params for _, params in conn.queries] == [(1, True), (1, False)]
+
+def test_get_payments_single_status(monkeypatch, client):
+    rows = [
+        {'payment_id': 1, 'patient_name': 'A', 'amount': 10.0, 'is_fulfilled': True, 'payment_date': '2025-04-28'},
+        {'payment_id': 2, 'patient_name': 'B', 'amount': 20.0, 'is_fulfilled': False, 'payment_date': '2025-04-27'},
+    ]
+    conn = StatusConn(rows)
+    monkeypatch.setattr(payments_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.get('/api/pharmacy/payments?user_id=1&status=unfulfilled')
+    assert resp.status_code == 200
+    assert resp.get_json() == [rows[1]]
+    assert len(conn.queries) == 1
+
+def test_get_payments_bad_status(client):
+    resp = client.get('/api/pharmacy/payments?user_id=1&status=refunded')
+    assert resp.status_code == 400
+
+def test_get_payments_paged(monkeypatch, client):
+    rows = [
+        {'payment_id': 9, 'patient_name': 'A', 'amount': 10.0, 'is_fulfilled': True, 'payment_date': '2025-04-28'},
+        {'payment_id': 7, 'patient_name': 'B', 'amount': 20.0, 'is_fulfilled': True, 'payment_date': '2025-04-27'},
+        {'payment_id': 4, 'patient_name': 'C', 'amount': 30.0, 'is_fulfilled': True, 'payment_date': '2025-04-26'},
+    ]
+    conn = StatusConn(rows)
+    monkeypatch.setattr(payments_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.get('/api/pharmacy/payments?user_id=1&status=fulfilled&limit=2')
+    data = resp.get_json()
+    assert data['items'] == rows[:2]
+    assert data['next_cursor']
+
+    resp = client.get(f"/api/pharmacy/payments?user_id=1&status=fulfilled&limit=2&after={data['next_cursor']}")
+    query, params = conn.queries[-1]
+    assert 'p.is_fulfilled = %s' in query
+    assert 'p.payment_date < %s' in query
+    assert 'ORDER BY p.payment_date DESC, p.payment_id DESC' in query
+    assert params == (1, True, '2025-04-27', '2025-04-27', 7, 3)
+
+def test_get_payments_bad_cursor(monkeypatch, client):
+    monkeypatch.setattr(payments_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: StatusConn([]))
+    resp = client.get('/api/pharmacy/payments?user_id=1&after=%%%')
+    assert resp.status_code == 400
+
+# --- Tests for GET /api/pharmacy/payments/summary ---
+
+def test_payment_summary(monkeypatch, client):
+    from datetime import date
+    from decimal import Decimal
+    groups = [
+        {'day': date(2025, 4, 26), 'is_fulfilled': 1, 'count': 2, 'total': Decimal('40.00')},
+        {'day': date(2025, 4, 27), 'is_fulfilled': 0, 'count': 1, 'total': Decimal('20.00')},
+        {'day': date(2025, 4, 27), 'is_fulfilled': 1, 'count': 1, 'total': Decimal('10.50')},
+    ]
+    conn = StatusConn(groups)
+    monkeypatch.setattr(payments_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.get('/api/pharmacy/payments/summary?user_id=1&from=2025-04-01&to=2025-04-30')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['by_status'] == {
+        'fulfilled':   {'count': 3, 'total': '50.50'},
+        'unfulfilled': {'count': 1, 'total': '20.00'},
+    }
+    assert data['by_day'] == [
+        {'day': '2025-04-26', 'fulfilled_count': 2, 'fulfilled_total': '40.00',
+         'unfulfilled_count': 0, 'unfulfilled_total': '0'},
+        {'day': '2025-04-27', 'fulfilled_count': 1, 'fulfilled_total': '10.50',
+         'unfulfilled_count': 1, 'unfulfilled_total': '20.00'},
+    ]
+    query, params = conn.queries[0]
+    assert 'GROUP BY' in query
+    assert params == (1, date(2025, 4, 1), date(2025, 5, 1))
+
+def test_payment_summary_bad_date(client):
+    resp = client.get('/api/pharmacy/payments/summary?user_id=1&from=yesterday')
+    assert resp.status_code == 400
+# --- streaming mode ---
+
+class StreamingCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+    def execute(self, query, params=None):
+        self._conn.queries.append(params)
+        if params and len(params) == 2:
+            self._rows = [r for r in self._conn.rows if r['is_fulfilled'] == params[1]]
+    def fetchone(self):
+        return None
+    def fetchmany(self, size):
+        self._conn.batch_sizes.append(size)
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+    def close(self):
+        pass
+
+class StreamingConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.batch_sizes = []
+    def cursor(self, dictionary=True, buffered=None):
+        return StreamingCursor(self)
+    def close(self):
+        pass
+
+def test_get_payments_streamed(monkeypatch, client):
+    rows = [
+        {'payment_id': 1, 'patient_name': 'A', 'amount': 10.0, 'is_fulfilled': True, 'payment_date': '2025-04-28'},
+        {'payment_id': 2, 'patient_name': 'B', 'amount': 20.0, 'is_fulfilled': False, 'payment_date': '2025-04-27'},
+        {'payment_id': 3, 'patient_name': 'C', 'amount': 30.0, 'is_fulfilled': True, 'payment_date': '2025-04-26'}
+    ]
+    conn = StreamingConn(rows)
+    monkeypatch.setattr(payments_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    monkeypatch.setattr('blueprints.common.streaming.STREAM_BATCH_SIZE', 1)
+
+    resp = client.get('/api/pharmacy/payments?user_id=1&stream=1')
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    data = resp.get_json()
+    assert data == {'fulfilled': [rows[0], rows[2]], 'unfulfilled': [rows[1]]}
+    # one query per status, each read one row per fetchmany
+    assert conn.queries == [(1, True), (1, False)]
+    assert set(conn.batch_sizes) == {1}
+
+# --- Tests for GET /api/pharmacy/payments/revenue ---
+
+def test_revenue_reads_rollup(monkeypatch, client):
+    from datetime import date
+    from decimal import Decimal
+    days = [
+        {'day': date(2025, 4, 26), 'count': 2, 'total': Decimal('40.00')},
+        {'day': date(2025, 4, 27), 'count': 3, 'total': Decimal('30.50')},
+    ]
+    conn = StatusConn(days)
+    monkeypatch.setattr(payments_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.get('/api/pharmacy/payments/revenue?user_id=1&to=2025-04-30')
+    assert resp.status_code == 200
+    assert resp.get_json() == {
+        'days': [
+            {'day': '2025-04-26', 'count': 2, 'total': '40.00'},
+            {'day': '2025-04-27', 'count': 3, 'total': '30.50'},
+        ],
+        'count': 5,
+        'total': '70.50',
+    }
+    query, params = conn.queries[0]
+    assert 'FROM payments_daily' in query and 'payments_pharmacy' not in query
+    assert params == (1, date(2025, 4, 30))
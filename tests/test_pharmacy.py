@@ -0,0 +1,147 @@
+# tests/test_pharmacy.py
+
+import os
+import sys
+import pytest
+import mysql.connector
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# stub out config before importing app
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import invalidation
+from blueprints.common import drugs, pharmacy
+from conftest import SQLITE_PHARMACY_USER
+from blueprints.common.cache import TTLCache
+
+# --- Helper classes ---
+class CountingCursor:
+    def __init__(self, row):
+        self._row = row
+        self.queries = 0
+    def execute(self, query, params=None):
+        self.queries += 1
+    def fetchone(self):
+        return self._row
+    def close(self):
+        pass
+
+class DummyConn:
+    def __init__(self, row):
+        self.cursor_obj = CountingCursor(row)
+        self.committed = False
+    def cursor(self, dictionary=True):
+        return self.cursor_obj
+    def commit(self):
+        self.committed = True
+    def rollback(self):
+        pass
+    def close(self):
+        pass
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+# --- resolver ---
+
+def test_second_lookup_is_served_from_cache():
+    before = pharmacy.cache_stats()
+    cursor = CountingCursor({'pharmacy_id': 7})
+    assert pharmacy.get_pharmacy_id_for_user(3, cursor) == 7
+    assert pharmacy.get_pharmacy_id_for_user('3', cursor) == 7
+    assert cursor.queries == 1
+    stats = pharmacy.cache_stats()
+    assert stats['hits'] - before['hits'] == 1 and stats['misses'] - before['misses'] == 1
+
+def test_unknown_user_is_not_cached():
+    cursor = CountingCursor(None)
+    assert pharmacy.get_pharmacy_id_for_user(4, cursor) is None
+    assert pharmacy.get_pharmacy_id_for_user(4, cursor) is None
+    assert cursor.queries == 2
+
+def test_malformed_user_id_has_no_pharmacy(client, sqlite_db):
+    cursor = CountingCursor({'pharmacy_id': 7})
+    assert pharmacy.get_pharmacy_id_for_user('abc', cursor) is None
+    assert pharmacy.get_pharmacy_id_for_user([1], cursor) is None
+    assert cursor.queries == 0
+
+    # the JSON-body endpoints answer 404 as for any unknown user, not a 500
+    for method, path, body in [
+        ('PATCH', '/api/prices/update', {'user_id': 'abc', 'drug_id': 1, 'price': 5}),
+        ('POST', '/api/pharmacy/inventory/add', {'user_id': 'abc', 'drug_name': 'Metformin', 'stock_quantity': 1}),
+    ]:
+        resp = client.open(path, method=method, json=body)
+        assert resp.status_code == 404 and resp.is_json
+
+def test_tuple_cursor_rows():
+    assert pharmacy.get_pharmacy_id_for_user(5, CountingCursor((9,))) == 9
+
+# --- TTLCache ---
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_clear_keeps_the_counters():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('b')
+    cache.clear()
+    stats = cache.stats()
+    assert stats['size'] == 0
+    assert (stats['hits'], stats['misses'], stats['clears']) == (1, 1, 1)
+
+def test_cache_entries_expire():
+    cache = TTLCache(max_size=2, ttl=0)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+# --- invalidation across worker processes ---
+
+def test_bumped_version_clears_every_workers_cache(sqlite_db, client):
+    # this process plays a worker that didn't make the change
+    assert set(invalidation.watcher.poll()) == {'pharmacies', 'drugs'}
+    assert invalidation.watcher.poll() == []
+    client.get(f'/api/pharmacy/queue?user_id={SQLITE_PHARMACY_USER}')
+    assert pharmacy.cache_stats()['size'] == 1
+
+    # an admin deactivates the pharmacy by hand; the trigger bumps the version
+    cursor = sqlite_db.cursor()
+    cursor.execute("UPDATE pharmacies SET is_active = FALSE")
+    sqlite_db.commit()
+
+    assert invalidation.watcher.poll() == ['pharmacies']
+    assert pharmacy.cache_stats()['size'] == 0
+    assert client.get(f'/api/pharmacy/queue?user_id={SQLITE_PHARMACY_USER}').status_code == 404
+
+def test_deleting_a_pharmacy_bumps_the_version(sqlite_db):
+    invalidation.watcher.poll()
+    cursor = sqlite_db.cursor()
+    cursor.execute("DELETE FROM pharmacies")
+    sqlite_db.commit()
+    assert invalidation.watcher.poll() == ['pharmacies']
+
+def test_drug_refresh_reaches_other_workers(sqlite_db, client):
+    invalidation.watcher.poll()
+    with app.app_context():
+        assert len(drugs.all_drugs()) == 2
+    loads = drugs.cache_stats()['loads']
+
+    assert client.post('/api/prescriptions/drugs/refresh').status_code == 200
+    assert invalidation.watcher.poll() == ['drugs']
+    with app.app_context():
+        drugs.all_drugs()
+    # once for the refresh itself, once more after the poll expired the catalog
+    assert drugs.cache_stats()['loads'] == loads + 2
@@ -5,14 +5,15 @@ import sys
 # ensure the project root (where app.py lives) is on PYTHONPATH
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import types
 import pytest
 import mysql.connector
 
 # stub out config before importing app
-sys.modules['config'] = types.SimpleNamespace(DB_CONFIG={})
+import config
+config.DB_CONFIG = {}
 
 from app import app
+from blueprints.common import drugs
 
 # Helper classes to mock MySQL connection and cursor
 class DummyCursor:
@@ -117,6 +118,21 @@ def test_add_inventory_item(monkeypatch, client):
     assert resp.status_code == 201
     assert resp.get_json().get('message') == 'Inventory item added successfully'
 
+def test_add_inventory_item_rejects_negative_stock(monkeypatch, client):
+    queries = []
+    class RecordingCursor(DummyCursor):
+        def execute(self, query, params=None): queries.append(query)
+    class RecordingConn(DummyConn):
+        def cursor(self, dictionary=True): return RecordingCursor([])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: RecordingConn([]))
+    resp = client.post(
+        '/api/pharmacy/inventory/add',
+        json={'user_id': 1, 'drug_name': 'Aspirin', 'stock_quantity': -50}
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()['error'] == 'stock_quantity must not be negative'
+    assert not any('pharmacy_inventory' in q for q in queries)
+
 def test_get_inventory(monkeypatch, client):
     rows = [{'drug_name': 'Aspirin', 'stock_quantity': 20}]
     monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: DummyConn(rows))
@@ -124,6 +140,31 @@ def test_get_inventory(monkeypatch, client):
     assert resp.status_code == 200
     assert resp.get_json() == rows
 
+def test_get_inventory_etag_not_modified(monkeypatch, client):
+    rows = [{'drug_id': 1, 'drug_name': 'Aspirin', 'stock_quantity': 20}]
+    version = {'n': 1, 'changed': '2026-01-01 00:00:00.000001'}
+    queries = []
+    class Cursor(DummyCursor):
+        def execute(self, query, params=None): queries.append(query)
+        def fetchone(self): return version
+    class Conn(DummyConn):
+        def cursor(self, dictionary=True): return Cursor(rows)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: Conn(rows))
+
+    first = client.get('/api/pharmacy/inventory?user_id=1')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    queries.clear()
+    resp = client.get('/api/pharmacy/inventory?user_id=1', headers={'If-None-Match': first.headers['ETag']})
+    assert resp.status_code == 304
+    assert len(queries) == 1 and 'MAX(updated_at)' in queries[0]
+
+    # a restock bumps updated_at, so the old tag no longer matches
+    version = {'n': 1, 'changed': '2026-01-01 00:00:00.000002'}
+    resp = client.get('/api/pharmacy/inventory?user_id=1', headers={'If-None-Match': first.headers['ETag']})
+    assert resp.status_code == 200 and resp.get_json() == rows
+
 def test_get_pharmacy_id(monkeypatch, client):
     # This endpoint doesn't use our forced helper, so simulate a DB return:
     row = {'pharmacy_id': 99}
@@ -131,3 +172,231 @@ def test_get_pharmacy_id(monkeypatch, client):
     resp = client.get('/api/pharmacy/getPharmacyId?user_id=1')
     assert resp.status_code == 200
     assert resp.get_json().get('pharmacy_id') == 99
+
+# --- keyset pagination ---
+
+class RecordingConn(DummyConn):
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.queries = []
+    def cursor(self, dictionary=True):
+        conn = self
+        class Cursor(DummyCursor):
+            def execute(self, query, params=None):
+                conn.queries.append((query, params))
+        return Cursor(self._rows)
+
+def test_get_prescriptions_paged(monkeypatch, client):
+    rows = [
+        {'prescription_id': 1, 'created_at': '2025-04-01T09:00:00'},
+        {'prescription_id': 2, 'created_at': '2025-04-02T09:00:00'},
+        {'prescription_id': 3, 'created_at': '2025-04-03T09:00:00'},
+    ]
+    conn = RecordingConn(rows)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    resp = client.get('/api/pharmacy/prescriptions?limit=2')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['items'] == rows[:2]
+    assert data['next_cursor']
+    query, params = conn.queries[-1]
+    assert 'LIMIT %s' in query and params[-1] == 3
+
+    # the cursor carries the sort key of the last row on the page
+    resp = client.get(f"/api/pharmacy/prescriptions?limit=2&after={data['next_cursor']}")
+    query, params = conn.queries[-1]
+    assert 'p.created_at > %s' in query
+    assert list(params[:3]) == ['2025-04-02T09:00:00', '2025-04-02T09:00:00', 2]
+
+def test_get_prescriptions_last_page(monkeypatch, client):
+    rows = [{'prescription_id': 1, 'created_at': '2025-04-01T09:00:00'}]
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: DummyConn(rows))
+    resp = client.get('/api/pharmacy/prescriptions?limit=5')
+    assert resp.get_json() == {'items': rows, 'next_cursor': None}
+
+@pytest.mark.parametrize('qs', [
+    'limit=abc', 'limit=0', 'after=not-a-cursor',
+    # well-formed JSON of the wrong shape: [{"t":5},1], [[1],2], {"t":"2025-01-01"}, [null,1]
+    'after=W3sidCI6NX0sMV0', 'after=W1sxXSwyXQ', 'after=eyJ0IjoiMjAyNS0wMS0wMSJ9', 'after=W251bGwsMV0',
+])
+def test_get_prescriptions_bad_page_args(monkeypatch, client, qs):
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: DummyConn([]))
+    resp = client.get(f'/api/pharmacy/prescriptions?{qs}')
+    assert resp.status_code == 400
+
+def test_view_past_transactions_paged(monkeypatch, client):
+    rows = [
+        {'log_id': 9, 'timestamp': '2025-04-03T09:00:00'},
+        {'log_id': 8, 'timestamp': '2025-04-02T09:00:00'},
+    ]
+    conn = RecordingConn(rows)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    resp = client.get('/api/pharmacy/logs?limit=1&search=Orl')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['items'] == rows[:1]
+    query, _ = conn.queries[-1]
+    assert 'ORDER BY l.timestamp DESC, l.log_id DESC' in query
+
+    client.get(f"/api/pharmacy/logs?limit=1&after={data['next_cursor']}")
+    query, params = conn.queries[-1]
+    assert 'l.timestamp < %s' in query
+    assert params[-1] == 2
+
+# --- streaming mode ---
+
+class StreamingCursor(DummyCursor):
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+class StreamingConn(DummyConn):
+    def cursor(self, dictionary=True, buffered=None):
+        return StreamingCursor(list(self._rows))
+
+def test_get_prescriptions_streamed(monkeypatch, client):
+    rows = [{'prescription_id': i, 'medication_name': 'M'} for i in range(5)]
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: StreamingConn(rows))
+    monkeypatch.setattr('blueprints.common.streaming.STREAM_BATCH_SIZE', 2)
+    resp = client.get('/api/pharmacy/prescriptions?stream=1')
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.get_json() == rows
+
+def test_view_past_transactions_streamed_empty(monkeypatch, client):
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: StreamingConn([]))
+    resp = client.get('/api/pharmacy/logs?stream=true')
+    assert resp.status_code == 200
+    assert resp.get_json() == []
+
+# --- search ---
+
+def test_search_prescriptions_uses_fulltext_ranking(monkeypatch, client):
+    conn = RecordingConn([])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    client.get('/api/pharmacy/prescriptions?search=%20metformin%20er%20')
+    query, params = conn.queries[-1]
+    assert 'LIKE' not in query
+    # every word is required; the looser natural language score only ranks
+    assert 'WHERE MATCH(p.medication_name) AGAINST (%s IN BOOLEAN MODE)' in query
+    assert 'ORDER BY MATCH(p.medication_name) AGAINST (%s IN NATURAL LANGUAGE MODE) DESC' in query
+    assert params == ('+"metformin" +"er"', 'metformin er')
+
+def test_search_strips_boolean_operators(monkeypatch, client):
+    conn = RecordingConn([])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    client.get('/api/pharmacy/prescriptions?search=-metformin%20"x*')
+    query, params = conn.queries[-1]
+    assert params[0] == '+"metformin"'
+
+def test_search_prescriptions_short_term_is_prefix(monkeypatch, client):
+    conn = RecordingConn([])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    client.get('/api/pharmacy/prescriptions?search=%25')
+    query, params = conn.queries[-1]
+    assert 'p.medication_name LIKE %s' in query
+    assert params == ('\\%%',)
+
+def test_search_logs_matches_medication_or_patient(monkeypatch, client):
+    conn = RecordingConn([{'log_id': 1}])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    resp = client.get('/api/pharmacy/logs?search=emily')
+    assert resp.status_code == 200
+    query, params = conn.queries[-1]
+    assert 'MATCH(r.medication_name)' in query
+    assert 'MATCH(p.first_name, p.last_name)' in query
+    # each MATCH in its own branch of a UNION, never OR-ed together
+    assert 'UNION' in query and ' OR ' not in query
+    # filter on both branches, then rank by both scores
+    assert params == ('+"emily"', '+"emily"', 'emily', 'emily')
+
+def test_get_requests_joins_on_indexed_key(monkeypatch, client):
+    conn = RecordingConn([])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    client.get('/api/pharmacy/requests?pharmacy_id=1')
+    query, _ = conn.queries[-1]
+    assert 'lower(trim' not in query.lower()
+    assert 'pi.drug_key = p.medication_key' in query
+
+# --- inventory import ---
+
+class ImportConn(DummyConn):
+    def __init__(self):
+        super().__init__([])
+        self.inserts = []
+        self.commits = 0
+    def cursor(self, dictionary=True):
+        conn = self
+        class Cursor(DummyCursor):
+            def execute(self, query, params=None):
+                if 'INSERT INTO pharmacy_inventory' in query:
+                    conn.inserts.append(params)
+        return Cursor([])
+    def commit(self):
+        self.commits += 1
+
+def test_import_inventory_csv_in_batches(monkeypatch, client):
+    conn = ImportConn()
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    monkeypatch.setattr(drugs, 'find_drug_id', lambda n: {'metformin': 1, 'orlistat': 2}.get(n.strip().lower()))
+    body = "drug_name,stock_quantity\nMetformin,5\nOrlistat,3\nBad,x\nPhentermine,1\n,4\nMetformin,2\n"
+    resp = client.post('/api/pharmacy/inventory/import?user_id=1&batch_size=2',
+                       data=body, content_type='text/csv')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['rows'] == 4
+    assert data['rejected'] == 2
+    assert data['batches'] == 2
+    assert [e['line'] for e in data['errors']] == [4, 6]
+    assert 'elapsed_ms' in data
+    # one multi-row upsert per batch, each committed
+    assert len(conn.inserts) == 2 and conn.commits == 2
+    # drug_id is resolved from the cached catalog, not a per-row subquery
+    assert conn.inserts[0] == (1, 'Metformin', 1, 5, 1, 'Orlistat', 2, 3)
+
+def test_import_inventory_ndjson(monkeypatch, client):
+    conn = ImportConn()
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    body = '{"drug_name": "Metformin", "stock_quantity": 5}\n\n[1, 2]\nnot json\n'
+    resp = client.post('/api/pharmacy/inventory/import?user_id=1',
+                       data=body, content_type='application/x-ndjson')
+    data = resp.get_json()
+    assert data['rows'] == 1 and data['rejected'] == 2 and data['batches'] == 1
+
+def test_import_inventory_bad_csv_header(monkeypatch, client):
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: ImportConn())
+    resp = client.post('/api/pharmacy/inventory/import?user_id=1',
+                       data="name,qty\nA,1\n", content_type='text/csv')
+    assert resp.status_code == 400
+
+def test_import_inventory_rejects_negative_quantity(monkeypatch, client):
+    conn = ImportConn()
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: conn)
+    body = '{"drug_name": "Metformin", "stock_quantity": 5}\n{"drug_name": "Orlistat", "stock_quantity": -3}\n'
+    resp = client.post('/api/pharmacy/inventory/import?user_id=1',
+                       data=body, content_type='application/x-ndjson')
+    data = resp.get_json()
+    assert data['rows'] == 1 and data['rejected'] == 1
+    assert data['errors'] == [{'line': 2, 'error': 'stock_quantity must not be negative'}]
+
+def test_import_inventory_malformed_csv(monkeypatch, client):
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: ImportConn())
+    # the unterminated quote runs the field past csv's size limit
+    resp = client.post('/api/pharmacy/inventory/import?user_id=1&batch_size=1',
+                       data='drug_name,stock_quantity\nMetformin,5\n"Orlistat,3\n' + 'x' * 200000, content_type='text/csv')
+    assert resp.status_code == 400
+    data = resp.get_json()
+    assert data['error'].startswith('malformed CSV after line 2')
+    # the batches committed before the bad row stay applied
+    assert data['rows'] == 1
+
+def test_import_inventory_not_utf8(monkeypatch, client):
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: ImportConn())
+    resp = client.post('/api/pharmacy/inventory/import?user_id=1',
+                       data=b'drug_name,stock_quantity\n\xff\xfe,5\n', content_type='text/csv')
+    assert resp.status_code == 400
+    assert 'not UTF-8' in resp.get_json()['error']
+
+def test_import_inventory_unsupported_type(client):
+    resp = client.post('/api/pharmacy/inventory/import?user_id=1', json={'drug_name': 'A'})
+    assert resp.status_code == 415
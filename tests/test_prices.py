@@ -2,7 +2,6 @@
 
 import os
 import sys
-import types
 import pytest
 import mysql.connector
 
@@ -10,10 +9,12 @@ import mysql.connector
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Stub out config before importing
-sys.modules['config'] = types.SimpleNamespace(DB_CONFIG={})
+import config
+config.DB_CONFIG = {}
 
 from app import app
 import blueprints.drugPrices.prices as prices_mod
+from blueprints.common import drugs
 
 # --- Helper classes to mock DB connections and cursors ---
 class DummyCursor:
@@ -75,6 +76,55 @@ def test_get_prices_success(monkeypatch, client):
     assert resp.status_code == 200
     assert resp.get_json() == sample
 
+class VersionedConn:
+    """Answers the version query with ``self.version`` and records every query."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.version = {'n': len(rows), 'changed': '2026-01-01 00:00:00.000001'}
+        self.queries = []
+    def cursor(self, dictionary=False):
+        conn = self
+        class Cursor(DummyCursor):
+            def execute(self, query, params=None): conn.queries.append(query)
+            def fetchone(self): return conn.version
+        return Cursor(rows=self.rows)
+    def commit(self): pass
+    def close(self): pass
+
+def test_get_prices_etag_not_modified(monkeypatch, client):
+    conn = VersionedConn([{'drug_id': 1, 'name': 'Metformin', 'description': 'Desc', 'price': 10.5}])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    monkeypatch.setattr(prices_mod, '_get_pharmacy_id_for_user', lambda user_id, cursor: 1)
+    monkeypatch.setattr(drugs, 'etag', lambda: 'catalog-v1')
+
+    first = client.get('/api/prices/current-prices?user_id=5')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    conn.queries.clear()
+    again = client.get('/api/prices/current-prices?user_id=5',
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+    # only the version query ran
+    assert len(conn.queries) == 1 and 'MAX(updated_at)' in conn.queries[0]
+
+    conn.version = {'n': 1, 'changed': '2026-01-01 00:00:00.000002'}
+    changed = client.get('/api/prices/current-prices?user_id=5',
+                         headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != first.headers['ETag']
+
+def test_get_prices_etag_tracks_catalog(monkeypatch, client):
+    conn = VersionedConn([])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    monkeypatch.setattr(prices_mod, '_get_pharmacy_id_for_user', lambda user_id, cursor: 1)
+    monkeypatch.setattr(drugs, 'etag', lambda: 'catalog-v1')
+    etag = client.get('/api/prices/current-prices?user_id=5').headers['ETag']
+    # a renamed drug changes the joined names, so the price list must refetch
+    monkeypatch.setattr(drugs, 'etag', lambda: 'catalog-v2')
+    resp = client.get('/api/prices/current-prices?user_id=5', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+
 # --- Tests for PATCH /api/prices/update ---
 
 UPDATE_URL = '/api/prices/update'
@@ -118,3 +168,79 @@ def test_update_price_insert(monkeypatch, client):
     resp = client.patch(UPDATE_URL, json=payload)
     assert resp.status_code == 200
     assert resp.get_json().get('message') == 'Price updated'
+
+def test_update_price_is_single_upsert(monkeypatch, client):
+    calls = []
+    class RecordingCursor(DummyCursor):
+        def execute(self, query, params=None): calls.append((query, params))
+    class RecordingConn(DummyConn):
+        def cursor(self, dictionary=False): return RecordingCursor(rowcount=0)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: RecordingConn())
+    monkeypatch.setattr(prices_mod, '_get_pharmacy_id_for_user', lambda u, c: 1)
+    resp = client.patch(UPDATE_URL, json={'user_id': 1, 'drug_id': 3, 'price': 25.0})
+    assert resp.status_code == 200
+    assert len(calls) == 1
+    assert 'ON DUPLICATE KEY UPDATE' in calls[0][0]
+
+# --- Tests for PATCH /api/prices/bulk-update ---
+
+BULK_URL = '/api/prices/bulk-update'
+
+class BulkCursor:
+    def __init__(self, conn): self._conn = conn
+    def execute(self, query, params=None): self._conn.calls.append((query, params))
+    def fetchall(self): return [(d,) for d in self._conn.known]
+    def close(self): pass
+
+class BulkConn:
+    def __init__(self, known):
+        self.known = known
+        self.calls = []
+        self.committed = False
+    def cursor(self, dictionary=False): return BulkCursor(self)
+    def commit(self): self.committed = True
+    def rollback(self): pass
+    def close(self): pass
+
+@pytest.mark.parametrize('payload', [
+    {'prices': [{'drug_id': 1, 'price': 5}]},
+    {'user_id': 1},
+    {'user_id': 1, 'prices': []},
+    {'user_id': 1, 'prices': [{'drug_id': 1}]},
+    {'user_id': 1, 'prices': [{'drug_id': 'x', 'price': 5}]},
+    {'user_id': 1, 'prices': [{'drug_id': 1, 'price': -5}]},
+    {'user_id': 1, 'prices': [{'drug_id': 1, 'price': 'NaN'}]},
+])
+def test_bulk_update_invalid(client, payload):
+    resp = client.patch(BULK_URL, json=payload)
+    assert resp.status_code == 400
+
+def test_bulk_update_unknown_drug(monkeypatch, client):
+    conn = BulkConn(known=[1])
+    monkeypatch.setattr(drugs, 'get_drug', lambda d: {'drug_id': d} if d in conn.known else None)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    monkeypatch.setattr(prices_mod, '_get_pharmacy_id_for_user', lambda u, c: 4)
+    resp = client.patch(BULK_URL, json={'user_id': 1, 'prices': [
+        {'drug_id': 1, 'price': 5}, {'drug_id': 9, 'price': 6},
+    ]})
+    assert resp.status_code == 400
+    assert resp.get_json()['drug_ids'] == [9]
+    assert not conn.committed
+
+def test_bulk_update_single_upsert(monkeypatch, client):
+    conn = BulkConn(known=[1, 2])
+    monkeypatch.setattr(drugs, 'get_drug', lambda d: {'drug_id': d} if d in conn.known else None)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    monkeypatch.setattr(prices_mod, '_get_pharmacy_id_for_user', lambda u, c: 4)
+    resp = client.patch(BULK_URL, json={'user_id': 1, 'prices': [
+        {'drug_id': 1, 'price': 5}, {'drug_id': 2, 'price': '7.25'}, {'drug_id': 1, 'price': 6},
+    ]})
+    assert resp.status_code == 200
+    assert resp.get_json() == {'message': 'Prices updated', 'updated': 2}
+    # drugs are checked against the cached catalog: just one multi-row upsert
+    assert len(conn.calls) == 1
+    query, params = conn.calls[0]
+    assert query.count('(%s, %s, %s)') == 2
+    assert 'ON DUPLICATE KEY UPDATE' in query
+    assert [str(p) for p in params] == ['4', '1', '6', '4', '2', '7.25']
+    assert conn.committed
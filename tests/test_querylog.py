@@ -0,0 +1,99 @@
+# tests/test_querylog.py
+
+import os
+import sys
+
+import pytest
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import querylog
+from conftest import SQLITE_PHARMACY_USER as PHARMACY_USER
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def _pending(client, patient_id=1):
+    resp = client.post('/api/prescriptions/request', json={
+        'doctor_id': 3, 'patient_id': patient_id, 'drug_id': 1,
+        'dosage': '500mg', 'instructions': 'Take twice daily',
+    })
+    assert resp.status_code == 201
+    return resp.get_json()['prescription_id']
+
+
+def test_fingerprint_folds_literals_and_row_groups():
+    assert querylog.fingerprint("""
+        SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'bob' AND n > 10;
+    """) == "SELECT * FROM t WHERE id IN (...) AND name = ? AND n > ?"
+    one = querylog.fingerprint("INSERT INTO p (a, b) VALUES (%s, %s, NOW())")
+    many = querylog.fingerprint("INSERT INTO p (a, b) VALUES (%s, %s, NOW()), (%s, %s, NOW())")
+    assert many == one + ", ..."
+
+
+def test_debug_headers_report_queries(client, sqlite_db, monkeypatch):
+    monkeypatch.setitem(config.QUERY_LOG_CONFIG, 'headers', True)
+    resp = client.get(f'/api/pharmacy/queue?user_id={PHARMACY_USER}')
+    assert resp.status_code == 200
+    # pharmacy lookup + the queue itself
+    assert resp.headers['X-DB-Queries'] == '2'
+    assert float(resp.headers['X-DB-Time']) >= 0
+
+
+def test_headers_off_outside_debug(client, sqlite_db):
+    resp = client.get(f'/api/pharmacy/queue?user_id={PHARMACY_USER}')
+    assert 'X-DB-Queries' not in resp.headers
+
+
+def test_records_carry_row_counts(client, sqlite_db):
+    _pending(client, 1)
+    _pending(client, 2)
+    with querylog.capture() as queries:
+        client.get(f'/api/pharmacy/queue?user_id={PHARMACY_USER}')
+    assert [q.rows for q in queries] == [1, 2]
+    assert 'FROM prescriptions' in queries[-1].fingerprint
+
+
+def test_slow_queries_are_logged(client, sqlite_db, monkeypatch, capsys):
+    monkeypatch.setitem(config.QUERY_LOG_CONFIG, 'slow_ms', 0)
+    client.get(f'/api/pharmacy/queue?user_id={PHARMACY_USER}')
+    err = capsys.readouterr().err
+    assert '[SLOW QUERY]' in err
+    assert 'endpoint=pharmacy_queue.get_prescription_queue' in err
+
+
+def test_query_budgets(client, sqlite_db, max_queries):
+    client.get('/api/prescriptions/drugs')      # warm the drug catalog
+    ids = [_pending(client, 1), _pending(client, 2)]
+    user = f'user_id={PHARMACY_USER}'
+    client.patch('/api/prices/bulk-update',
+                 json={'user_id': PHARMACY_USER, 'prices': [{'drug_id': 1, 'price': 10}]})
+
+    with max_queries(4):
+        assert client.post(f'/api/pharmacy/prescriptions/fulfill?{user}',
+                           json={'prescription_ids': ids}).status_code == 200
+    # the batch endpoints must not issue a query per prescription
+    with max_queries(6):
+        assert client.post(f'/api/pharmacy/prescriptions/dispense?{user}',
+                           json={'prescription_ids': ids}).status_code == 200
+    with max_queries(2):
+        client.get(f'/api/pharmacy/payments/revenue?{user}')
+    with max_queries(2):
+        client.get(f'/api/pharmacy/inventory?{user}')
+
+
+def test_max_queries_reports_what_ran(client, sqlite_db, max_queries):
+    with pytest.raises(AssertionError, match='FROM prescriptions'):
+        with max_queries(1):
+            client.get(f'/api/pharmacy/queue?user_id={PHARMACY_USER}')
@@ -2,7 +2,6 @@
 
 import os
 import sys
-import types
 import pytest
 import mysql.connector
 
@@ -10,10 +9,16 @@ import mysql.connector
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Stub out config module before importing
-sys.modules['config'] = types.SimpleNamespace(DB_CONFIG={})
+import config
+config.DB_CONFIG = {}
 
 from app import app
 import blueprints.prescriptionQueue.queue as queue_mod
+from blueprints.common import drugs
+
+def _catalog(monkeypatch, *drug_ids):
+    """Serve drug lookups from a fixed set of ids instead of the database."""
+    monkeypatch.setattr(drugs, 'get_drug', lambda d: {'drug_id': d, 'name': f'Drug{d}'} if d in drug_ids else None)
 
 # --- Helper classes for mocking ---
 class DummyCursor:
@@ -116,40 +121,155 @@ def test_fulfill_drug_not_found(monkeypatch, client):
     assert resp.status_code == 404
     assert f"Drug id {preset['drug_id']} not found" in resp.get_json().get('error')
 
-# Out of stock
+# Out of stock: the conditional decrement matches no row
 def test_fulfill_out_of_stock(monkeypatch, client):
     class OutOfStockConn:
-        def __init__(self): self.calls = 0
+        def __init__(self): self.calls = 0; self.rowcount = 0
         def cursor(self, dictionary=True): return self
-        def execute(self, query, params=None): self.calls += 1
+        def execute(self, query, params=None):
+            self.calls += 1
+            # the prescription is claimed, then the stock decrement matches nothing
+            self.rowcount = 0 if 'pharmacy_inventory' in query else 1
         def fetchone(self):
             if self.calls == 1:
                 return {'drug_id': 8}        # prescription lookup
-            if self.calls == 2:
-                return {'name': 'DrugX'}     # drug found
-            if self.calls == 3:
-                return {'stock_quantity': 0} # out of stock
             return None
         def commit(self): pass
         def rollback(self): pass
         def close(self): pass
+    monkeypatch.setattr(queue_mod, '_get_pharmacy_id_for_user', lambda u, c: 5)
+    _catalog(monkeypatch, 8)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: OutOfStockConn())
+    resp = client.post(BASE_URL + '4/fulfill?user_id=1')
+    assert resp.status_code == 400
+    assert resp.get_json().get('error') == 'Out of stock'
+
+# Already filled (or fulfilled concurrently): the status guard matches no row
+def test_fulfill_not_pending(monkeypatch, client):
+    class FilledConn:
+        def __init__(self): self.queries = []; self.rowcount = 0; self.rolled_back = False
+        def cursor(self, dictionary=True): return self
+        def execute(self, query, params=None): self.queries.append(query)
+        def fetchone(self):
+            return {'drug_id': 8} if len(self.queries) == 1 else None
+        def commit(self): raise AssertionError('must not commit')
+        def rollback(self): self.rolled_back = True
+        def close(self): pass
+    conn = FilledConn()
+    monkeypatch.setattr(queue_mod, '_get_pharmacy_id_for_user', lambda u, c: 5)
+    _catalog(monkeypatch, 8)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.post(BASE_URL + '4/fulfill?user_id=1')
+    assert resp.status_code == 409
+    assert resp.get_json().get('error') == 'Prescription is not pending'
+    assert conn.rolled_back
+    # stock is never touched for a prescription that wasn't claimed
+    assert not any('pharmacy_inventory' in q for q in conn.queries)
 
 # Success flow
 def test_fulfill_success(monkeypatch, client):
     class SuccessConn:
-        def __init__(self): self.calls = 0
+        def __init__(self): self.calls = 0; self.rowcount = 1
         def cursor(self, dictionary=True): return self
         def execute(self, query, params=None): self.calls += 1
         def fetchone(self):
             if self.calls == 1: return {'drug_id': 9}
-            if self.calls == 2: return {'name': 'DrugY'}
-            if self.calls == 3: return {'stock_quantity': 5}
             return None
         def commit(self): pass
         def rollback(self): pass
         def close(self): pass
     monkeypatch.setattr(queue_mod, '_get_pharmacy_id_for_user', lambda u, c: 5)
+    _catalog(monkeypatch, 9)
     monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: SuccessConn())
     resp = client.post(BASE_URL + '5/fulfill?user_id=1')
     assert resp.status_code == 200
     assert resp.get_json().get('message') == 'Prescription marked as filled'
+
+# Inventory is matched on the indexed drug_id, not the free-text name
+def test_fulfill_matches_inventory_by_drug_id(monkeypatch, client):
+    class RecordingConn:
+        def __init__(self): self.calls = []; self.rowcount = 1
+        def cursor(self, dictionary=True): return self
+        def execute(self, query, params=None): self.calls.append((query, params))
+        def fetchone(self):
+            if len(self.calls) == 1: return {'drug_id': 9}
+            return None
+        def commit(self): pass
+        def rollback(self): pass
+        def close(self): pass
+    conn = RecordingConn()
+    _catalog(monkeypatch, 9)
+    monkeypatch.setattr(queue_mod, '_get_pharmacy_id_for_user', lambda u, c: 5)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.post(BASE_URL + '5/fulfill?user_id=1')
+    assert resp.status_code == 200
+    inventory_queries = [(q, p) for q, p in conn.calls if 'pharmacy_inventory' in q]
+    assert len(inventory_queries) == 1
+    query, params = inventory_queries[0]
+    assert 'drug_id' in query and 'drug_name' not in query
+    assert 'stock_quantity > 0' in query
+    assert params == (5, 9)
+
+# --- Tests for POST /api/pharmacy/prescriptions/fulfill (batch) ---
+
+BATCH_URL = '/api/pharmacy/prescriptions/fulfill?user_id=1'
+
+class BatchConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+        self.committed = False
+    def cursor(self, dictionary=True): return self
+    def execute(self, query, params=None): self.calls.append((query, params))
+    def fetchall(self): return self.rows
+    def fetchone(self): return None
+    def commit(self): self.committed = True
+    def rollback(self): pass
+    def close(self): pass
+
+def test_batch_fulfill_requires_ids(monkeypatch, client):
+    resp = client.post(BATCH_URL, json={'prescription_ids': []})
+    assert resp.status_code == 400
+    resp = client.post(BATCH_URL, json={'prescription_ids': ['x']})
+    assert resp.status_code == 400
+
+def test_batch_fulfill_mixed_results(monkeypatch, client):
+    rows = [
+        {'prescription_id': 1, 'drug_id': 7, 'status': 'pending', 'stock_quantity': 2},
+        {'prescription_id': 2, 'drug_id': 7, 'status': 'pending', 'stock_quantity': 2},
+        {'prescription_id': 3, 'drug_id': 7, 'status': 'pending', 'stock_quantity': 2},
+        {'prescription_id': 4, 'drug_id': 8, 'status': 'pending', 'stock_quantity': None},
+        {'prescription_id': 5, 'drug_id': 9, 'status': 'filled', 'stock_quantity': 4},
+        {'prescription_id': 6, 'drug_id': 9, 'status': 'pending', 'stock_quantity': 4},
+    ]
+    conn = BatchConn(rows)
+    _catalog(monkeypatch, 7, 9)
+    monkeypatch.setattr(queue_mod, '_get_pharmacy_id_for_user', lambda u, c: 5)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.post(BATCH_URL, json={'prescription_ids': [1, 2, 3, 4, 5, 6, 99, 1]})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['filled'] == 3 and data['failed'] == 4
+    results = data['results']
+    assert results['1'] == results['2'] == results['6'] == {'status': 'filled'}
+    assert results['3'] == {'error': 'Out of stock'}
+    assert results['4'] == {'error': 'Drug id 8 not found'}
+    assert 'not pending' in results['5']['error']
+    assert 'not found' in results['99']['error']
+
+    # validation query, inventory update, status update, change-log insert
+    assert len(conn.calls) == 4
+    inv_query, inv_params = conn.calls[1]
+    assert 'CASE drug_id' in inv_query
+    assert inv_params == (7, 2, 9, 1, 5, 7, 9)
+    assert conn.calls[2][1] == (5, 1, 2, 6)
+    assert 'INSERT INTO pharmacy_events' in conn.calls[3][0]
+    assert conn.committed
+
+def test_batch_fulfill_nothing_to_update(monkeypatch, client):
+    conn = BatchConn([])
+    monkeypatch.setattr(queue_mod, '_get_pharmacy_id_for_user', lambda u, c: 5)
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    resp = client.post(BATCH_URL, json={'prescription_ids': [1]})
+    assert resp.get_json()['failed'] == 1
+    assert len(conn.calls) == 1
@@ -0,0 +1,83 @@
+# tests/test_route_bench.py
+
+import io
+import os
+import sys
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+from app import app
+import bench
+import datagen
+import db
+import db_sqlite
+
+TINY = datagen.plan(200)
+PICKED = {'prescriptions.list', 'queue.fulfill', 'dispense.batch', 'payments.revenue'}
+
+
+def _run(seed_value=0):
+    routes = [r for r in bench.ROUTES if r[0] in PICKED]
+    return bench.run_size('tiny', counts=TINY, routes=routes, repeat=3, warmup=1,
+                          seed_value=seed_value, out=io.StringIO())
+
+
+def test_run_size_drives_routes_without_errors():
+    results = _run()
+    assert set(results) == PICKED
+    for name, r in results.items():
+        assert r['status'] < 400, name
+        assert r['queries'] >= 1
+        assert 0 <= r['p50_ms'] <= r['p95_ms'] <= r['p99_ms']
+    # the pool it built is gone again
+    assert db._pool is None
+
+
+def _seeded(name, seed_value):
+    conn = db_sqlite.connect(**dict(config.SQLITE_CONFIG, name=name))
+    try:
+        ids = bench.seed(conn, TINY, reserve=6, seed_value=seed_value)
+        cur = conn.cursor()
+        cur.execute("SELECT patient_id, drug_id, status, created_at FROM prescriptions ORDER BY prescription_id")
+        return ids, cur.fetchall()
+    finally:
+        conn.close()
+
+
+def test_seed_is_deterministic(request):
+    ids, rows = _seeded(request.node.name + '-a', 3)
+    again_ids, again_rows = _seeded(request.node.name + '-b', 3)
+    other_ids, other_rows = _seeded(request.node.name + '-c', 4)
+    assert len(rows) >= TINY['prescriptions']
+    assert len(ids['pending']) == len(ids['filled']) == 6
+    assert (again_ids, again_rows) == (ids, rows)
+    assert other_rows != rows
+
+
+def test_compare_flags_errors_queries_and_slowdowns():
+    base = {'status': 200, 'p50_ms': 10.0, 'p95_ms': 12.0, 'p99_ms': 15.0, 'alloc_kib': 100.0, 'queries': 2}
+    baseline = {'small': {'a': base, 'b': base, 'c': base, 'd': base, 'e': base}}
+    results = {'small': {
+        'a': dict(base),                                   # unchanged
+        'b': dict(base, status=500),                       # error
+        'c': dict(base, queries=3),                        # one more query
+        'd': dict(base, p50_ms=25.0),                      # 2.5x slower
+        'e': dict(base, p95_ms=40.0, p99_ms=90.0),         # tail noise only
+    }}
+    problems = bench.compare(results, baseline)
+    assert len(problems) == 3
+    assert any('b: HTTP 500' in p for p in problems)
+    assert any('c: 3 queries' in p for p in problems)
+    assert any('d: p50' in p for p in problems)
+
+
+def test_compare_ignores_slowdowns_under_the_floor():
+    base = {'status': 200, 'p50_ms': 0.5, 'p95_ms': 0.6, 'p99_ms': 0.7, 'alloc_kib': 10.0, 'queries': 1}
+    results = {'small': {'fast': dict(base, p50_ms=1.5)}}
+    assert bench.compare(results, {'small': {'fast': base}}) == []
+    assert bench.compare(results, {}) == []
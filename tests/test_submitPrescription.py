@@ -2,7 +2,6 @@
 
 import os
 import sys
-import types
 import pytest
 import mysql.connector
 
@@ -10,10 +9,12 @@ import mysql.connector
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Stub config before importing app
-sys.modules['config'] = types.SimpleNamespace(DB_CONFIG={})
+import config
+config.DB_CONFIG = {}
 
 from app import app
 import blueprints.serviceDoctor.submitPrescription as pres_mod
+from blueprints.common import drugs
 
 # --- Helper classes ---
 class DummyCursor:
@@ -103,13 +104,17 @@ def test_request_drug_not_found(monkeypatch, client):
     assert resp.status_code == 404
     assert 'Drug id 99 not found' in resp.get_json().get('error')
 
+def _known_drug(drug_id):
+    return {'drug_id': drug_id, 'name': 'Drug', 'description': ''}
+
 class NoPrefConn(DummyConn):
-    def __init__(self): super().__init__([{1:1}, None])
+    def __init__(self): super().__init__([None])
 
     def cursor(self, dictionary=True):
         return DummyCursor(rows=self._rows.copy())
 
 def test_request_no_pref(monkeypatch, client):
+    monkeypatch.setattr(drugs, 'get_drug', _known_drug)
     monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: NoPrefConn())
     payload = {'doctor_id':1,'patient_id':2,'drug_id':3,'dosage':'d','instructions':'i'}
     resp = client.post(REQUEST_URL, json=payload)
@@ -121,9 +126,8 @@ class SuccessConn:
     def cursor(self, dictionary=True): return self
     def execute(self, query, params=None): self.calls += 1
     def fetchone(self):
-        # first: drug exists, second: pref
-        if self.calls == 1: return {1:1}
-        if self.calls == 2: return {'pharmacy_id':5}
+        # drug existence comes from the catalog; first query is the pref
+        if self.calls == 1: return {'pharmacy_id':5}
         return None
     @property
     def lastrowid(self): return 555
@@ -131,6 +135,7 @@ class SuccessConn:
     def close(self): pass
 
 def test_request_success(monkeypatch, client):
+    monkeypatch.setattr(drugs, 'get_drug', _known_drug)
     monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: SuccessConn())
     payload = {'doctor_id':1,'patient_id':2,'drug_id':3,'dosage':'d','instructions':'i'}
     resp = client.post(REQUEST_URL, json=payload)
@@ -138,3 +143,72 @@ def test_request_success(monkeypatch, client):
     data = resp.get_json()
     assert data['message'] == 'Prescription requested successfully'
     assert data['prescription_id'] == 555
+
+# --- Tests for the drug catalog cache ---
+
+class CountingConn(DummyConn):
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.queries = 0
+    def cursor(self, dictionary=True):
+        conn = self
+        class Cursor(DummyCursor):
+            def execute(self, query, params=None):
+                conn.queries += 1
+        return Cursor(list(self._rows))
+    def commit(self): pass
+    def rollback(self): pass
+
+def test_catalog_served_from_memory(monkeypatch, client):
+    conn = CountingConn([{'drug_id': 1, 'name': 'Metformin', 'description': 'Desc1'}])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    for _ in range(3):
+        assert client.get('/api/prescriptions/drugs').status_code == 200
+    assert conn.queries == 1
+
+def test_list_drugs_etag(monkeypatch, client):
+    conn = CountingConn([{'drug_id': 1, 'name': 'Metformin', 'description': 'Desc1'}])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    etag = client.get('/api/prescriptions/drugs').headers['ETag']
+    resp = client.get('/api/prescriptions/drugs', headers={'If-None-Match': etag})
+    assert resp.status_code == 304 and resp.data == b''
+
+    conn._rows[0]['description'] = 'Updated'
+    client.post('/api/prescriptions/drugs/refresh')
+    resp = client.get('/api/prescriptions/drugs', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+
+def test_catalog_refresh_bumps_version_on_change(monkeypatch, client):
+    conn = CountingConn([{'drug_id': 1, 'name': 'Metformin', 'description': 'Desc1'}])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    first = client.post('/api/prescriptions/drugs/refresh').get_json()
+    same  = client.post('/api/prescriptions/drugs/refresh').get_json()
+    assert same['version'] == first['version']
+
+    conn._rows.append({'drug_id': 2, 'name': 'Orlistat', 'description': 'Desc2'})
+    changed = client.post('/api/prescriptions/drugs/refresh').get_json()
+    assert changed == {'version': first['version'] + 1, 'drugs': 2}
+
+def test_catalog_reloads_after_ttl(monkeypatch, client):
+    conn = CountingConn([{'drug_id': 1, 'name': 'Metformin', 'description': 'Desc1'}])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    client.get('/api/prescriptions/drugs')
+    monkeypatch.setattr(drugs._catalog, 'ttl', 0)
+    client.get('/api/prescriptions/drugs')
+    assert conn.queries == 2
+
+def test_catalog_unknown_id_reload_is_rate_limited(monkeypatch, client):
+    conn = CountingConn([{'drug_id': 1, 'name': 'Metformin', 'description': 'Desc1'}])
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kw: conn)
+    payload = {'doctor_id':1,'patient_id':2,'drug_id':2,'dosage':'d','instructions':'i'}
+    for _ in range(3):
+        assert client.post(REQUEST_URL, json=payload).status_code == 404
+    # loaded once; a miss right after loading doesn't reload again
+    assert conn.queries == 1
+
+    monkeypatch.setattr(drugs._catalog, 'miss_refresh_after', 0)
+    conn._rows.append({'drug_id': 2, 'name': 'Orlistat', 'description': 'Desc2'})
+    with app.app_context():
+        assert drugs.get_drug(2)['name'] == 'Orlistat'
+    assert conn.queries == 2
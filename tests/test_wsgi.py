@@ -0,0 +1,151 @@
+# tests/test_wsgi.py
+
+import asyncio
+import json
+import os
+import runpy
+import sys
+
+# Ensure project root on PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Stub out config before importing
+import config
+config.DB_CONFIG = {}
+
+from app import create_app
+import asgi
+import db
+import health
+import wsgi
+from blueprints.common import drugs
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_create_app_builds_independent_apps():
+    first = create_app({'TESTING': True})
+    second = create_app()
+    assert first is not second
+    assert first.config['TESTING'] and not second.config.get('TESTING')
+    rules = {r.rule for r in first.url_map.iter_rules()}
+    assert {'/api/hello', '/metrics', '/api/pharmacy/queue'} <= rules
+    assert first.test_client().get('/api/hello').get_json() == {'message': 'Hello World!'}
+
+
+def test_start_worker_opens_pool_and_warms_catalog(sqlite_db, monkeypatch, request):
+    # point the worker's own pool at the seeded database
+    monkeypatch.setattr(db, 'DB_DRIVER', 'sqlite')
+    monkeypatch.setattr(db, 'SQLITE_CONFIG', dict(config.SQLITE_CONFIG, name=request.node.name))
+    inherited = db.get_pool()
+
+    wsgi.start_worker()
+    assert db.get_pool() is not inherited
+    assert db.get_pool().driver == 'sqlite'
+    assert drugs.cache_stats()['drugs'] == 2
+    assert health.checker.running
+    wsgi.stop_worker()
+    assert not health.checker.running
+    assert db._pool is None
+
+
+def test_start_worker_survives_unreachable_database(capsys):
+    # the default mysql stub refuses to connect
+    wsgi.start_worker()
+    assert 'drug catalog warm-up failed' in capsys.readouterr().err
+    wsgi.stop_worker()
+
+
+def test_gunicorn_config_reads_server_config():
+    settings = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+    assert settings['worker_class'] == 'gthread'
+    assert settings['workers'] == config.SERVER_CONFIG['workers'] >= 1
+    assert settings['threads'] == config.SERVER_CONFIG['threads']
+    assert settings['preload_app'] is False
+    assert callable(settings['post_worker_init']) and callable(settings['worker_exit'])
+    assert callable(settings['child_exit'])
+
+
+def test_asgi_serves_flask_routes(asgi_request, sqlite_db):
+    status, headers, chunks = asgi_request('GET', '/api/hello')
+    assert status == 200 and headers['content-type'] == 'application/json'
+    assert json.loads(b''.join(chunks)) == {'message': 'Hello World!'}
+
+    # a body larger than the prefetch, in several messages, read by the handler thread
+    payload = json.dumps({'doctor_id': 3, 'patient_id': 1, 'drug_id': 1, 'dosage': '500mg',
+                          'instructions': 'x' * asgi.PREFETCH_BYTES}).encode()
+    half = len(payload) // 2
+    status, _, chunks = asgi_request('POST', '/api/prescriptions/request', body=[payload[:half], payload[half:]],
+                                     headers=[('Content-Type', 'application/json')])
+    assert status == 201 and json.loads(b''.join(chunks))['prescription_id'] == 1
+
+    status, _, _ = asgi_request('GET', '/api/pharmacy/queue', query='user_id=99')
+    assert status == 404
+
+
+def test_asgi_lifespan_runs_worker_hooks(sqlite_db, monkeypatch, request):
+    monkeypatch.setattr(db, 'DB_DRIVER', 'sqlite')
+    monkeypatch.setattr(db, 'SQLITE_CONFIG', dict(config.SQLITE_CONFIG, name=request.node.name))
+    incoming = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent, seen = [], {}
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+        if message['type'] == 'lifespan.startup.complete':
+            seen['running'] = health.checker.running
+            seen['drugs'] = drugs.cache_stats()['drugs']
+
+    asyncio.run(asgi.app({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert seen == {'running': True, 'drugs': 2}
+    assert not health.checker.running
+
+
+def test_asgi_main_runs_uvicorn_from_server_config(monkeypatch):
+    import uvicorn
+    calls = []
+    monkeypatch.setattr(uvicorn, 'run', lambda app, **kw: calls.append((app, kw)))
+    monkeypatch.setitem(config.SERVER_CONFIG, 'bind', '0.0.0.0:5001')
+    asgi.main()
+    (app, kw), = calls
+    assert app == 'asgi:app'
+    assert (kw['host'], kw['port'], kw['lifespan']) == ('0.0.0.0', 5001, 'on')
+    assert kw['workers'] == config.SERVER_CONFIG['workers']
+
+
+def test_cpu_limit_follows_the_cgroup_quota(tmp_path):
+    (tmp_path / 'cpu.max').write_text('150000 100000\n')
+    assert config.cpu_limit(str(tmp_path)) == 2
+
+    v1 = tmp_path / 'v1'
+    (v1 / 'cpu').mkdir(parents=True)
+    (v1 / 'cpu' / 'cpu.cfs_quota_us').write_text('50000\n')
+    (v1 / 'cpu' / 'cpu.cfs_period_us').write_text('100000\n')
+    assert config.cpu_limit(str(v1)) == 1
+
+    # no quota: the cores this process may run on
+    (tmp_path / 'cpu.max').write_text('max 100000\n')
+    assert config.cpu_limit(str(tmp_path)) == len(os.sched_getaffinity(0))
+
+
+def test_handler_threads_never_outnumber_pooled_connections():
+    assert config.handler_threads(0, 10) == 10
+    assert config.handler_threads(16, 10) == 10
+    assert config.handler_threads(4, 10) == 4
+    pool = config.DB_POOL_CONFIG['size']
+    assert config.SERVER_CONFIG['asgi_threads'] <= pool
+    assert config.SERVER_CONFIG['threads'] <= pool
+    assert asgi.app.threads == config.SERVER_CONFIG['asgi_threads']
+
+
+def test_connection_budget_caps_workers_times_pool():
+    assert config.fit_connection_budget(0, 16, 10) == (16, 10)
+    assert config.fit_connection_budget(40, 4, 10) == (4, 10)
+    assert config.fit_connection_budget(30, 4, 10) == (4, 7)
+    assert config.fit_connection_budget(3, 4, 10) == (3, 1)
+    # one connection per worker outside its pool, for the health checker
+    assert config.fit_connection_budget(40, 4, 10, reserved=1) == (4, 9)
+    assert config.fit_connection_budget(3, 4, 10, reserved=1) == (1, 2)
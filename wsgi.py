@@ -0,0 +1,48 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py sizes the server from ``SERVER_CONFIG``: one process per
+core, each serving requests on a pool of threads. Every worker process
+owns its connection pool and in-process caches. ``start_worker`` runs in
+each worker once it has loaded the app. It drops anything inherited across
+the fork, opens the pool, warms the drug catalog and starts the readiness
+checker (health.py), the cache version watcher (invalidation.py) and the
+metrics writer (metrics.py). ``stop_worker`` stops them and closes the
+pool's connections as the worker exits.
+"""
+import sys
+
+import mysql.connector
+
+from app import app
+from blueprints.common import drugs, pharmacy
+import db
+import health
+import invalidation
+import metrics
+
+
+def start_worker():
+    # sockets opened before the fork would be shared with the parent
+    db.reset_pool()
+    pharmacy.clear_cache()
+    drugs.clear_cache()
+    db.get_pool()
+    with app.app_context():
+        try:
+            drugs.refresh()
+        except mysql.connector.Error as err:
+            # not fatal: the catalog loads on the first request that needs it
+            print(f"[WARN] drug catalog warm-up failed: {err}", file=sys.stderr)
+    health.start()
+    invalidation.start()
+    metrics.start()
+
+
+def stop_worker():
+    metrics.stop()
+    invalidation.stop()
+    health.stop()
+    db.reset_pool()